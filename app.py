@@ -1,116 +1,618 @@
+import hmac
+import io
 import os
+import time
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 from dotenv import load_dotenv
-from flask import Flask, g, jsonify, request, send_from_directory
-
-from config import DATABASE_URL, PORT
-from db.connection import close_pool, get_connection, init_pool, put_connection
+from flask import Flask, Response, abort, g, jsonify, make_response, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from config import (
+    ADMIN_TOKEN,
+    API_MAX_PAGE_SIZE,
+    CATALOG_SNAPSHOT,
+    CATALOG_VERSION_CHECK_INTERVAL,
+    COMPRESS,
+    COMPRESS_MIN_BYTES,
+    CSV_BULK_LOAD,
+    CSV_PARSE_WORKERS,
+    DATABASE_REPLICA_URLS,
+    DATABASE_URL,
+    DB_PLAN_CACHE_MODE,
+    DB_POOL_CHECK_IDLE_AFTER,
+    DB_POOL_MAX,
+    DB_POOL_MAX_AGE,
+    DB_POOL_MIN,
+    DB_POOL_TIMEOUT,
+    DB_PREPARED_STATEMENTS,
+    DB_READ_YOUR_WRITES,
+    DB_REPLICA_BALANCE,
+    DB_REPLICA_CHECK_INTERVAL,
+    DB_REPLICA_MAX_LAG,
+    DB_REPLICA_RETRY_AFTER,
+    EXPORT_BATCH_SIZE,
+    FACETS_PRICE_BUCKETS,
+    FAST_JSON,
+    METRICS,
+    PORT,
+    PRICE_PATCH_MAX_BYTES,
+    RESPONSE_CACHE,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    SEARCH_FUZZY_THRESHOLD,
+    SEARCH_INDEX,
+    SEARCH_MAX_RESULTS,
+    SELECT_DEFAULT_LIMIT,
+    SELECT_MAX_BATCH,
+    SERVER_TIMING,
+    SIMILAR_DEFAULT_LIMIT,
+    SIMILAR_MAX_BATCH,
+    SLOW_QUERY_MS,
+    SUGGEST_DEFAULT_LIMIT,
+)
+import metrics
+import static_assets
+from db.catalog_version import current_catalog_version, set_check_interval
+from db.connection import (
+    LazyConnection,
+    PoolTimeout,
+    close_pool,
+    get_connection,
+    init_pool,
+    pool_stats,
+    put_connection,
+)
+from db.export import FORMATS as EXPORT_FORMATS, export_chunks, iter_product_batches
+from db.facets import get_facets, set_price_buckets
 from db.init_db import init_db
-from db.load_csv import load_csv_into_db
-from db.repository import count_products, get_by_id, get_by_model_or_slug, list_products
+from db.load_csv import bulk_load_csv_into_db, load_csv_into_db
+from db.prepared import prepared_stats, set_plan_cache_mode, set_prepared_cache_size
+from db.price_patch import PatchError, apply_price_patch
+from db.repository import (
+    count_products,
+    find_product,
+    get_by_ids,
+    list_products,
+    list_products_page,
+)
+from db.search import apply_search, get_search_index
+from db.selection import get_duty_point_index
+from db.similar import get_similarity_index
+from db.snapshot import get_snapshot
+from db.suggest import get_suggest_index
+from request_params import (
+    normalize_whitespace,
+    page_params,
+    parse_number_loose,
+    product_filters,
+    slugify,
+)
+from response_cache import CachedResponse, ResponseCache
 
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
 BASE_DIR = Path(__file__).resolve().parent
 CSV_PATH = BASE_DIR / "fans_data.csv"
 
-
-def normalize_whitespace(value: Any) -> str:
-    if value is None:
-        return ""
-    return " ".join(str(value).replace("\u00A0", " ").split())
-
-
-def parse_number_loose(value: Any) -> Optional[float]:
-    s = normalize_whitespace(value).replace(" ", "").replace(",", ".")
-    if not s:
-        return None
-    try:
-        return float(s)
-    except ValueError:
-        return None
-
-
-def slugify(value: str) -> str:
-    import re
-    s = normalize_whitespace(value).lower()
-    s = re.sub(r"[^\w]+", "-", s, flags=re.UNICODE)
-    s = re.sub(r"-{2,}", "-", s).strip("-")
-    return s
-
-
 app = Flask(
     __name__,
     static_folder=str(BASE_DIR / "public"),
     static_url_path="",
 )
+# Патч цен — самое большое тело запроса, которое принимает приложение. Лимит действует и
+# на chunked-запросы без Content-Length: тело читается не дальше него. Байт сверх патча —
+# чтобы отличить тело ровно в PRICE_PATCH_MAX_BYTES от обрезанного (см. api_admin_prices).
+app.config["MAX_CONTENT_LENGTH"] = PRICE_PATCH_MAX_BYTES + 1
+
+set_check_interval(CATALOG_VERSION_CHECK_INTERVAL)
+set_price_buckets(FACETS_PRICE_BUCKETS)
+metrics.configure(enabled=METRICS, slow_query_ms=SLOW_QUERY_MS)
+set_prepared_cache_size(DB_PREPARED_STATEMENTS)
+set_plan_cache_mode(DB_PLAN_CACHE_MODE)
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+metrics.register_collector("db_pool", pool_stats)
+metrics.register_collector("db_prepared", prepared_stats)
+metrics.register_collector("response_cache", response_cache.stats)
+# Заголовки ответа, которые сохраняются в кэше вместе с телом.
+_CACHED_HEADERS = ("Content-Type", "X-Next-Cursor", "X-Total-Count")
+# public/: имена CSS/JS с хэшем содержимого, заранее сжатые варианты всех файлов.
+assets = static_assets.AssetManifest(app.static_folder)
 
 
 @app.before_request
 def before_request():
-    g.db = get_connection()
+    g.started = time.perf_counter()
+    metrics.start_request()
+    # Соединение берётся из пула только при первом обращении к g.db.
+    g.db = LazyConnection()
+
+
+@app.after_request
+def after_request(resp: Response) -> Response:
+    timings = metrics.finish_request()
+    elapsed = time.perf_counter() - g.started
+    endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+    metrics.observe_request(
+        endpoint, request.method, resp.status_code, elapsed, g.get("filter_shape")
+    )
+    if SERVER_TIMING and timings is not None:
+        resp.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+    return resp
+
+
+@app.after_request
+def compress_response(resp: Response) -> Response:
+    """Сжать крупный JSON-ответ, не прошедший через cached_response (у тех сжатие своё)."""
+    if (
+        not COMPRESS
+        or resp.direct_passthrough
+        or resp.is_streamed
+        or resp.mimetype != "application/json"
+        or "Content-Encoding" in resp.headers
+        or "Accept-Encoding" in resp.vary
+    ):
+        return resp
+    body = resp.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    encoding = static_assets.negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding:
+        with metrics.stage("compress"):
+            resp.set_data(static_assets.compress(body, encoding, DYNAMIC_LEVEL[encoding]))
+        resp.headers["Content-Encoding"] = encoding
+    return resp
 
 
 @app.teardown_request
 def teardown_request(exc=None):
     if hasattr(g, "db"):
-        put_connection(g.db)
+        g.db.release()
+
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout(_e):
+    resp = jsonify({"error": "Database is busy, try again later"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "1"
+    return resp
+
+
+def product_filters_from_request() -> dict:
+    """Фильтры /api/products из query string в виде kwargs для list_products."""
+    return product_filters(request.args)
+
+
+def fast_json_enabled() -> bool:
+    """
+    Можно ли отдавать списки товаров готовыми JSON-строками из репозитория.
+    Они совпадают с jsonify байт в байт только в компактном режиме (не debug).
+    """
+    if not FAST_JSON:
+        return False
+    provider = app.json
+    compact = provider.compact if provider.compact is not None else not app.debug
+    return bool(compact and provider.sort_keys and provider.ensure_ascii)
+
+
+def json_list_response(items: list) -> Response:
+    """Ответ-массив из готовых JSON-строк; то же, что jsonify(list) в компактном режиме."""
+    with metrics.stage("serialize"):
+        body = "[" + ",".join(items) + "]\n"
+        return app.response_class(body.encode("ascii"), mimetype=app.json.mimetype)
+
+
+def timed_jsonify(value) -> Response:
+    with metrics.stage("serialize"):
+        return jsonify(value)
+
+
+def filter_shape(filters: dict, paged: bool) -> str:
+    """Форма запроса /api/products для метрик: какие фильтры заданы (без значений)."""
+    names = sorted(k.rstrip("_") for k, v in filters.items() if v is not None and k != "sort")
+    return "+".join(names or ["none"]) + f";sort={filters.get('sort')}" + (";page" if paged else "")
+
+
+# Уровни сжатия ответов на лету: почти как максимальные по размеру, но в разы быстрее.
+DYNAMIC_LEVEL = {"gzip": 6, "br": 5}
+
+
+def _encoded_body(entry: CachedResponse) -> tuple:
+    """
+    (кодировка, тело, etag) под Accept-Encoding запроса. Сжатый вариант готовится один
+    раз и остаётся в записи кэша; у каждого варианта свой ETag.
+    """
+    if not COMPRESS or len(entry.body) < COMPRESS_MIN_BYTES:
+        return "", entry.body, entry.etag
+    encoding = static_assets.negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    if not encoding:
+        return "", entry.body, entry.etag
+    body = entry.encoded.get(encoding)
+    if body is None:
+        with metrics.stage("compress"):
+            body = static_assets.compress(entry.body, encoding, DYNAMIC_LEVEL[encoding])
+        entry.encoded[encoding] = body
+    return encoding, body, f"{entry.etag}-{encoding}"
+
+
+def cached_response(key: tuple, compute: Callable[[], Response]) -> Response:
+    """
+    Ответ из кэша (ключ + версия каталога) с сильным ETag; If-None-Match -> 304.
+    Без RESPONSE_CACHE ответ считается заново, но ETag всё равно ставится.
+    Крупные тела сжимаются по Accept-Encoding (см. _encoded_body).
+    """
+
+    def build() -> CachedResponse:
+        resp = compute()
+        headers = [(k, v) for k, v in resp.headers.items() if k in _CACHED_HEADERS]
+        return CachedResponse(resp.status_code, headers, resp.get_data())
+
+    if RESPONSE_CACHE:
+        entry, status = response_cache.get_or_compute(
+            current_catalog_version(g.db),
+            key,
+            build,
+            cacheable=lambda r: r.status in (200, 404),
+        )
+    else:
+        entry, status = build(), "miss"
+    encoding, body, etag = _encoded_body(entry)
+    resp = Response(body, status=entry.status, headers=entry.headers)
+    resp.set_etag(etag)
+    if COMPRESS:
+        resp.vary.add("Accept-Encoding")
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Cache"] = status.upper()
+    return resp.make_conditional(request)
+
+
+def _products_response(filters: dict, limit: Optional[float], cursor: Optional[str], with_total: bool) -> Response:
+    relevance = None
+    if SEARCH_INDEX:
+        filters, relevance = apply_search(
+            g.db, filters, SEARCH_MAX_RESULTS, SEARCH_FUZZY_THRESHOLD
+        )
+    source = get_snapshot(g.db) if CATALOG_SNAPSHOT else None
+    as_json = fast_json_enabled()
+
+    if limit is None and cursor is None:
+        if source is not None:
+            result = source.list_products(relevance=relevance, as_json=as_json, **filters)
+        else:
+            result = list_products(g.db, relevance=relevance, as_json=as_json, **filters)
+        return json_list_response(result) if as_json else timed_jsonify(result)
+
+    # Постраничная выдача: limit + непрозрачный курсор, следующий курсор — в заголовке.
+    limit = API_MAX_PAGE_SIZE if limit is None else int(min(max(limit, 1), API_MAX_PAGE_SIZE))
+    try:
+        if source is not None:
+            page = source.list_products_page(
+                limit=limit,
+                cursor=cursor,
+                with_total=with_total,
+                relevance=relevance,
+                as_json=as_json,
+                **filters,
+            )
+        else:
+            page = list_products_page(
+                g.db,
+                limit=limit,
+                cursor=cursor,
+                with_total=with_total,
+                relevance=relevance,
+                as_json=as_json,
+                **filters,
+            )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    resp = json_list_response(page["items"]) if as_json else timed_jsonify(page["items"])
+    if page["next_cursor"]:
+        resp.headers["X-Next-Cursor"] = page["next_cursor"]
+    if page["total"] is not None:
+        resp.headers["X-Total-Count"] = str(page["total"])
+    return resp
 
 
 @app.get("/api/products")
 def api_products():
-    q = normalize_whitespace(request.args.get("q")).lower() or None
-    type_ = normalize_whitespace(request.args.get("type")) or None
-    diameter = parse_number_loose(request.args.get("diameter"))
-
-    min_price = parse_number_loose(request.args.get("minPrice"))
-    max_price = parse_number_loose(request.args.get("maxPrice"))
-    min_power = parse_number_loose(request.args.get("minPower"))
-    max_power = parse_number_loose(request.args.get("maxPower"))
-    min_noise = parse_number_loose(request.args.get("minNoise"))
-    max_noise = parse_number_loose(request.args.get("maxNoise"))
-    min_diameter = parse_number_loose(request.args.get("minDiameter"))
-    max_diameter = parse_number_loose(request.args.get("maxDiameter"))
-    min_airflow = parse_number_loose(request.args.get("minAirflow"))
-    max_airflow = parse_number_loose(request.args.get("maxAirflow"))
-    min_pressure = parse_number_loose(request.args.get("minPressure"))
-    max_pressure = parse_number_loose(request.args.get("maxPressure"))
-
-    sort = normalize_whitespace(request.args.get("sort")) or "price_asc"
-
-    result = list_products(
-        g.db,
-        q=q,
-        type_=type_,
-        diameter=diameter,
-        min_price=min_price,
-        max_price=max_price,
-        min_power=min_power,
-        max_power=max_power,
-        min_noise=min_noise,
-        max_noise=max_noise,
-        min_diameter=min_diameter,
-        max_diameter=max_diameter,
-        min_airflow=min_airflow,
-        max_airflow=max_airflow,
-        min_pressure=min_pressure,
-        max_pressure=max_pressure,
-        sort=sort,
+    filters = product_filters_from_request()
+    limit, cursor, with_total = page_params(request.args)
+    g.filter_shape = filter_shape(filters, limit is not None or cursor is not None)
+    key = ("products", tuple(sorted(filters.items())), limit, cursor, with_total)
+    return cached_response(
+        key, lambda: make_response(_products_response(filters, limit, cursor, with_total))
     )
-    return jsonify(result)
+
+
+@app.get("/api/products/export")
+def api_products_export():
+    """
+    Выгрузка всех товаров под фильтры /api/products потоком: ?format=ndjson (по умолчанию)
+    или csv. Ответ не кэшируется и не собирается в памяти целиком.
+    """
+    fmt = normalize_whitespace(request.args.get("format")).lower() or "ndjson"
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    filters = product_filters_from_request()
+    relevance = None
+    if SEARCH_INDEX:
+        filters, relevance = apply_search(
+            g.db, filters, SEARCH_MAX_RESULTS, SEARCH_FUZZY_THRESHOLD
+        )
+    # Отдача переживает запрос: у выгрузки своё соединение, оно возвращается в пул,
+    # когда сервер закроет ответ (дочитан или клиент отключился).
+    g.db.release()
+    conn = get_connection(dedicated=True)
+
+    def release() -> None:
+        nonlocal conn
+        taken, conn = conn, None
+        if taken is not None:
+            put_connection(taken)
+
+    batches = iter_product_batches(
+        conn, relevance=relevance, batch_size=EXPORT_BATCH_SIZE, **filters
+    )
+    resp = Response(export_chunks(fmt, batches), mimetype=EXPORT_FORMATS[fmt])
+    resp.call_on_close(release)
+    resp.headers["Content-Disposition"] = f"attachment; filename=ventmash-products.{fmt}"
+    resp.headers["Cache-Control"] = "no-store"
+    # Не буферизовать ответ в nginx: клиент получает пачки по мере чтения из БД.
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+def _product_detail_response(raw: str) -> Response:
+    p = find_product(g.db, raw, raw.lower(), slugify(raw))
+    if not p:
+        return make_response(jsonify({"error": "Product not found"}), 404)
+    return jsonify(p)
 
 
 @app.get("/api/products/<id_or_model>")
 def api_product_detail(id_or_model: str):
     raw = normalize_whitespace(id_or_model)
-    p = get_by_id(g.db, raw) or get_by_model_or_slug(
-        g.db, raw.lower(), slugify(raw)
+    return cached_response(("product", raw), lambda: _product_detail_response(raw))
+
+
+def _facets_response(filters: dict) -> Response:
+    if SEARCH_INDEX:
+        filters, _ = apply_search(g.db, filters, SEARCH_MAX_RESULTS, SEARCH_FUZZY_THRESHOLD)
+    source = get_snapshot(g.db) if CATALOG_SNAPSHOT else None
+    return timed_jsonify(get_facets(g.db, source, **filters))
+
+
+@app.get("/api/facets")
+def api_facets():
+    """
+    Фасеты для фильтров под те же параметры, что у /api/products: {"total", "types",
+    "diameters", "ranges", "price_histogram"}.
+    """
+    filters = product_filters_from_request()
+    filters.pop("sort")
+    key = ("facets", tuple(sorted(filters.items())))
+    return cached_response(key, lambda: make_response(_facets_response(filters)))
+
+
+@app.get("/api/suggest")
+def api_suggest():
+    """Подсказки для поля поиска: ?prefix=[&limit=] -> [{"value", "field", "count", "id"}]."""
+    prefix = normalize_whitespace(request.args.get("prefix"))
+    limit = parse_number_loose(request.args.get("limit"))
+    limit = SUGGEST_DEFAULT_LIMIT if limit is None else int(min(max(limit, 1), API_MAX_PAGE_SIZE))
+    index = get_suggest_index(g.db)
+    with metrics.stage("suggest"):
+        items = index.suggest(prefix, limit)
+    return jsonify(items)
+
+
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    return jsonify(response_cache.stats())
+
+
+@app.get("/api/pool/stats")
+def api_pool_stats():
+    stats = pool_stats()
+    if stats is not None:
+        stats = dict(stats, prepared=prepared_stats())
+    return jsonify(stats)
+
+
+@app.get("/api/metrics")
+def api_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+def _select_limit(value: Any, default: int = SELECT_DEFAULT_LIMIT) -> int:
+    n = parse_number_loose(value)
+    if n is None:
+        return default
+    return int(min(max(n, 1), API_MAX_PAGE_SIZE))
+
+
+def _attach_products(matches_per_point: list) -> list:
+    """Подставить товары в результаты подбора одним запросом к БД."""
+    ids = list({m["id"]: None for matches in matches_per_point for m in matches})
+    products = {p["id"]: p for p in get_by_ids(g.db, ids)}
+    result = []
+    for matches in matches_per_point:
+        items = []
+        for m in matches:
+            p = products.get(m["id"])
+            if p is not None:
+                items.append(dict(p, _match={k: v for k, v in m.items() if k != "id"}))
+        result.append(items)
+    return result
+
+
+@app.get("/api/select")
+def api_select():
+    """Подбор вентиляторов по рабочей точке: ?airflow=&pressure=[&type=][&limit=]."""
+    airflow = parse_number_loose(request.args.get("airflow"))
+    pressure = parse_number_loose(request.args.get("pressure"))
+    if airflow is None or pressure is None:
+        return jsonify({"error": "airflow and pressure are required"}), 400
+    type_ = normalize_whitespace(request.args.get("type")) or None
+    limit = _select_limit(request.args.get("limit"))
+    matches = get_duty_point_index(g.db).select(airflow, pressure, limit, type_)
+    return jsonify(_attach_products([matches])[0])
+
+
+@app.post("/api/select")
+def api_select_batch():
+    """
+    Пакетный подбор для КП: {"points": [{"airflow": .., "pressure": .., "type"?: ..}], "limit"?: k}.
+    Ответ: {"results": [{"airflow", "pressure", "items": [...]}]} в порядке точек.
+    """
+    body = request.get_json(silent=True)
+    points = body.get("points") if isinstance(body, dict) else None
+    if not isinstance(points, list) or not points:
+        return jsonify({"error": "points must be a non-empty list"}), 400
+    if len(points) > SELECT_MAX_BATCH:
+        return jsonify({"error": f"too many points (max {SELECT_MAX_BATCH})"}), 400
+    limit = _select_limit(body.get("limit"))
+
+    parsed = []
+    for n, point in enumerate(points):
+        if not isinstance(point, dict):
+            return jsonify({"error": f"points[{n}] must be an object"}), 400
+        airflow = parse_number_loose(point.get("airflow"))
+        pressure = parse_number_loose(point.get("pressure"))
+        if airflow is None or pressure is None:
+            return jsonify({"error": f"points[{n}]: airflow and pressure are required"}), 400
+        parsed.append((airflow, pressure, normalize_whitespace(point.get("type")) or None))
+
+    index = get_duty_point_index(g.db)
+    matches = [index.select(airflow, pressure, limit, type_) for airflow, pressure, type_ in parsed]
+    items = _attach_products(matches)
+    return jsonify(
+        {
+            "results": [
+                {"airflow": airflow, "pressure": pressure, "items": point_items}
+                for (airflow, pressure, _), point_items in zip(parsed, items)
+            ]
+        }
     )
-    if not p:
+
+
+def _similar_options(source: Any) -> tuple:
+    """(same_type, max_price) из параметров запроса или объекта пакетного запроса."""
+    same_type = normalize_whitespace(source.get("same_type")).lower() in ("1", "true")
+    return same_type, parse_number_loose(source.get("max_price"))
+
+
+def _similar_product_id(raw: str) -> Optional[str]:
+    """id товара для подбора замен: как в /api/products/<id_or_model> — id, модель или slug."""
+    index = get_similarity_index(g.db)
+    if index.has(raw):
+        return raw
+    p = find_product(g.db, raw, raw.lower(), slugify(raw))
+    return p["id"] if p else None
+
+
+@app.get("/api/products/<id_or_model>/similar")
+def api_product_similar(id_or_model: str):
+    """Похожие по характеристикам вентиляторы: ?[limit=][&same_type=1][&max_price=]."""
+    id_value = _similar_product_id(normalize_whitespace(id_or_model))
+    if id_value is None:
         return jsonify({"error": "Product not found"}), 404
-    return jsonify(p)
+    same_type, max_price = _similar_options(request.args)
+    limit = _select_limit(request.args.get("limit"), SIMILAR_DEFAULT_LIMIT)
+    with metrics.stage("similar"):
+        matches = get_similarity_index(g.db).similar(id_value, limit, same_type, max_price)
+    return jsonify(_attach_products([matches or []])[0])
+
+
+@app.post("/api/products/similar")
+def api_products_similar_batch():
+    """
+    Замены для всех позиций КП: {"items": [{"id": .., "same_type"?: .., "max_price"?: ..}], "limit"?: k}.
+    Ответ: {"results": [{"id", "items": [...]}]} в порядке позиций; для неизвестного id —
+    {"id", "error"} вместо items.
+    """
+    body = request.get_json(silent=True)
+    requested = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(requested, list) or not requested:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(requested) > SIMILAR_MAX_BATCH:
+        return jsonify({"error": f"too many items (max {SIMILAR_MAX_BATCH})"}), 400
+    limit = _select_limit(body.get("limit"), SIMILAR_DEFAULT_LIMIT)
+
+    parsed = []
+    for n, item in enumerate(requested):
+        if not isinstance(item, dict):
+            return jsonify({"error": f"items[{n}] must be an object"}), 400
+        raw = normalize_whitespace(item.get("id"))
+        if not raw:
+            return jsonify({"error": f"items[{n}]: id is required"}), 400
+        parsed.append((raw, _similar_product_id(raw)) + _similar_options(item))
+
+    index = get_similarity_index(g.db)
+    with metrics.stage("similar"):
+        matches = [
+            index.similar(id_value, limit, same_type, max_price) if id_value else []
+            for _, id_value, same_type, max_price in parsed
+        ]
+    items = _attach_products(matches)
+    results = []
+    for (raw, id_value, _, _), item_matches in zip(parsed, items):
+        if id_value is None:
+            results.append({"id": raw, "error": "Product not found"})
+        else:
+            results.append({"id": id_value, "items": item_matches})
+    return jsonify({"results": results})
+
+
+def admin_error() -> Optional[Response]:
+    """Ответ с ошибкой, если запрос не несёт верный Bearer ADMIN_TOKEN; иначе None."""
+    if not ADMIN_TOKEN:
+        return make_response(jsonify({"error": "Admin API is disabled (ADMIN_TOKEN is not set)"}), 403)
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), ADMIN_TOKEN):
+        resp = make_response(jsonify({"error": "Unauthorized"}), 401)
+        resp.headers["WWW-Authenticate"] = "Bearer"
+        return resp
+    return None
+
+
+@app.post("/api/admin/prices")
+def api_admin_prices():
+    """
+    Патч цен и характеристик: CSV "number;price[;power;...]" в теле запроса или в поле
+    file формы. ?dry_run=1 — только отчёт, без изменений. Ответ — отчёт apply_price_patch.
+    """
+    denied = admin_error()
+    if denied is not None:
+        return denied
+    try:
+        # Форму разбирать только для multipart: иначе разбор съел бы тело
+        # (curl --data-binary шлёт его как application/x-www-form-urlencoded).
+        upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+        data = upload.read() if upload is not None else request.get_data()
+    except RequestEntityTooLarge:
+        data = None
+    if data is None or len(data) > PRICE_PATCH_MAX_BYTES:
+        return jsonify({"error": f"patch is larger than {PRICE_PATCH_MAX_BYTES} bytes"}), 413
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return jsonify({"error": "patch must be UTF-8 CSV"}), 400
+    dry_run = normalize_whitespace(request.args.get("dry_run")) in ("1", "true")
+    conn = get_connection(write=True)
+    try:
+        report = apply_price_patch(conn, io.StringIO(text), dry_run=dry_run)
+    except PatchError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        put_connection(conn)
+    return jsonify(report)
 
 
 @app.get("/api/health")
@@ -119,37 +621,128 @@ def api_health():
     return jsonify({"ok": True, "products": n})
 
 
+def asset_response(asset: static_assets.Asset, cache_control: str) -> Response:
+    """Файл из public/ в сжатом варианте под Accept-Encoding, с ETag."""
+    encoding, body, etag = asset.variant(request.headers.get("Accept-Encoding", ""))
+    resp = Response(body, content_type=asset.mimetype)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = cache_control
+    return resp.make_conditional(request)
+
+
+def public_file(name: str) -> Response:
+    if app.debug:
+        # При разработке файлы правят на ходу: пересобрать манифест, если что-то изменилось.
+        assets.reload_if_changed()
+    asset = assets.get(name)
+    if asset is None:
+        abort(404)
+    return asset_response(asset, static_assets.REVALIDATE)
+
+
 @app.get("/")
 def index_page():
-    return send_from_directory(app.static_folder, "index.html")
+    return public_file("index.html")
 
 
 @app.get("/product.html")
 def product_page():
-    return send_from_directory(app.static_folder, "product.html")
+    return public_file("product.html")
+
 
+@app.get("/assets/<name>")
+def fingerprinted_asset(name: str):
+    """CSS/JS с хэшем в имени: содержимое по этому URL не меняется, кэш на год."""
+    if app.debug:
+        assets.reload_if_changed()
+    asset = assets.by_url(f"/assets/{name}")
+    if asset is None:
+        abort(404)
+    return asset_response(asset, static_assets.IMMUTABLE)
 
+
+# Старые адреса без хэша (закладки, страницы из кэша браузера): с перепроверкой.
 @app.get("/style.css")
 def style_css():
-    return app.send_static_file("style.css")
+    return public_file("style.css")
 
 
 @app.get("/script.js")
 def script_js():
-    return app.send_static_file("script.js")
+    return public_file("script.js")
+
+
+def init_app_pool() -> None:
+    """Пул соединений текущего процесса с размерами из конфигурации (DB_POOL_*) и репликами."""
+    init_pool(
+        DATABASE_URL,
+        minconn=DB_POOL_MIN,
+        maxconn=DB_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        max_age=DB_POOL_MAX_AGE,
+        check_idle_after=DB_POOL_CHECK_IDLE_AFTER,
+        replica_urls=DATABASE_REPLICA_URLS,
+        replica_balance=DB_REPLICA_BALANCE,
+        replica_max_lag=DB_REPLICA_MAX_LAG,
+        replica_check_interval=DB_REPLICA_CHECK_INTERVAL,
+        replica_retry_after=DB_REPLICA_RETRY_AFTER,
+        read_your_writes=DB_READ_YOUR_WRITES,
+    )
 
 
-if __name__ == "__main__":
-    init_pool(DATABASE_URL)
-    conn = get_connection()
+def bootstrap_catalog() -> None:
+    """
+    Создать схему и, если каталог пуст, загрузить fans_data.csv. Выполняется один раз
+    на запуск сервера (в gunicorn — в мастер-процессе, до запуска воркеров).
+    """
+    conn = get_connection(write=True)
     try:
         init_db(conn)
         if count_products(conn) == 0 and CSV_PATH.exists():
-            load_csv_into_db(conn, CSV_PATH)
+            if CSV_BULK_LOAD:
+                bulk_load_csv_into_db(conn, CSV_PATH, workers=CSV_PARSE_WORKERS)
+            else:
+                load_csv_into_db(conn, CSV_PATH, workers=CSV_PARSE_WORKERS)
+    finally:
+        put_connection(conn)
+
+
+# Запросы, которые прогоняются при прогреве: первая страница каталога и фильтры.
+WARMUP_URLS = ("/api/products?limit=24&total=1", "/api/facets", "/")
+
+
+def warm_up() -> None:
+    """
+    Прогрев перед приёмом запросов: построить снимок каталога и in-process индексы
+    и прогнать типичные запросы через приложение (соединения пула, кэш ответов).
+    В мастер-процессе gunicorn построенное достаётся воркерам при fork.
+    """
+    conn = get_connection()
+    try:
+        if CATALOG_SNAPSHOT:
+            get_snapshot(conn)
+        if SEARCH_INDEX:
+            get_search_index(conn)
+        get_suggest_index(conn)
+        get_duty_point_index(conn)
+        get_similarity_index(conn)
+        get_facets(conn)
     finally:
         put_connection(conn)
+    client = app.test_client()
+    for url in WARMUP_URLS:
+        client.get(url).close()
+
 
+if __name__ == "__main__":
+    # Сервер разработки: один процесс, отладчик и перезагрузка при правке кода
+    # (в debug-режиме FAST_JSON не действует). В продакшене — gunicorn, см. gunicorn.conf.py.
+    init_app_pool()
     try:
+        bootstrap_catalog()
         app.run(host="0.0.0.0", port=PORT, debug=True)
     finally:
         close_pool()
@@ -0,0 +1,206 @@
+"""
+ASGI-точка входа (asyncio): uvicorn asgi:app или ./run.sh --async.
+Отдаёт те же /api/health, /api/products и /api/products/<id_or_model>, что app.py, но без
+потока и соединения на каждый запрос: медленные клиенты держат только сокет, а
+соединение пула asyncpg берётся на время самих запросов к БД. Так один процесс держит
+тысячи открытых соединений клиентов.
+
+Параметры разбираются теми же функциями (request_params.py), SQL — тот же, что в
+db/repository.py. Отличия от app.py: только PostgreSQL, q ищется через LIKE (как при
+SEARCH_INDEX=0), без кэша ответов, ETag и сжатия — их делает прокси перед сервером.
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent / ".env")
+
+from config import (
+    API_MAX_PAGE_SIZE,
+    ASGI_BACKLOG,
+    ASGI_LIMIT_CONCURRENCY,
+    DATABASE_URL,
+    DB_PLAN_CACHE_MODE,
+    DB_POOL_MAX,
+    DB_POOL_MIN,
+    DB_POOL_TIMEOUT,
+    METRICS,
+    PORT,
+    SLOW_QUERY_MS,
+    WEB_GRACEFUL_TIMEOUT,
+    WEB_WORKERS,
+)
+import metrics
+from db import async_repository as repo
+from db.sqlite_store import is_sqlite_url
+from request_params import normalize_whitespace, page_params, product_filters, slugify
+
+_pool = None
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, error: str, headers: Optional[Headers] = None):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+        self.headers = headers or []
+
+
+def _json_body(value: Any) -> bytes:
+    # Как jsonify в компактном режиме Flask: ключи по алфавиту, ensure_ascii, перевод строки.
+    return (json.dumps(value, sort_keys=True, separators=(",", ":")) + "\n").encode("ascii")
+
+
+def _json_list_body(items: List[str]) -> bytes:
+    """Массив из готовых JSON-строк товаров (as_json=True); то же, что _json_body(list)."""
+    return ("[" + ",".join(items) + "]\n").encode("ascii")
+
+
+def _query_args(scope: dict) -> Dict[str, str]:
+    """Query string -> {имя: первое значение}, как request.args.get во Flask."""
+    args: Dict[str, str] = {}
+    query = scope.get("query_string", b"").decode("latin-1")
+    for name, value in parse_qsl(query, keep_blank_values=True, encoding="utf-8", errors="replace"):
+        args.setdefault(name, value)
+    return args
+
+
+async def _acquire():
+    try:
+        return await _pool.acquire(timeout=DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPError(503, "Database is busy, try again later", [(b"retry-after", b"1")])
+
+
+async def health(args: Dict[str, str]) -> Tuple[bytes, Headers]:
+    conn = await _acquire()
+    try:
+        n = await repo.count_products(conn)
+    finally:
+        await _pool.release(conn)
+    return _json_body({"ok": True, "products": n}), []
+
+
+async def products(args: Dict[str, str]) -> Tuple[bytes, Headers]:
+    filters = product_filters(args)
+    limit, cursor, with_total = page_params(args)
+    conn = await _acquire()
+    try:
+        if limit is None and cursor is None:
+            return _json_list_body(await repo.list_products(conn, as_json=True, **filters)), []
+        limit = API_MAX_PAGE_SIZE if limit is None else int(min(max(limit, 1), API_MAX_PAGE_SIZE))
+        try:
+            page = await repo.list_products_page(
+                conn, limit=limit, cursor=cursor, with_total=with_total, as_json=True, **filters
+            )
+        except ValueError:
+            raise HTTPError(400, "Invalid cursor")
+    finally:
+        await _pool.release(conn)
+    headers: Headers = []
+    if page["next_cursor"]:
+        headers.append((b"x-next-cursor", page["next_cursor"].encode("ascii")))
+    if page["total"] is not None:
+        headers.append((b"x-total-count", str(page["total"]).encode("ascii")))
+    return _json_list_body(page["items"]), headers
+
+
+async def product_detail(raw: str) -> Tuple[bytes, Headers]:
+    raw = normalize_whitespace(raw)
+    conn = await _acquire()
+    try:
+        p = await repo.find_product(conn, raw, raw.lower(), slugify(raw))
+    finally:
+        await _pool.release(conn)
+    if not p:
+        raise HTTPError(404, "Product not found")
+    return _json_body(p), []
+
+
+async def _dispatch(path: str, args: Dict[str, str]) -> Tuple[str, bytes, Headers]:
+    """(правило маршрута для метрик, тело, заголовки); HTTPError — ответ с ошибкой."""
+    if path == "/api/health":
+        return ("/api/health",) + await health(args)
+    if path == "/api/products":
+        return ("/api/products",) + await products(args)
+    prefix = "/api/products/"
+    if path.startswith(prefix) and "/" not in path[len(prefix):] and path != prefix:
+        return ("/api/products/<id_or_model>",) + await product_detail(path[len(prefix):])
+    raise HTTPError(404, "Not found")
+
+
+async def _http(scope: dict, send) -> None:
+    started = time.perf_counter()
+    method = scope["method"]
+    rule, status, headers = "<unmatched>", 200, []
+    try:
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405, "Method not allowed", [(b"allow", b"GET, HEAD")])
+        rule, body, headers = await _dispatch(scope["path"], _query_args(scope))
+    except HTTPError as e:
+        status, body, headers = e.status, _json_body({"error": e.error}), e.headers
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+            ]
+            + headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": b"" if method == "HEAD" else body})
+    metrics.observe_request(rule, method, status, time.perf_counter() - started)
+
+
+async def _lifespan(receive, send) -> None:
+    global _pool
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                if is_sqlite_url(DATABASE_URL):
+                    raise RuntimeError("ASGI-режим работает только с PostgreSQL")
+                metrics.configure(enabled=METRICS, slow_query_ms=SLOW_QUERY_MS)
+                _pool = await repo.create_pool(
+                    DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, plan_cache_mode=DB_PLAN_CACHE_MODE
+                )
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _pool is not None:
+                await _pool.close()
+                _pool = None
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: dict, receive, send) -> None:
+    if scope["type"] == "http":
+        await _http(scope, send)
+    elif scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "asgi:app",
+        host="0.0.0.0",
+        port=PORT,
+        workers=WEB_WORKERS,
+        backlog=ASGI_BACKLOG,
+        limit_concurrency=ASGI_LIMIT_CONCURRENCY or None,
+        timeout_graceful_shutdown=WEB_GRACEFUL_TIMEOUT,
+    )
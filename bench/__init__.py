@@ -0,0 +1,4 @@
+"""
+Бенчмарки каталога: генератор синтетических CSV, замер загрузки и нагрузочный прогон API.
+Запуск из корня проекта: python -m bench.<модуль> --help
+"""
@@ -0,0 +1,76 @@
+"""
+Сравнение двух файлов результатов (bench.load_driver или bench.load_timing).
+Печатает изменения метрик; код выхода 1, если что-то стало хуже больше чем на --threshold.
+
+  python -m bench.compare bench/results/api-before.json bench/results/api-after.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+# Метрики, где больше — лучше; для остальных (задержки) лучше меньше.
+HIGHER_IS_BETTER = ("throughput_rps", "rows_per_sec")
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _metrics(data: dict) -> Iterator[Tuple[str, float]]:
+    results = data.get("results", {})
+    if data.get("kind") == "api":
+        yield "throughput_rps", results.get("throughput_rps", 0.0)
+        for key in LATENCY_KEYS:
+            yield f"all.{key}", results.get("latency", {}).get(key, 0.0)
+        for name, summary in results.get("scenarios", {}).items():
+            for key in LATENCY_KEYS:
+                yield f"{name}.{key}", summary.get(key, 0.0)
+    else:
+        for mode, res in results.items():
+            yield f"{mode}.rows_per_sec", res.get("rows_per_sec", 0)
+            yield f"{mode}.p50_ms", res.get("summary", {}).get("p50_ms", 0.0)
+
+
+def compare(before: dict, after: dict, threshold: float) -> Tuple[list, bool]:
+    """[(метрика, было, стало, изменение в %, хуже ли)], есть ли регрессии."""
+    old: Dict[str, float] = dict(_metrics(before))
+    rows = []
+    regressed = False
+    for name, new_value in _metrics(after):
+        if name not in old:
+            continue
+        old_value = old[name]
+        change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+        higher_better = name.endswith(HIGHER_IS_BETTER)
+        worse = -change if higher_better else change
+        is_regression = worse > threshold
+        regressed |= is_regression
+        rows.append((name, old_value, new_value, change, is_regression))
+    return rows, regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарков")
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument(
+        "--threshold", type=float, default=10.0, help="допустимое ухудшение, %% (по умолчанию 10)"
+    )
+    args = parser.parse_args()
+
+    before = json.loads(args.before.read_text(encoding="utf-8"))
+    after = json.loads(args.after.read_text(encoding="utf-8"))
+    if before.get("kind") != after.get("kind"):
+        sys.exit(f"Разные виды результатов: {before.get('kind')} и {after.get('kind')}")
+
+    rows, regressed = compare(before, after, args.threshold)
+    width = max((len(r[0]) for r in rows), default=10)
+    for name, old_value, new_value, change, is_regression in rows:
+        mark = "  ХУЖЕ" if is_regression else ""
+        print(f"{name:<{width}}  {old_value:>12}  {new_value:>12}  {change:+7.1f}%{mark}")
+    if regressed:
+        print(f"Есть ухудшения больше {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Генератор синтетического каталога на основе fans_data.csv: те же колонки и форматы
+(диапазоны "900 - 3600", цены с пробелами между разрядами "18 500"), N строк.
+Результат детерминирован для одного и того же seed.
+
+  python -m bench.generate_catalog 100000
+  python -m bench.generate_catalog 10k 100k 1m --out-dir bench/data
+"""
+import argparse
+import csv
+import random
+from pathlib import Path
+from typing import Iterator, List
+
+from db.load_csv import CSV_PATH, normalize_whitespace, parse_number_loose, parse_range_loose
+
+BENCH_DIR = Path(__file__).resolve().parent
+DATA_DIR = BENCH_DIR / "data"
+
+HEADER = [
+    "number", "type", "model", "size", "diameter", "efficiency", "pressure",
+    "power", "noise_level", "price", "-", "-",
+]
+
+# Стандартный ряд диаметров (мм) для синтетических типоразмеров.
+DIAMETERS = [200, 250, 315, 355, 400, 450, 500, 560, 630, 710, 800, 900, 1000, 1120, 1250]
+# Доля строк с пустым значением поля — как пропуски в реальных прайсах.
+EMPTY_SHARE = 0.02
+
+
+def parse_size(value: str) -> int:
+    """'10k' / '1m' / '250000' -> число строк."""
+    s = value.strip().lower().replace("_", "")
+    mult = 1
+    if s.endswith("k"):
+        s, mult = s[:-1], 1_000
+    elif s.endswith("m"):
+        s, mult = s[:-1], 1_000_000
+    return int(float(s) * mult)
+
+
+def format_number(value: float) -> str:
+    """Число в формате прайса: целое с пробелами между разрядами ("1 310 600")."""
+    return f"{int(round(value)):,}".replace(",", " ")
+
+
+def format_range(lo: float, hi: float) -> str:
+    return f"{int(round(lo))} - {int(round(hi))}"
+
+
+def load_templates(csv_path: Path) -> List[dict]:
+    with csv_path.open("r", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f, delimiter=";"))
+    templates = []
+    for row in rows:
+        type_ = normalize_whitespace(row.get("type"))
+        size = normalize_whitespace(row.get("size"))
+        if not type_ or not size:
+            continue
+        af_min, af_max, _ = parse_range_loose(row.get("efficiency"))
+        pr_min, pr_max, _ = parse_range_loose(row.get("pressure"))
+        templates.append(
+            {
+                "type": type_,
+                "size": size,
+                "diameter": parse_number_loose(row.get("diameter")) or 400.0,
+                "airflow": (af_min or 500.0, af_max or 2000.0),
+                "pressure": (pr_min or 50.0, pr_max or 300.0),
+                "power": parse_number_loose(row.get("power")) or 250.0,
+                "noise_level": parse_number_loose(row.get("noise_level")) or 85.0,
+                "price": parse_number_loose(row.get("price")) or 50000.0,
+            }
+        )
+    return templates
+
+
+def generate_rows(n: int, templates: List[dict], seed: int = 42) -> Iterator[List[str]]:
+    rnd = random.Random(seed)
+
+    def maybe(value: str) -> str:
+        return "" if rnd.random() < EMPTY_SHARE else value
+
+    for i in range(1, n + 1):
+        # Серии по 5 исполнений одного типоразмера, как в исходном каталоге.
+        series, variant = divmod(i - 1, 5)
+        variant += 1
+        if variant == 1:
+            t = templates[rnd.randrange(len(templates))]
+            diameter = rnd.choice(DIAMETERS) if rnd.random() < 0.3 else int(t["diameter"])
+            size = f"{t['size']}-{series:06d}"
+            base = rnd.uniform(0.6, 1.2)
+        # Исполнения серии различаются производительностью: чем старше, тем мощнее.
+        scale = base * (1 + 0.15 * (variant - 1)) * rnd.uniform(0.95, 1.05)
+        model = f"{size}-{variant}"
+        af_lo, af_hi = (v * scale for v in t["airflow"])
+        pr_lo, pr_hi = (v * rnd.uniform(0.8, 1.3) for v in t["pressure"])
+        power = t["power"] * scale
+        noise = t["noise_level"] + rnd.uniform(-5, 5)
+        price = t["price"] * scale * rnd.uniform(0.85, 1.2)
+        yield [
+            str(i),
+            t["type"],
+            model,
+            size,
+            maybe(str(diameter)),
+            maybe(format_range(af_lo, af_hi)),
+            maybe(format_range(pr_lo, pr_hi)),
+            maybe(str(int(round(power)))),
+            maybe(str(int(round(noise)))),
+            # Цены в прайсах округлены до сотен.
+            maybe(format_number(max(100.0, round(price, -2)))),
+            "-",
+            "-",
+        ]
+
+
+def write_catalog(path: Path, n: int, templates: List[dict], seed: int = 42) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";", lineterminator="\n")
+        writer.writerow(HEADER)
+        writer.writerows(generate_rows(n, templates, seed))
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Синтетический каталог вентиляторов для бенчмарков")
+    parser.add_argument("sizes", nargs="+", help="число строк: 10000, 10k, 100k, 1m")
+    parser.add_argument("--out-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--source", type=Path, default=CSV_PATH, help="CSV-образец")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    templates = load_templates(args.source)
+    for size in args.sizes:
+        n = parse_size(size)
+        path = write_catalog(args.out_dir / f"catalog_{n}.csv", n, templates, args.seed)
+        print(f"{path}: {n} строк")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Нагрузочный прогон API: смесь запросов /api/products с типичными комбинациями фильтров
+и карточек товара. Значения фильтров берутся из того же CSV, что загружен в БД.
+Отчёт: p50/p95/p99 и пропускная способность — всего и по каждому сценарию.
+
+  python -m bench.load_driver --base-url http://localhost:3000 --csv bench/data/catalog_100000.csv
+  python -m bench.load_driver --in-process --requests 2000 --concurrency 4
+"""
+import argparse
+import http.client
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import quote, urlencode, urlsplit
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+from db.load_csv import CSV_PATH, iter_product_rows, open_csv_reader
+
+from bench.results import latency_summary, run_metadata, write_results
+
+SORTS = ["price_asc", "price_desc", "airflow_desc", "pressure_desc", "noise_asc", "power_asc"]
+PAGE_SIZE = 24
+
+
+class Catalog:
+    """Значения из CSV, из которых собираются запросы."""
+
+    def __init__(self, csv_path: Path, max_rows: int = 200_000):
+        self.ids: List[str] = []
+        self.models: List[str] = []
+        self.types: List[str] = []
+        self.diameters: List[float] = []
+        self.prices: List[float] = []
+        with csv_path.open("r", encoding="utf-8") as f:
+            for n, row in enumerate(iter_product_rows(open_csv_reader(f))):
+                if n >= max_rows:
+                    break
+                self.ids.append(row[0])
+                self.models.append(row[3])
+                if row[2]:
+                    self.types.append(row[2])
+                if row[5] is not None:
+                    self.diameters.append(row[5])
+                if row[14] is not None:
+                    self.prices.append(row[14])
+        self.type_values = sorted(set(self.types))
+        self.diameter_values = sorted(set(self.diameters))
+        self.prices.sort()
+
+
+def _price_bounds(rnd: random.Random, catalog: Catalog) -> Tuple[float, float]:
+    lo = catalog.prices[rnd.randrange(len(catalog.prices) // 2)]
+    hi = catalog.prices[rnd.randrange(len(catalog.prices) // 2, len(catalog.prices))]
+    return lo, hi
+
+
+def _products(params: Dict[str, object]) -> str:
+    return "/api/products?" + urlencode(params)
+
+
+# Сценарии: имя -> (вес, построитель URL).
+def _scenarios(catalog: Catalog) -> Dict[str, Tuple[int, Callable[[random.Random], str]]]:
+    return {
+        "list_first_page": (
+            25,
+            lambda r: _products({"limit": PAGE_SIZE, "sort": r.choice(SORTS)}),
+        ),
+        "list_type": (
+            15,
+            lambda r: _products(
+                {"limit": PAGE_SIZE, "type": r.choice(catalog.type_values), "total": 1}
+            ),
+        ),
+        "list_type_diameter": (
+            10,
+            lambda r: _products(
+                {
+                    "limit": PAGE_SIZE,
+                    "type": r.choice(catalog.type_values),
+                    "diameter": int(r.choice(catalog.diameter_values)),
+                }
+            ),
+        ),
+        "list_price_range": (
+            10,
+            lambda r: _products(
+                dict(
+                    zip(("minPrice", "maxPrice"), map(int, _price_bounds(r, catalog))),
+                    limit=PAGE_SIZE,
+                    sort=r.choice(SORTS),
+                )
+            ),
+        ),
+        "list_duty_ranges": (
+            10,
+            lambda r: _products(
+                {
+                    "limit": PAGE_SIZE,
+                    "minAirflow": r.choice([500, 1000, 2000, 5000, 10000]),
+                    "minPressure": r.choice([50, 100, 200, 400]),
+                    "maxNoise": r.choice([80, 90, 100]),
+                }
+            ),
+        ),
+        "search_q": (
+            10,
+            lambda r: _products(
+                {"limit": PAGE_SIZE, "q": _model_fragment(r, r.choice(catalog.models))}
+            ),
+        ),
+        "detail_by_id": (
+            15,
+            lambda r: "/api/products/" + quote(r.choice(catalog.ids)),
+        ),
+        "detail_by_model": (
+            5,
+            lambda r: "/api/products/" + quote(r.choice(catalog.models)),
+        ),
+    }
+
+
+def _model_fragment(rnd: random.Random, model: str) -> str:
+    """Кусок названия модели, как его набирают в поиске."""
+    if len(model) <= 6:
+        return model
+    start = rnd.randrange(0, len(model) // 2)
+    return model[start:start + rnd.randint(4, 10)]
+
+
+class HttpClient:
+    """Клиент с постоянным соединением (по одному на поток)."""
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self._host = parts.hostname or "localhost"
+        self._port = parts.port or (443 if parts.scheme == "https" else 80)
+        self._https = parts.scheme == "https"
+        self._timeout = timeout
+        self._conn = None
+
+    def get(self, path: str) -> int:
+        for attempt in range(2):
+            if self._conn is None:
+                cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+                self._conn = cls(self._host, self._port, timeout=self._timeout)
+            try:
+                self._conn.request("GET", path)
+                resp = self._conn.getresponse()
+                resp.read()
+                return resp.status
+            except (http.client.HTTPException, OSError):
+                self._conn.close()
+                self._conn = None
+                if attempt:
+                    raise
+        return 0
+
+
+class InProcessClient:
+    """Запросы через Flask test client — без HTTP-сервера, для быстрых сравнений."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def get(self, path: str) -> int:
+        return self._client.get(path).status_code
+
+
+def run(
+    make_client: Callable[[], object],
+    catalog: Catalog,
+    *,
+    requests: int,
+    duration: float,
+    concurrency: int,
+    warmup: int,
+    seed: int,
+) -> Dict[str, object]:
+    scenarios = _scenarios(catalog)
+    names = list(scenarios)
+    weights = [scenarios[n][0] for n in names]
+    lock = threading.Lock()
+    samples: Dict[str, List[float]] = defaultdict(list)
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    issued = 0
+    deadline = None
+
+    def take() -> bool:
+        nonlocal issued
+        with lock:
+            if requests and issued >= requests:
+                return False
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            issued += 1
+            return True
+
+    def worker(worker_no: int, record: bool) -> None:
+        rnd = random.Random(seed * 1000 + worker_no + (0 if record else 500))
+        client = make_client()
+        count = 0
+        while (take() if record else count < warmup):
+            count += 1
+            name = rnd.choices(names, weights)[0]
+            path = scenarios[name][1](rnd)
+            t0 = time.perf_counter()
+            try:
+                status = client.get(path)
+            except Exception as e:  # noqa: BLE001 — в отчёт, а не падение прогона
+                if record:
+                    with lock:
+                        errors[type(e).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - t0
+            if record:
+                with lock:
+                    samples[name].append(elapsed)
+                    statuses[status] += 1
+
+    if warmup:
+        threads = [threading.Thread(target=worker, args=(i, False)) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    started = time.perf_counter()
+    if duration:
+        deadline = started + duration
+    threads = [threading.Thread(target=worker, args=(i, True)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    all_samples = [s for values in samples.values() for s in values]
+    return {
+        "elapsed_sec": round(elapsed, 3),
+        "requests": len(all_samples),
+        "throughput_rps": round(len(all_samples) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency": latency_summary(all_samples),
+        "scenarios": {name: latency_summary(samples[name]) for name in names if samples[name]},
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": dict(errors),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон API каталога")
+    parser.add_argument("--base-url", default="http://localhost:3000")
+    parser.add_argument("--in-process", action="store_true", help="без сервера, через test client")
+    parser.add_argument("--csv", type=Path, default=CSV_PATH, help="CSV, загруженный в БД")
+    parser.add_argument("--requests", type=int, default=5000, help="0 — ограничение только по времени")
+    parser.add_argument("--duration", type=float, default=0.0, help="секунд, 0 — без ограничения")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=50, help="запросов прогрева на поток")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="файл результатов (JSON)")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("нужно --requests или --duration")
+
+    catalog = Catalog(args.csv)
+    if args.in_process:
+        from app import app
+        from config import DATABASE_URL, DB_POOL_MAX
+        from db.connection import init_pool
+
+        init_pool(DATABASE_URL, maxconn=DB_POOL_MAX)
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+    else:
+        make_client = lambda: HttpClient(args.base_url, args.timeout)  # noqa: E731
+
+    result = run(
+        make_client,
+        catalog,
+        requests=args.requests,
+        duration=args.duration,
+        concurrency=args.concurrency,
+        warmup=args.warmup,
+        seed=args.seed,
+    )
+    lat = result["latency"]
+    print(
+        f"{result['requests']} запросов за {result['elapsed_sec']} с: "
+        f"{result['throughput_rps']} rps, p50 {lat['p50_ms']} мс, "
+        f"p95 {lat['p95_ms']} мс, p99 {lat['p99_ms']} мс"
+    )
+    for name, s in result["scenarios"].items():
+        print(f"  {name:20} n={s['count']:<6} p50 {s['p50_ms']:>9} мс  p99 {s['p99_ms']:>9} мс")
+    if result["errors"]:
+        print(f"Ошибки: {result['errors']}")
+
+    meta = run_metadata(
+        target="in-process" if args.in_process else args.base_url,
+        csv=str(args.csv),
+        requests=args.requests,
+        duration=args.duration,
+        concurrency=args.concurrency,
+        warmup=args.warmup,
+        seed=args.seed,
+    )
+    path = write_results("api", {"meta": meta, "results": result}, args.out)
+    print(f"Результаты: {path}")
+
+
+if __name__ == "__main__":
+    main()
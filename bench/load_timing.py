@@ -0,0 +1,91 @@
+"""
+Замер загрузки CSV в products: построчный upsert (load_csv_into_db), COPY через staging
+(bulk_load_csv_into_db) и инкрементальная синхронизация (sync_csv_into_db).
+Перед каждым прогоном таблица products очищается. Нужна отдельная БД: данные затираются.
+
+  python -m bench.load_timing bench/data/catalog_100000.csv --modes rows bulk --repeat 3
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+from config import DATABASE_URL
+from db.connection import close_pool, get_connection, init_pool, is_sqlite, put_connection
+from db.init_db import init_db
+from db.load_csv import bulk_load_csv_into_db, load_csv_into_db, sync_csv_into_db
+
+from bench.results import latency_summary, run_metadata, write_results
+
+MODES: Dict[str, Callable[[Any, Path], Any]] = {
+    "rows": load_csv_into_db,
+    "bulk": bulk_load_csv_into_db,
+    "sync": sync_csv_into_db,
+}
+
+
+def _truncate(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM products")
+        cur.execute("DELETE FROM catalog_sources")
+    conn.commit()
+
+
+def _table_size(conn) -> int:
+    if is_sqlite(conn):
+        return Path(conn.path).stat().st_size
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_total_relation_size('products')")
+        return cur.fetchone()[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замер загрузки CSV в БД")
+    parser.add_argument("csv_path", type=Path)
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["rows", "bulk"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="файл результатов (JSON)")
+    args = parser.parse_args()
+
+    with args.csv_path.open("r", encoding="utf-8") as f:
+        rows = sum(1 for _ in f) - 1
+
+    init_pool(DATABASE_URL)
+    conn = get_connection(write=True)
+    results: Dict[str, Any] = {}
+    try:
+        init_db(conn)
+        for mode in args.modes:
+            samples = []
+            for _ in range(args.repeat):
+                _truncate(conn)
+                t0 = time.perf_counter()
+                MODES[mode](conn, args.csv_path)
+                samples.append(time.perf_counter() - t0)
+            summary = latency_summary(samples)
+            best = min(samples)
+            results[mode] = {
+                "runs_ms": [round(s * 1000, 3) for s in samples],
+                "summary": summary,
+                "rows_per_sec": round(rows / best) if best > 0 else 0,
+                "table_bytes": _table_size(conn),
+            }
+            print(
+                f"{mode}: {summary['p50_ms'] / 1000:.3f} с (медиана), "
+                f"{results[mode]['rows_per_sec']} строк/с"
+            )
+    finally:
+        put_connection(conn)
+        close_pool()
+
+    meta = run_metadata(csv=str(args.csv_path), rows=rows, modes=args.modes, repeat=args.repeat)
+    path = write_results("load", {"meta": meta, "results": results}, args.out)
+    print(f"Результаты: {path}")
+
+
+if __name__ == "__main__":
+    main()
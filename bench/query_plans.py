@@ -0,0 +1,290 @@
+"""
+Проверка планов запросов каталога: EXPLAIN (ANALYZE, BUFFERS) по набору типичных форм
+запросов (те же SQL, что строит db/repository.py). Ошибка, если запрос читает products
+последовательным сканированием, план отличается от сохранённого baseline или запрос стал
+хуже (больше прочитанных буферов, чем допускает --threshold). Код выхода 1 при любой ошибке.
+Только PostgreSQL; схема перед проверкой доводится до актуальной (init_db).
+
+Запросы выполняются так же, как в приложении (db/prepared.py, asyncpg): PREPARE и
+несколько EXECUTE с тем же DB_PLAN_CACHE_MODE (при auto после них сервер может перейти на
+общий план) — и проверяется план того EXECUTE, что идёт следом. --no-prepare — EXPLAIN
+по тексту запроса, как при DB_PREPARED_STATEMENTS=0.
+
+Seq Scan имеет смысл ловить на каталоге реального размера: на таблице меньше --min-rows
+строк планировщик справедливо выбирает его всегда, и такие находки не считаются ошибкой.
+
+  python load_csv.py --bulk bench/data/catalog_100000.csv
+  python -m bench.query_plans                        # сравнить с bench/query_plans_baseline.json
+  python -m bench.query_plans --update-baseline      # записать новый baseline
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+from config import DATABASE_URL, DB_PLAN_CACHE_MODE
+from db.connection import close_pool, get_connection, init_pool, is_sqlite, put_connection
+from db.init_db import init_db
+from db.prepared import _execute_sql, _numbered, set_plan_cache_mode
+from db.repository import (
+    _FIND_PRODUCT_SQL,
+    _after_cursor,
+    _count_sql,
+    _filter_conditions,
+    _order_by,
+    _products_sql,
+    _sort_spec,
+)
+
+BASELINE_PATH = Path(__file__).resolve().parent / "query_plans_baseline.json"
+# Страница API: limit + 1 строка, чтобы узнать, есть ли следующая.
+PAGE = 21
+# Первые 5 выполнений подготовленного запроса PostgreSQL планирует под параметры, на
+# шестом решает, оставить ли общий план: EXPLAIN идёт после стольких EXECUTE.
+CUSTOM_PLAN_RUNS = 5
+_STATEMENT = "query_plans_shape"
+
+
+def _page(sort: str = "price_asc", extra: Tuple[List[str], List[Any]] = ([], []), **filters):
+    conditions, params = _filter_conditions(**filters)
+    _, column, direction = _sort_spec(sort)
+    sql = _products_sql(conditions + extra[0], _order_by(column, direction), True)
+    return sql, params + extra[1] + [PAGE]
+
+
+def _count(**filters):
+    conditions, params = _filter_conditions(**filters)
+    return _count_sql(conditions), params
+
+
+def _find(id_value: str, model: str, slug: str):
+    return _FIND_PRODUCT_SQL, [id_value, model, slug, id_value, model]
+
+
+# Формы запросов: имя -> (SQL, параметры). Значения подобраны под каталог
+# bench.generate_catalog (два типа, 20 диаметров): фильтры отбирают от долей процента
+# до нескольких процентов строк, как выбор в интерфейсе.
+CORPUS: Dict[str, Callable[[], Tuple[str, List[Any]]]] = {
+    "page": lambda: _page(),
+    "page_price_desc": lambda: _page("price_desc"),
+    "page_airflow_desc": lambda: _page("airflow_desc"),
+    "page_pressure_desc": lambda: _page("pressure_desc"),
+    "page_noise_asc": lambda: _page("noise_asc"),
+    "page_power_asc": lambda: _page("power_asc"),
+    "page_after_cursor": lambda: _page(
+        extra=([_after_cursor("price", "ASC")], ["500000", "500000", "", ""])
+    ),
+    "type": lambda: _page(type_="УВОП"),
+    "type_diameter": lambda: _page(type_="ВО", diameter=630),
+    "type_diameter_price_desc": lambda: _page("price_desc", type_="ВО", diameter=630),
+    "diameter": lambda: _page(diameter=1250),
+    "price_range": lambda: _page(min_price=100000, max_price=110000),
+    "type_price_range": lambda: _page(type_="УВОП", min_price=100000, max_price=110000),
+    "power_range": lambda: _page(min_power=100, max_power=150),
+    "noise_max": lambda: _page(max_noise=78),
+    "diameter_range": lambda: _page(min_diameter=1000, max_diameter=1120),
+    "airflow_min": lambda: _page(min_airflow=400000),
+    "airflow_max": lambda: _page(max_airflow=1500),
+    "pressure_min": lambda: _page(min_pressure=1400),
+    "pressure_max": lambda: _page(max_pressure=30),
+    "duty_point": lambda: _page(min_airflow=150000, max_airflow=152000, min_pressure=900),
+    # Узкие диапазоны (десятки-сотни строк) — из индексов диапазонов, а не обходом по цене.
+    "power_narrow": lambda: _page(min_power=80000),
+    "noise_narrow": lambda: _page(max_noise=77.5),
+    "duty_point_narrow": lambda: _page(min_airflow=600000, max_airflow=610000, min_pressure=1500),
+    "pressure_narrow": lambda: _page(min_pressure=1400, max_pressure=40),
+    "ids": lambda: _page(ids=[str(n) for n in range(1000, 100000, 2000)]),
+    "count_type_diameter": lambda: _count(type_="ВО", diameter=630),
+    "count_power_range": lambda: _count(min_power=100, max_power=150),
+    "find_by_id": lambda: _find("4242", "4242", "4242"),
+    "find_by_model": lambda: _find(
+        "увоп-д-10-6-000848-2", "увоп-д-10-6-000848-2", "увоп-д-10-6-000848-2"
+    ),
+}
+
+
+def _walk(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _node_label(node: dict) -> str:
+    label = node["Node Type"]
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    elif "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    return label
+
+
+def explain(conn, sql: str, params: List[Any], repeat: int, prepared: bool) -> Dict[str, Any]:
+    """Прогнать EXPLAIN (ANALYZE, BUFFERS) repeat раз; итог по последнему, время — лучшее."""
+    runs = []
+    try:
+        with conn.cursor() as cur:
+            if prepared:
+                cur.execute(f"PREPARE {_STATEMENT} AS {_numbered(sql)}")
+                statement = _execute_sql(_STATEMENT, len(params))
+                for _ in range(CUSTOM_PLAN_RUNS):
+                    cur.execute(statement, params)
+                    cur.fetchall()
+            else:
+                statement = sql
+            for _ in range(max(1, repeat)):
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, params)
+                runs.append(cur.fetchone()[0][0])
+    finally:
+        conn.rollback()
+        if prepared:
+            # PREPARE не откатывается вместе с транзакцией.
+            with conn.cursor() as cur:
+                cur.execute(f"DEALLOCATE {_STATEMENT}")
+            conn.rollback()
+    plan = runs[-1]["Plan"]
+    nodes = list(_walk(plan))
+    return {
+        "plan": [_node_label(n) for n in nodes],
+        "seq_scans": sorted({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"}),
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "rows": plan.get("Actual Rows", 0),
+        "ms": round(min(r["Execution Time"] + r["Planning Time"] for r in runs), 3),
+    }
+
+
+def _table_rows(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = 'products'")
+        row = cur.fetchone()
+    conn.rollback()
+    return max(int(row[0]), 0) if row else 0
+
+
+def check(
+    results: Dict[str, dict],
+    baseline: Optional[dict],
+    table_rows: int,
+    threshold: float,
+    min_rows: int,
+    prepared: bool = True,
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """([(форма, ошибка)], [(форма, замечание)]) по результатам и baseline."""
+    problems: List[Tuple[str, str]] = []
+    notes: List[Tuple[str, str]] = []
+    for name, res in results.items():
+        if "products" in res["seq_scans"] and table_rows >= min_rows:
+            problems.append((name, "Seq Scan on products"))
+    if baseline is None:
+        return problems, notes
+    base_rows = baseline.get("table_rows", 0)
+    if not base_rows or abs(table_rows - base_rows) > base_rows * 0.1:
+        notes.append(("*", f"в baseline {base_rows} строк, в БД {table_rows}: планы не сравниваются"))
+        return problems, notes
+    if baseline.get("prepared", True) != prepared:
+        notes.append(("*", "baseline снят в другом режиме (--no-prepare): планы не сравниваются"))
+        return problems, notes
+    for name, res in results.items():
+        old = baseline["shapes"].get(name)
+        if old is None:
+            notes.append((name, "нет в baseline"))
+            continue
+        # Другой план — ошибка, даже если буферов не больше: индекс мог выпасть из плана
+        # на этих данных, а на других это уже полный обход.
+        if res["plan"] != old["plan"]:
+            was, now = " > ".join(old["plan"]), " > ".join(res["plan"])
+            problems.append((name, f"план изменился: {was}  ->  {now}"))
+        # Мелкие колебания (несколько страниц индекса) не в счёт.
+        limit = max(old["buffers"] * (1 + threshold / 100), old["buffers"] + 8)
+        if res["buffers"] > limit:
+            problems.append((name, f"буферов {old['buffers']} -> {res['buffers']}"))
+    return problems, notes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка планов запросов каталога")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="записать результаты как новый baseline"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=50.0, help="допустимый рост буферов, %% (по умолчанию 50)"
+    )
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=10_000,
+        help="Seq Scan — ошибка, только если в products не меньше стольких строк",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов EXPLAIN на форму")
+    parser.add_argument(
+        "--no-prepare", action="store_true", help="EXPLAIN по тексту запроса, без PREPARE/EXECUTE"
+    )
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="только эти формы")
+    parser.add_argument("--no-analyze", action="store_true", help="не обновлять статистику (ANALYZE)")
+    parser.add_argument("--verbose", action="store_true", help="печатать планы всех форм")
+    args = parser.parse_args()
+
+    set_plan_cache_mode(DB_PLAN_CACHE_MODE)
+    init_pool(DATABASE_URL)
+    conn = get_connection(write=True)
+    try:
+        if is_sqlite(conn):
+            sys.exit("Проверка планов работает только с PostgreSQL")
+        init_db(conn)
+        if not args.no_analyze:
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE products")
+            conn.commit()
+        table_rows = _table_rows(conn)
+        names = args.only or list(CORPUS)
+        unknown = [n for n in names if n not in CORPUS]
+        if unknown:
+            sys.exit(f"Неизвестные формы: {', '.join(unknown)}")
+        results = {}
+        for name in names:
+            sql, params = CORPUS[name]()
+            results[name] = explain(conn, sql, params, args.repeat, not args.no_prepare)
+    finally:
+        put_connection(conn)
+        close_pool()
+
+    width = max(len(n) for n in results)
+    print(f"products: ~{table_rows} строк")
+    for name, res in results.items():
+        print(f"{name:<{width}}  {res['ms']:>9.3f} мс  {res['buffers']:>7} буф.  {res['rows']:>6} строк")
+        if args.verbose:
+            print("    " + " > ".join(res["plan"]))
+
+    if args.update_baseline:
+        data = {"table_rows": table_rows, "prepared": not args.no_prepare, "shapes": results}
+        args.baseline.write_text(
+            json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"Baseline записан: {args.baseline}")
+        baseline = None
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    else:
+        print(f"Baseline {args.baseline} не найден: проверяются только Seq Scan")
+        baseline = None
+
+    problems, notes = check(
+        results, baseline, table_rows, args.threshold, args.min_rows, not args.no_prepare
+    )
+    if table_rows < args.min_rows:
+        notes.append(("*", f"в products меньше {args.min_rows} строк: Seq Scan не считается ошибкой"))
+    for name, note in notes:
+        print(f"  {name}: {note}")
+    for name, problem in problems:
+        print(f"  ОШИБКА {name}: {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,111 @@
 """
 import os
 
-# База данных
+# База данных: postgresql://... или sqlite:///path/to/catalog.db (встроенная БД, db/sqlite_store.py)
 DATABASE_URL = os.environ.get(
     "DATABASE_URL",
     "postgresql://localhost/ventmash",  # fallback для локальной разработки
 )
 
+# Пул соединений: размер, ожидание свободного соединения (сек), пересоздание по возрасту (сек)
+# и проверка SELECT 1 для соединений, простаивавших дольше DB_POOL_CHECK_IDLE_AFTER (сек)
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+DB_POOL_MAX_AGE = float(os.environ.get("DB_POOL_MAX_AGE", "1800"))
+DB_POOL_CHECK_IDLE_AFTER = float(os.environ.get("DB_POOL_CHECK_IDLE_AFTER", "30"))
+# Подготовленных запросов (PREPARE) на соединение для форм фильтров list_products; 0 — выкл.
+DB_PREPARED_STATEMENTS = int(os.environ.get("DB_PREPARED_STATEMENTS", "64"))
+# plan_cache_mode соединений: force_custom_plan — план под параметры каждого запроса
+# (общий план не видит узких диапазонов фильтров), auto — как по умолчанию в PostgreSQL.
+DB_PLAN_CACHE_MODE = os.environ.get("DB_PLAN_CACHE_MODE", "force_custom_plan")
+
+# Реплики PostgreSQL для чтения каталога: DSN через пробел. Запись и чтение сразу после
+# записи — на DATABASE_URL. Размеры пула реплики — те же DB_POOL_*
+DATABASE_REPLICA_URLS = os.environ.get("DATABASE_REPLICA_URLS", "").split()
+# Выбор реплики: round_robin или least_busy (наименьшая доля занятых соединений)
+DB_REPLICA_BALANCE = os.environ.get("DB_REPLICA_BALANCE", "round_robin")
+# Наибольшее допустимое отставание реплики (сек) и как часто его перепроверять (сек)
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "1"))
+# Сколько секунд не использовать реплику после ошибки соединения
+DB_REPLICA_RETRY_AFTER = float(os.environ.get("DB_REPLICA_RETRY_AFTER", "10"))
+# Сколько секунд после записи в этом процессе читать с основной БД (read-your-writes)
+DB_READ_YOUR_WRITES = float(os.environ.get("DB_READ_YOUR_WRITES", "5"))
+
 # Сервер
 PORT = int(os.environ.get("PORT", "3000"))
+# Продакшен-сервер (gunicorn.conf.py): процессы-воркеры, потоки в каждом, таймауты (сек).
+# Пул DB_POOL_* создаётся в каждом воркере: всего соединений до WEB_WORKERS × DB_POOL_MAX
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", str((os.cpu_count() or 1) * 2 + 1)))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "4"))
+WEB_TIMEOUT = int(os.environ.get("WEB_TIMEOUT", "30"))
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+# Прогрев перед приёмом запросов: снимок каталога, индексы, типичные запросы
+WARMUP = os.environ.get("WARMUP", "1") == "1"
+# ASGI-режим (asgi.py, ./run.sh --async): очередь ожидающих подключений на сокете и
+# предел одновременно обслуживаемых соединений на процесс (сверх него — 503; 0 — без предела).
+# Запросы к БД ограничены пулом DB_POOL_*, остальные ждут соединения не блокируя процесс
+ASGI_BACKLOG = int(os.environ.get("ASGI_BACKLOG", "4096"))
+ASGI_LIMIT_CONCURRENCY = int(os.environ.get("ASGI_LIMIT_CONCURRENCY", "0"))
+
+# Снимок каталога в памяти для /api/products (без запроса к БД на каждый вызов)
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT", "0") == "1"
+# Как часто (сек) проверять версию каталога в БД
+CATALOG_VERSION_CHECK_INTERVAL = float(
+    os.environ.get("CATALOG_VERSION_CHECK_INTERVAL", "2")
+)
+
+# Первичная загрузка CSV при старте через COPY (bulk_load_csv_into_db)
+CSV_BULK_LOAD = os.environ.get("CSV_BULK_LOAD", "0") == "1"
+# Процессы разбора CSV при загрузке (0 — по числу ядер, 1 — без пула процессов)
+CSV_PARSE_WORKERS = int(os.environ.get("CSV_PARSE_WORKERS", "0"))
+
+# Максимальный размер страницы /api/products?limit=...
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", "200"))
+
+# Поиск по q через in-process триграммный индекс (иначе LIKE по model/size/type)
+SEARCH_INDEX = os.environ.get("SEARCH_INDEX", "1") == "1"
+# Больше стольких совпадений поиска — q ищется через LIKE (0 — всегда через индекс)
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "5000"))
+# Минимальная доля совпавших триграмм для нечёткого совпадения (опечатки); 1 — выключить
+SEARCH_FUZZY_THRESHOLD = float(os.environ.get("SEARCH_FUZZY_THRESHOLD", "0.5"))
+
+# Фасеты /api/facets: число корзин гистограммы цен
+FACETS_PRICE_BUCKETS = int(os.environ.get("FACETS_PRICE_BUCKETS", "10"))
+
+# Подсказки /api/suggest: сколько значений отдавать по умолчанию
+SUGGEST_DEFAULT_LIMIT = int(os.environ.get("SUGGEST_DEFAULT_LIMIT", "10"))
+
+# Подбор по рабочей точке (/api/select): размер выдачи по умолчанию и предел пакета точек
+SELECT_DEFAULT_LIMIT = int(os.environ.get("SELECT_DEFAULT_LIMIT", "10"))
+SELECT_MAX_BATCH = int(os.environ.get("SELECT_MAX_BATCH", "500"))
+
+# Похожие вентиляторы (/api/products/<id>/similar): размер выдачи и предел пакета позиций КП
+SIMILAR_DEFAULT_LIMIT = int(os.environ.get("SIMILAR_DEFAULT_LIMIT", "10"))
+SIMILAR_MAX_BATCH = int(os.environ.get("SIMILAR_MAX_BATCH", "500"))
+
+# Потоковая выгрузка /api/products/export: строк в одной пачке серверного курсора
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+# Кэш ответов /api/products и /api/products/<id> (ключ — параметры + версия каталога)
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Списки товаров сериализуются в JSON без промежуточных dict (только вне debug-режима)
+FAST_JSON = os.environ.get("FAST_JSON", "1") == "1"
+
+# Метрики (/api/metrics), заголовок Server-Timing и порог журнала медленных SQL-запросов (мс)
+METRICS = os.environ.get("METRICS", "1") == "1"
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") == "1"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+
+# Сжатие ответов API (gzip/br по Accept-Encoding) — только для тел не меньше COMPRESS_MIN_BYTES
+COMPRESS = os.environ.get("COMPRESS", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+
+# Токен администратора для изменяющих эндпоинтов (Authorization: Bearer ...); пусто — выключены
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# Наибольший размер файла патча цен (/api/admin/prices), байт
+PRICE_PATCH_MAX_BYTES = int(os.environ.get("PRICE_PATCH_MAX_BYTES", str(32 * 1024 * 1024)))
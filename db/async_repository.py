@@ -0,0 +1,131 @@
+"""
+Асинхронные версии запросов db/repository.py для ASGI-режима (asgi.py): asyncpg и пул
+asyncpg.Pool. Текст SQL строится теми же функциями, что в синхронном репозитории,
+плейсхолдеры %s переводятся в $1, $2, ... Подготовленные запросы asyncpg кэширует на
+соединении сам (statement_cache_size), так что форма фильтров разбирается один раз; план,
+как и в db/prepared.py, по умолчанию строится под параметры (plan_cache_mode).
+
+Только PostgreSQL и без поискового индекса: q ищется через LIKE, как при SEARCH_INDEX=0.
+"""
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+
+import metrics
+from db.prepared import _numbered
+from db.repository import (
+    _FIND_PRODUCT_SQL,
+    _after_cursor,
+    _count_sql,
+    _filter_conditions,
+    _format_rows,
+    _nulls_after_cursor,
+    _order_by,
+    _page_cut,
+    _products_sql,
+    _row_to_product_dict,
+    _sort_spec,
+    decode_cursor,
+)
+
+
+async def create_pool(
+    dsn: str,
+    min_size: int = 1,
+    max_size: int = 10,
+    max_inactive_lifetime: float = 300.0,
+    plan_cache_mode: str = "force_custom_plan",
+) -> asyncpg.Pool:
+    """Пул asyncpg. Размер ограничивает запросы к БД, а не число открытых клиентов."""
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=min_size,
+        max_size=max_size,
+        max_inactive_connection_lifetime=max_inactive_lifetime,
+        server_settings={} if plan_cache_mode == "auto" else {"plan_cache_mode": plan_cache_mode},
+    )
+
+
+# Текст запроса -> он же с $1, $2, ...: форм фильтров немного, перевод делается один раз.
+_pg_sql = lru_cache(maxsize=1024)(_numbered)
+
+
+async def _fetch(conn, sql: str, params: List[Any]) -> list:
+    t0 = time.perf_counter()
+    try:
+        return await conn.fetch(_pg_sql(sql), *params)
+    finally:
+        metrics.observe_query(sql, params, time.perf_counter() - t0)
+
+
+async def list_products(conn, *, sort: str = "price_asc", as_json: bool = False, **filters) -> list:
+    """То же, что repository.list_products без relevance."""
+    conditions, params = _filter_conditions(**filters)
+    _, column, direction = _sort_spec(sort)
+    rows = await _fetch(conn, _products_sql(conditions, _order_by(column, direction)), params)
+    return _format_rows(rows, as_json)
+
+
+async def list_products_page(
+    conn,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    sort: str = "price_asc",
+    as_json: bool = False,
+    **filters,
+) -> Dict[str, Any]:
+    """То же, что repository.list_products_page без relevance: {"items", "next_cursor", "total"}."""
+    conditions, params = _filter_conditions(**filters)
+    sort, column, direction = _sort_spec(sort)
+    order = _order_by(column, direction)
+    fetch = limit + 1
+
+    if cursor is None:
+        rows = await _fetch(conn, _products_sql(conditions, order, True), params + [fetch])
+    else:
+        value, model, id_value = decode_cursor(cursor, sort)
+        rows = []
+        if value is not None:
+            after = _after_cursor(column, direction)
+            rows = await _fetch(
+                conn,
+                _products_sql(conditions + [after], order, True),
+                params + [value, value, model, id_value, fetch],
+            )
+        if len(rows) < fetch:
+            nulls, nulls_params = _nulls_after_cursor(column, value, model, id_value)
+            rows += await _fetch(
+                conn,
+                _products_sql(conditions + nulls, order, True),
+                params + nulls_params + [fetch - len(rows)],
+            )
+    rows, next_cursor = _page_cut(rows, limit, sort, column)
+
+    total = None
+    if with_total:
+        total = (await _fetch(conn, _count_sql(conditions), params))[0][0]
+
+    return {
+        "items": _format_rows(rows, as_json),
+        "next_cursor": next_cursor,
+        "total": total,
+    }
+
+
+async def find_product(
+    conn, id_value: str, model_value: str, slug_value: str
+) -> Optional[Dict[str, Any]]:
+    """То же, что repository.find_product."""
+    rows = await _fetch(
+        conn, _FIND_PRODUCT_SQL, [id_value, model_value, slug_value, id_value, model_value]
+    )
+    return _row_to_product_dict(rows[0]) if rows else None
+
+
+async def count_products(conn) -> int:
+    """Общее количество товаров в БД."""
+    return (await _fetch(conn, "SELECT COUNT(*) FROM products", []))[0][0]
@@ -0,0 +1,92 @@
+"""
+Версия каталога: счётчик в таблице catalog_meta, увеличивается при каждой загрузке CSV.
+По ней in-process структуры (снимок каталога и т.п.) понимают, что пора перестроиться.
+"""
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+# Как часто (в секундах) перечитывать версию из БД. Между проверками используется кэш.
+_check_interval = 2.0
+_lock = threading.Lock()
+_cached_version: Optional[int] = None
+_checked_at = 0.0
+
+
+def set_check_interval(seconds: float) -> None:
+    """Задать интервал перепроверки версии каталога."""
+    global _check_interval
+    _check_interval = max(0.0, float(seconds))
+
+
+def get_catalog_version(conn) -> int:
+    """Прочитать текущую версию каталога из БД."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM catalog_meta WHERE id = 1")
+        row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_catalog_version(cur) -> None:
+    """Увеличить версию каталога. Вызывается внутри транзакции, меняющей products."""
+    cur.execute(
+        "UPDATE catalog_meta SET version = version + 1, updated_at = NOW() WHERE id = 1"
+    )
+
+
+def current_catalog_version(conn) -> int:
+    """Версия каталога с кэшированием на check_interval секунд."""
+    global _cached_version, _checked_at
+    now = time.monotonic()
+    if _cached_version is not None and now - _checked_at < _check_interval:
+        return _cached_version
+    with _lock:
+        if _cached_version is None or time.monotonic() - _checked_at >= _check_interval:
+            _cached_version = get_catalog_version(conn)
+            _checked_at = time.monotonic()
+        return _cached_version
+
+
+def invalidate_catalog_version() -> None:
+    """Сбросить кэш версии: следующий запрос перечитает её из БД (после локальной загрузки)."""
+    global _checked_at
+    _checked_at = 0.0
+
+
+class VersionedResource:
+    """
+    Объект, построенный по данным каталога и перестраиваемый при смене версии.
+    Новое значение строится целиком и подменяется одной ссылкой; пока идёт перестройка,
+    остальные потоки продолжают работать со старым значением.
+    """
+
+    def __init__(self, builder: Callable[[Any], Any]):
+        self._builder = builder
+        self._lock = threading.Lock()
+        # (версия, значение) — меняется одним присваиванием.
+        self._state: Optional[Tuple[Optional[int], Any]] = None
+
+    def get(self, conn) -> Any:
+        version = current_catalog_version(conn)
+        state = self._state
+        if state is not None and state[0] == version:
+            return state[1]
+        if state is not None and not self._lock.acquire(blocking=False):
+            # Перестройка уже идёт в другом потоке — отдаём предыдущую версию.
+            return state[1]
+        if state is None:
+            self._lock.acquire()
+        try:
+            state = self._state
+            if state is None or state[0] != version:
+                state = (version, self._builder(conn))
+                self._state = state
+            return state[1]
+        finally:
+            self._lock.release()
+
+    def invalidate(self) -> None:
+        """Принудительно перестроить значение при следующем обращении."""
+        state = self._state
+        if state is not None:
+            self._state = (None, state[1])
@@ -1,20 +1,484 @@
 """
 Пул соединений к PostgreSQL. Подключение на каждый запрос через g.db.
+DATABASE_URL вида sqlite:///path.db вместо этого открывает встроенную БД (db/sqlite_store.py).
+С DATABASE_REPLICA_URLS чтение распределяется по репликам (ReplicaRouter), запись остаётся
+на основной БД.
+
+Пул потокобезопасный и ограниченный: при нехватке соединений запрос ждёт освободившееся
+(не дольше timeout), а не падает с PoolError. Соединения проверяются перед выдачей,
+если долго простаивали, и пересоздаются по возрасту или после ошибки.
+g.db — LazyConnection: соединение берётся из пула только при первом обращении к нему,
+так что статика и ответы из кэша пул не трогают.
 """
+import itertools
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
 import psycopg2
-from psycopg2 import pool
+from psycopg2 import extensions, pool
+
+import metrics
+from db.prepared import PreparedConnection
+from db.sqlite_store import SqliteConnection, SqlitePool, is_sqlite_url, sqlite_path
+
+
+class TimedCursor(extensions.cursor):
+    """Курсор, отправляющий время каждого запроса в metrics (этап sql, медленные запросы)."""
+
+    def execute(self, query, vars=None):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.observe_query(query, vars, time.perf_counter() - t0)
+
+
+class PoolTimeout(pool.PoolError):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int = 1,
+        maxconn: int = 10,
+        timeout: float = 5.0,
+        max_age: float = 1800.0,
+        check_idle_after: float = 30.0,
+    ):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle_after = check_idle_after
+        self._cond = threading.Condition()
+        # Свободные соединения: (соединение, когда вернули в пул).
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        # Время создания каждого открытого соединения.
+        self._created: Dict[Any, float] = {}
+        # Открытые соединения плюс создаваемые прямо сейчас.
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.recycled = 0
+        self.peak_in_use = 0
+
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        try:
+            conn = psycopg2.connect(
+                self.dsn, connection_factory=PreparedConnection, cursor_factory=TimedCursor
+            )
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._created[conn] = time.monotonic()
+        return conn
+
+    def _discard(self, conn) -> None:
+        self._created.pop(conn, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - self._created.get(conn, now) > self.max_age:
+            return False
+        if now - idle_since < self.check_idle_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Взять соединение; если все заняты — ждать до timeout секунд, затем PoolTimeout."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise pool.PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        create = False
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        conn, idle_since, create = None, 0.0, True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"no free connection within {timeout:g}s")
+                    waited = True
+                    self._cond.wait(remaining)
+                self._in_use += 1
+                self.peak_in_use = max(self.peak_in_use, self._in_use)
+
+            try:
+                if create:
+                    conn = self._connect()
+                elif not self._healthy(conn, idle_since):
+                    self._discard(conn)
+                    with self._cond:
+                        self._in_use -= 1
+                        self.recycled += 1
+                    continue
+            except BaseException:
+                with self._cond:
+                    self._in_use -= 1
+                raise
+
+            wait = time.monotonic() - started
+            with self._cond:
+                self.checkouts += 1
+                if waited:
+                    self.waits += 1
+                self.wait_seconds_total += wait
+                self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """Вернуть соединение. Незавершённая транзакция откатывается, сломанное закрывается."""
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        with self._cond:
+            self._in_use -= 1
+            if not (close or conn.closed or self._closed):
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+            if not self._closed:
+                self.recycled += 1
+        self._discard(conn)
+
+    def closeall(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max": self.maxconn,
+                "utilization": round(self._in_use / self.maxconn, 4) if self.maxconn else 0.0,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6)
+                if self.checkouts
+                else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+            }
+
+
+# Отставание реплики (сек). Не реплика (pg_is_in_recovery() = false) не отстаёт.
+# Реплика, применившая всё полученное, не отстаёт, даже если последняя транзакция была
+# давно, — но только пока WAL receiver работает: с остановленным receive_lsn = replay_lsn
+# тоже, хотя основная БД ушла вперёд. Без receiver'а (нет строки в pg_stat_wal_receiver
+# или status не streaming) отставание — время с последней применённой транзакции, а если
+# её не было — с запуска реплики. status виден только с правами pg_read_all_stats, без них
+# он NULL — тогда достаточно самого процесса receiver'а.
+_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+        ) THEN EXTRACT(EPOCH FROM now() - COALESCE(
+            pg_last_xact_replay_timestamp(), pg_postmaster_start_time()
+        ))
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def _safe_dsn(dsn: str) -> str:
+    """DSN без пароля — для статистики."""
+    dsn = re.sub(r"(://[^:/@]*):[^@]*@", r"\1:***@", dsn)
+    return re.sub(r"password=\S+", "password=***", dsn)
+
+
+class Replica:
+    """Реплика для чтения: свой пул, последнее измеренное отставание, недоступность."""
+
+    def __init__(self, dsn: str, pool_: ConnectionPool):
+        self.dsn = dsn
+        self.pool = pool_
+        self.lag: Optional[float] = None
+        self.checked_at = float("-inf")
+        self.down_until = 0.0
+        self.reads = 0
+        self.errors = 0
+        # Отставание проверяет один поток, остальные пользуются последним значением.
+        self.check_lock = threading.Lock()
 
-_pool: pool.SimpleConnectionPool | None = None
+    def busy(self) -> float:
+        stats = self.pool.stats()
+        return stats["in_use"] / stats["max"] if stats["max"] else 1.0
 
 
-def init_pool(database_url: str, minconn: int = 1, maxconn: int = 10) -> None:
+class ReplicaRouter:
+    """
+    Основная БД плюс реплики для чтения. Чтение (get_connection() без write) идёт на
+    реплику по кругу или на наименее занятую; на основную — если все реплики отстают
+    больше max_lag, недоступны или заняты, и в течение read_your_writes секунд после
+    записи в этом процессе. Запись — всегда на основную.
+    Отставание реплики проверяется не чаще check_interval на выдаваемом соединении;
+    после ошибки соединения реплика не используется retry_after секунд.
+    """
+
+    def __init__(
+        self,
+        primary: ConnectionPool,
+        replicas: List[Replica],
+        balance: str = "round_robin",
+        max_lag: float = 5.0,
+        check_interval: float = 1.0,
+        retry_after: float = 10.0,
+        read_your_writes: float = 5.0,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.balance = balance
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.read_your_writes = read_your_writes
+        self._next = itertools.count()
+        self._last_write = float("-inf")
+        # Соединение -> пул, из которого оно выдано. Меняется из потоков запросов — под _lock.
+        self._owners: Dict[Any, ConnectionPool] = {}
+        # Выданные для записи соединения: после их возврата чтение какое-то время с основной БД.
+        self._writers: set = set()
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+        self.fallbacks = 0
+
+    def _candidates(self, now: float) -> List[Replica]:
+        usable = [
+            r for r in self.replicas
+            if r.down_until <= now
+            and (r.lag is None or r.lag <= self.max_lag or now - r.checked_at >= self.check_interval)
+        ]
+        if self.balance == "least_busy":
+            return sorted(usable, key=Replica.busy)
+        start = next(self._next) % len(usable) if usable else 0
+        return usable[start:] + usable[:start]
+
+    def _mark_down(self, replica: Replica, now: float) -> None:
+        replica.errors += 1
+        replica.down_until = now + self.retry_after
+
+    def _fresh(self, replica: Replica, conn, now: float) -> bool:
+        """Перепроверить отставание, если пора; False — реплика слишком отстаёт."""
+        if now - replica.checked_at >= self.check_interval and replica.check_lock.acquire(False):
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(_REPLICA_LAG_SQL)
+                    replica.lag = float(cur.fetchone()[0])
+                conn.rollback()
+                replica.checked_at = time.monotonic()
+            finally:
+                replica.check_lock.release()
+        return replica.lag is None or replica.lag <= self.max_lag
+
+    def _read_conn(self):
+        now = time.monotonic()
+        if now - self._last_write < self.read_your_writes:
+            return None
+        for replica in self._candidates(now):
+            try:
+                # Не ждать занятую реплику: лучше сразу взять следующую или основную БД.
+                conn = replica.pool.getconn(timeout=0.0)
+            except PoolTimeout:
+                continue
+            except psycopg2.Error:
+                self._mark_down(replica, now)
+                continue
+            try:
+                fresh = self._fresh(replica, conn, now)
+            except psycopg2.Error:
+                replica.pool.putconn(conn, close=True)
+                self._mark_down(replica, now)
+                continue
+            if not fresh:
+                replica.pool.putconn(conn)
+                continue
+            replica.reads += 1
+            with self._lock:
+                self._owners[conn] = replica.pool
+            return conn
+        if self.replicas:
+            self.fallbacks += 1
+        return None
+
+    def getconn(self, write: bool = False):
+        if write:
+            self._last_write = time.monotonic()
+        else:
+            conn = self._read_conn()
+            if conn is not None:
+                return conn
+            self.primary_reads += 1
+        conn = self.primary.getconn()
+        with self._lock:
+            self._owners[conn] = self.primary
+            if write:
+                self._writers.add(conn)
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        with self._lock:
+            owner = self._owners.pop(conn, self.primary)
+            writer = conn in self._writers
+            self._writers.discard(conn)
+        if writer:
+            # Окно read-your-writes отсчитывается от конца записи (загрузка может идти долго).
+            self._last_write = time.monotonic()
+        owner.putconn(conn, close=close)
+
+    def closeall(self) -> None:
+        self.primary.closeall()
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        stats: Dict[str, Any] = dict(self.primary.stats())
+        lags = [r.lag for r in self.replicas if r.lag is not None]
+        stats.update(
+            {
+                "primary_reads": self.primary_reads,
+                "replica_reads": sum(r.reads for r in self.replicas),
+                "replica_fallbacks": self.fallbacks,
+                "replicas_up": sum(1 for r in self.replicas if r.down_until <= now),
+                "replica_lag_max": max(lags) if lags else 0.0,
+                "replicas": [
+                    {
+                        "dsn": _safe_dsn(r.dsn),
+                        "up": r.down_until <= now,
+                        "lag": r.lag,
+                        "reads": r.reads,
+                        "errors": r.errors,
+                        "pool": r.pool.stats(),
+                    }
+                    for r in self.replicas
+                ],
+            }
+        )
+        return stats
+
+
+_pool: ConnectionPool | SqlitePool | ReplicaRouter | None = None
+
+
+def init_pool(
+    database_url: str,
+    minconn: int = 1,
+    maxconn: int = 10,
+    timeout: float = 5.0,
+    max_age: float = 1800.0,
+    check_idle_after: float = 30.0,
+    replica_urls: Sequence[str] = (),
+    replica_balance: str = "round_robin",
+    replica_max_lag: float = 5.0,
+    replica_check_interval: float = 1.0,
+    replica_retry_after: float = 10.0,
+    read_your_writes: float = 5.0,
+) -> None:
+    """
+    Создать пул процесса. replica_urls — DSN реплик PostgreSQL для чтения (см. ReplicaRouter);
+    без них все запросы идут в database_url. У SQLite реплик нет.
+    """
     global _pool
     if _pool is not None:
         return
-    _pool = psycopg2.pool.SimpleConnectionPool(
+    if is_sqlite_url(database_url):
+        _pool = SqlitePool(sqlite_path(database_url))
+        return
+    primary = ConnectionPool(
+        database_url,
         minconn=minconn,
         maxconn=maxconn,
-        dsn=database_url,
+        timeout=timeout,
+        max_age=max_age,
+        check_idle_after=check_idle_after,
+    )
+    if not replica_urls:
+        _pool = primary
+        return
+    # Соединения с репликами открываются по требованию: недоступная при старте реплика
+    # не мешает запуску, чтение просто идёт на основную БД.
+    replicas = [
+        Replica(
+            dsn,
+            ConnectionPool(
+                dsn,
+                minconn=0,
+                maxconn=maxconn,
+                timeout=timeout,
+                max_age=max_age,
+                check_idle_after=check_idle_after,
+            ),
+        )
+        for dsn in replica_urls
+    ]
+    _pool = ReplicaRouter(
+        primary,
+        replicas,
+        balance=replica_balance,
+        max_lag=replica_max_lag,
+        check_interval=replica_check_interval,
+        retry_after=replica_retry_after,
+        read_your_writes=read_your_writes,
     )
 
 
@@ -25,14 +489,67 @@ def close_pool() -> None:
         _pool = None
 
 
-def get_connection():
-    """Взять соединение из пула. Вызывающий должен вернуть его через put_connection."""
+def get_connection(write: bool = False, dedicated: bool = False):
+    """
+    Взять соединение из пула. Вызывающий должен вернуть его через put_connection.
+    write=True — для изменения данных (init_db, загрузка CSV): у SQLite соединения
+    запросов только для чтения, а при репликах запись идёт на основную БД.
+    dedicated=True — для чтения, которое переживает запрос (потоковая выгрузка): у SQLite
+    иначе вернулось бы общее соединение потока.
+    """
     if _pool is None:
         raise RuntimeError("Connection pool not initialized. Call init_pool first.")
+    if isinstance(_pool, SqlitePool):
+        return _pool.getconn(write=write, dedicated=dedicated)
+    if isinstance(_pool, ReplicaRouter):
+        return _pool.getconn(write=write)
     return _pool.getconn()
 
 
-def put_connection(conn) -> None:
+def put_connection(conn, close: bool = False) -> None:
     """Вернуть соединение в пул."""
     if _pool is not None:
-        _pool.putconn(conn)
+        _pool.putconn(conn, close=close)
+
+
+def is_sqlite(conn) -> bool:
+    """Соединение ведёт в SQLite (а не в PostgreSQL)."""
+    if isinstance(conn, LazyConnection):
+        conn = conn.raw()
+    return isinstance(conn, SqliteConnection)
+
+
+def pool_stats() -> Optional[Dict[str, Any]]:
+    """Метрики пула: занятость, ожидание соединения, пересозданные соединения."""
+    return _pool.stats() if _pool is not None else None
+
+
+class LazyConnection:
+    """
+    Соединение, которое берётся из пула при первом обращении (cursor(), commit(), ...).
+    release() возвращает его в пул, если оно было взято.
+    """
+
+    __slots__ = ("_conn",)
+
+    def __init__(self):
+        self._conn = None
+
+    @property
+    def acquired(self) -> bool:
+        return self._conn is not None
+
+    def raw(self):
+        """Настоящее соединение (берётся из пула, если ещё не взято)."""
+        if self._conn is None:
+            with metrics.stage("pool"):
+                self._conn = get_connection()
+        return self._conn
+
+    def __getattr__(self, name: str):
+        return getattr(self.raw(), name)
+
+    def release(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            put_connection(conn)
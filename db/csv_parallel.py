@@ -0,0 +1,346 @@
+"""
+Разбор CSV прайс-листа для загрузчиков db/load_csv.py. Файл режется на куски по
+границам записей (по байтам), куски разбираются в пуле процессов, а результаты в порядке
+файла забирает один писатель (COPY или executemany). Пока писатель пишет кусок, процессы
+разбирают следующие; очередь разобранных кусков ограничена, память не растёт с файлом.
+
+Значения строк те же, что у iter_product_rows, но каждое поле нормализуется один раз,
+а регулярные выражения скомпилированы заранее. Строки с ошибками (не то число полей,
+не число в числовой колонке, битая запись CSV) попадают в отчёт с номером строки файла.
+
+Модуль не зависит от драйверов БД: его импортируют процессы пула.
+"""
+import csv
+import hashlib
+import io
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Сколько символов начала файла смотрит csv.Sniffer.
+SNIFF_CHARS = 1024
+# Размер куска разбора: около файла / (процессы * 4), но в этих пределах.
+MIN_CHUNK_BYTES = 256 * 1024
+MAX_CHUNK_BYTES = 8 * 1024 * 1024
+# Сколько разобранных кусков может ждать писателя на каждый процесс.
+QUEUE_CHUNKS_PER_WORKER = 2
+# Сколько ошибок хранить в отчёте (счётчик считает все).
+MAX_REPORTED_ERRORS = 1000
+
+# Колонки CSV в порядке разбора.
+CSV_FIELDS = (
+    "number", "type", "model", "size", "diameter",
+    "efficiency", "pressure", "power", "noise_level", "price",
+)
+_DIALECT_ATTRS = (
+    "delimiter", "quotechar", "escapechar", "doublequote", "skipinitialspace", "quoting", "strict",
+)
+
+_SLUG_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+_SLUG_DASHES = re.compile(r"-{2,}")
+
+
+class _Semicolon(csv.excel):
+    """csv.excel с разделителем ";" (сам csv.excel общий для процесса, его не трогаем)."""
+
+    delimiter = ";"
+
+
+def sniff_dialect(sample: str):
+    """Диалект CSV (разделитель ; или ,) по началу файла; по умолчанию — ";"."""
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=";,")
+    except csv.Error:
+        return _Semicolon
+
+
+def _copy_text(value) -> str:
+    """Значение -> поле текстового формата COPY."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, float):
+        return repr(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _fields_hash(fields: List[str]) -> str:
+    data = "\x1f".join(fields).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# --- разбор значений (те же правила, что parse_number_loose / parse_range_loose / slugify) ---
+
+def _norm(value: str) -> str:
+    return " ".join(value.replace("\u00A0", " ").split())
+
+
+def _number(raw: str) -> Optional[float]:
+    s = raw.replace(" ", "").replace(",", ".")
+    if not s:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _range(raw: str) -> Tuple[Optional[float], Optional[float]]:
+    if not raw:
+        return None, None
+    low, sep, high = raw.partition("-")
+    if not sep:
+        n = _number(raw)
+        return n, n
+    return _number(low), _number(high)
+
+
+def _slug(model: str) -> str:
+    s = _SLUG_NON_WORD.sub("-", model.lower())
+    return _SLUG_DASHES.sub("-", s).strip("-")
+
+
+# --- разметка файла ---
+
+def _read_record(f, quote: Optional[bytes], inside: bool = False) -> bytes:
+    """
+    Байты от текущей позиции до конца записи CSV (перевод строки вне кавычек).
+    inside=True — позиция внутри поля в кавычках.
+    """
+    parts = []
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        parts.append(line)
+        if quote is not None and line.count(quote) % 2:
+            inside = not inside
+        if not inside:
+            break
+    return b"".join(parts)
+
+
+def _read_header(path: Path) -> Tuple[Dict[str, Any], List[str], int, int]:
+    """(параметры диалекта, заголовок, смещение первой записи, строк в заголовке)."""
+    with path.open("r", encoding="utf-8") as f:
+        dialect = sniff_dialect(f.read(SNIFF_CHARS))
+    params = {name: getattr(dialect, name) for name in _DIALECT_ATTRS if hasattr(dialect, name)}
+    quote = _quote_bytes(params)
+    with path.open("rb") as f:
+        raw = _read_record(f, quote)
+    # Как DictReader поверх open(encoding="utf-8"): BOM остаётся в первом имени колонки.
+    text = raw.decode("utf-8")
+    header = next(csv.reader(io.StringIO(text, newline=None), **params), [])
+    return params, header, len(raw), raw.count(b"\n")
+
+
+def _quote_bytes(params: Dict[str, Any]) -> Optional[bytes]:
+    if params["quoting"] == csv.QUOTE_NONE or not params["quotechar"]:
+        return None
+    return params["quotechar"].encode("utf-8")
+
+
+def split_chunks(
+    path: Path, start: int, first_line: int, chunk_bytes: int, quote: Optional[bytes]
+) -> List[Tuple[int, int, int]]:
+    """
+    Куски файла [(начало, конец, номер первой строки)] примерно по chunk_bytes, каждый
+    заканчивается на границе записи: перевод строки при чётном числе кавычек в куске.
+    """
+    chunks = []
+    size = path.stat().st_size
+    line = first_line
+    with path.open("rb") as f:
+        f.seek(start)
+        while start < size:
+            block = f.read(chunk_bytes)
+            inside = quote is not None and block.count(quote) % 2 == 1
+            # Дочитать запись, на которой оборвался кусок.
+            if not block.endswith(b"\n"):
+                tail = f.readline()
+                block += tail
+                if quote is not None and tail.count(quote) % 2:
+                    inside = not inside
+            if inside:
+                block += _read_record(f, quote, inside=True)
+            end = start + len(block)
+            chunks.append((start, end, line))
+            line += block.count(b"\n")
+            start = end
+    return chunks
+
+
+def _chunk_text(path: str, start: int, end: int, first_line: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        line = first_line + data.count(b"\n", 0, e.start)
+        raise ValueError(f"{path}: строка {line}: не UTF-8 ({e.reason})") from None
+
+
+def _records(text: str, params: Dict[str, Any], first_line: int, errors: List[Tuple[int, str]]):
+    """Непустые записи куска: (номер строки, поля). Битые записи — в errors и пропускаются."""
+    reader = csv.reader(io.StringIO(text, newline=None), **params)
+    line = first_line
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            errors.append((line, f"ошибка CSV: {e}"))
+            line = first_line + reader.line_num
+            continue
+        row_line, line = line, first_line + reader.line_num
+        if row:
+            yield row_line, row
+
+
+def _count_records(job: tuple) -> int:
+    """Сколько записей в куске (нужно для номеров товаров без number в следующих кусках)."""
+    path, start, end, first_line, params = job[:5]
+    return sum(1 for _ in _records(_chunk_text(path, start, end, first_line), params, first_line, []))
+
+
+def _parse_chunk(job: tuple, base: int) -> Tuple[Any, int, int, List[Tuple[int, str]]]:
+    """
+    Разобрать кусок. base — сколько записей было в файле до куска (номер товара без number
+    — порядковый номер записи, как в iter_product_rows).
+    Возвращает (данные, строк товаров, записей, ошибки); данные — текст для COPY
+    (output="copy") или список кортежей PRODUCT_COLUMNS + content_hash (output="rows").
+    """
+    path, start, end, first_line, params, header, output = job
+    n_header = len(header)
+    positions = {name: i for i, name in enumerate(header)}
+    pos = [positions.get(name) for name in CSV_FIELDS]
+    errors: List[Tuple[int, str]] = []
+    out: List[Any] = []
+    records = 0
+    for line, row in _records(_chunk_text(path, start, end, first_line), params, first_line, errors):
+        records += 1
+        n = len(row)
+        vals = [_norm(row[p]) if p is not None and p < n else "" for p in pos]
+        (number, type_, model, size, raw_diameter, raw_efficiency, raw_pressure,
+         raw_power, raw_noise_level, raw_price) = vals
+        if not (type_ or model or size):
+            continue
+        number = number or str(base + records)
+        diameter = _number(raw_diameter)
+        af_min, af_max = _range(raw_efficiency)
+        pr_min, pr_max = _range(raw_pressure)
+        power = _number(raw_power)
+        noise_level = _number(raw_noise_level)
+        price = _number(raw_price)
+
+        problems = []
+        if n != n_header:
+            problems.append(f"полей {n}, в заголовке {n_header}")
+        for name, raw, value in (
+            ("diameter", raw_diameter, diameter),
+            ("power", raw_power, power),
+            ("noise_level", raw_noise_level, noise_level),
+            ("price", raw_price, price),
+        ):
+            if raw and value is None:
+                problems.append(f"{name}: не число {raw!r}")
+        for name, raw, (low, high) in (
+            ("efficiency", raw_efficiency, (af_min, af_max)),
+            ("pressure", raw_pressure, (pr_min, pr_max)),
+        ):
+            if raw and (low is None or high is None):
+                problems.append(f"{name}: не число или диапазон {raw!r}")
+        if problems:
+            errors.append((line, "; ".join(problems)))
+
+        values = (
+            number, number, type_, model, size, diameter,
+            af_min, af_max, raw_efficiency, pr_min, pr_max, raw_pressure,
+            power, noise_level, price,
+            raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price,
+            _slug(model),
+        )
+        fields = list(map(_copy_text, values))
+        fields.append(_fields_hash(fields))
+        out.append("\t".join(fields) if output == "copy" else values + (fields[-1],))
+    data = "".join(line + "\n" for line in out) if output == "copy" else out
+    return data, len(out), records, errors
+
+
+def resolve_workers(workers: int) -> int:
+    """0 — по числу ядер; 1 — разбор в текущем процессе."""
+    return max(1, workers if workers > 0 else (os.cpu_count() or 1))
+
+
+def iter_parsed_chunks(
+    csv_path: Path,
+    report: Dict[str, Any],
+    workers: int = 0,
+    output: str = "rows",
+    chunk_bytes: int = 0,
+) -> Iterator[Any]:
+    """
+    Разобранные куски CSV в порядке файла (см. _parse_chunk, output). В report пишутся
+    rows, errors ([{"line", "error"}], не больше MAX_REPORTED_ERRORS), error_count,
+    workers, chunks и parse_seconds — сколько писатель ждал разобранных данных.
+    """
+    params, header, data_start, header_lines = _read_header(csv_path)
+    workers = resolve_workers(workers)
+    size = csv_path.stat().st_size
+    if not chunk_bytes:
+        chunk_bytes = min(max(size // (workers * 4), MIN_CHUNK_BYTES), MAX_CHUNK_BYTES)
+    chunks = split_chunks(csv_path, data_start, header_lines + 1, chunk_bytes, _quote_bytes(params))
+    jobs = [(str(csv_path), s, e, line, params, header, output) for s, e, line in chunks]
+    if len(jobs) < 2:
+        workers = 1
+    report.update(rows=0, errors=[], error_count=0, workers=workers, chunks=len(jobs), parse_seconds=0.0)
+
+    def collect(result) -> Any:
+        data, rows, _, errors = result
+        report["rows"] += rows
+        report["error_count"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(report["errors"])
+        report["errors"].extend({"line": line, "error": msg} for line, msg in errors[:room])
+        return data
+
+    if workers == 1:
+        base = 0
+        for job in jobs:
+            t0 = time.perf_counter()
+            result = _parse_chunk(job, base)
+            report["parse_seconds"] += time.perf_counter() - t0
+            base += result[2]
+            yield collect(result)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # Сначала быстрый подсчёт записей по кускам: от него зависят номера товаров без
+        # number, поэтому разбор куска можно отправить, когда посчитаны предыдущие.
+        counts = [pool.submit(_count_records, job) for job in jobs]
+        queue: Deque = deque()
+        base = 0
+        submitted = 0
+        limit = workers * QUEUE_CHUNKS_PER_WORKER
+        while submitted < len(jobs) or queue:
+            while submitted < len(jobs) and len(queue) < limit:
+                queue.append(pool.submit(_parse_chunk, jobs[submitted], base))
+                base += counts[submitted].result()
+                submitted += 1
+            t0 = time.perf_counter()
+            result = queue.popleft().result()
+            report["parse_seconds"] += time.perf_counter() - t0
+            yield collect(result)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,134 @@
+"""
+Потоковая выгрузка каталога (/api/products/export): те же фильтры, что у list_products,
+но строки читаются пачками через именованный (серверный) курсор PostgreSQL и сразу
+отдаются клиенту. Память не зависит от размера выборки, первые байты уходят до того,
+как запрос дочитан до конца.
+"""
+import csv
+import io
+import itertools
+from typing import Any, Dict, Iterator, List, Optional
+
+from db.connection import is_sqlite
+from db.repository import (
+    _SELECT_COLUMNS,
+    COLUMN_POS,
+    _filter_conditions,
+    _order_by,
+    _relevance_key,
+    _row_to_product_json,
+    _sort_spec,
+)
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# Колонки CSV — как в прайс-листе, который читает load_csv.py: выгрузку можно загрузить обратно.
+CSV_COLUMNS = (
+    ("number", "number"),
+    ("type", "type"),
+    ("model", "model"),
+    ("size", "size"),
+    ("diameter", "raw_diameter"),
+    ("efficiency", "raw_efficiency"),
+    ("pressure", "raw_pressure"),
+    ("power", "raw_power"),
+    ("noise_level", "raw_noise_level"),
+    ("price", "raw_price"),
+)
+_CSV_POS = [COLUMN_POS[column] for _, column in CSV_COLUMNS]
+
+_cursor_ids = itertools.count(1)
+
+
+def _fetch_batches(conn, sql: str, params: List[Any], batch_size: int) -> Iterator[List[tuple]]:
+    if is_sqlite(conn):
+        # Курсор SQLite и так читает результат по шагам, а не целиком.
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+    # Именованный курсор живёт в транзакции; её закрывает возврат соединения в пул.
+    with conn.cursor(name=f"export_{next(_cursor_ids)}") as cur:
+        cur.itersize = batch_size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+
+def _relevance_batches(
+    conn, relevance: Dict[str, float], filters: Dict[str, Any], batch_size: int
+) -> Iterator[List[tuple]]:
+    """
+    Порядок по релевантности: id из поиска идут пачками по убыванию оценки, каждая пачка —
+    отдельный запрос. Пачка не разрывает группу одинаковых оценок, поэтому порядок
+    (оценка, model, id) тот же, что у list_products.
+    """
+    ids = sorted(filters.pop("ids") or (), key=lambda i: -relevance.get(i, 0.0))
+    start = 0
+    while start < len(ids):
+        end = min(start + batch_size, len(ids))
+        while end < len(ids) and relevance.get(ids[end], 0.0) == relevance.get(ids[end - 1], 0.0):
+            end += 1
+        conditions, params = _filter_conditions(ids=ids[start:end], **filters)
+        sql = f"SELECT {_SELECT_COLUMNS} FROM products WHERE {' AND '.join(conditions)}"
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        rows.sort(key=lambda r: _relevance_key(relevance, r))
+        if rows:
+            yield rows
+        start = end
+
+
+def iter_product_batches(
+    conn,
+    *,
+    sort: str = "price_asc",
+    relevance: Optional[Dict[str, float]] = None,
+    batch_size: int = 1000,
+    **filters,
+) -> Iterator[List[tuple]]:
+    """Строки товаров (колонки PRODUCT_COLUMNS) пачками не больше batch_size в порядке list_products."""
+    if sort == "relevance" and relevance is not None:
+        yield from _relevance_batches(conn, relevance, dict(filters), batch_size)
+        return
+    conditions, params = _filter_conditions(**filters)
+    _, column, direction = _sort_spec(sort)
+    sql = f"""
+        SELECT {_SELECT_COLUMNS}
+        FROM products
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {_order_by(column, direction)}
+    """
+    yield from _fetch_batches(conn, sql, params, batch_size)
+
+
+def ndjson_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """По товару на строку, JSON тот же, что в /api/products."""
+    for rows in batches:
+        yield "".join(_row_to_product_json(r) + "\n" for r in rows).encode("ascii")
+
+
+def csv_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """CSV с BOM и разделителем ";", как fans_data.csv."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";", lineterminator="\r\n")
+    writer.writerow([name for name, _ in CSV_COLUMNS])
+    yield b"\xef\xbb\xbf" + buf.getvalue().encode("utf-8")
+    for rows in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([[r[i] or "" for i in _CSV_POS] for r in rows])
+        yield buf.getvalue().encode("utf-8")
+
+
+def export_chunks(fmt: str, batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    return csv_chunks(batches) if fmt == "csv" else ndjson_chunks(batches)
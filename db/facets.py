@@ -0,0 +1,182 @@
+"""
+Фасеты для фильтров каталога (/api/facets): сколько товаров каждого типа и диаметра,
+границы числовых характеристик и гистограмма цен — под те же фильтры, что у
+list_products. В PostgreSQL — один запрос (CTE с выборкой, границы и группировки), в
+SQLite и в снимке каталога — один проход по строкам в Python. Результат без фильтров
+считается заранее и перестраивается только при смене версии каталога.
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+from db.catalog_version import VersionedResource
+from db.connection import is_sqlite
+from db.repository import _filter_conditions
+
+# Колонки, по которым считаются фасеты, в порядке строк для facets_from_rows.
+FACET_COLUMNS = (
+    "type", "diameter", "price", "power", "noise_level",
+    "airflow_min", "airflow_max", "pressure_min", "pressure_max",
+)
+# Диапазоны: имя -> (колонка нижней границы, колонка верхней границы).
+RANGES = {
+    "price": ("price", "price"),
+    "power": ("power", "power"),
+    "noise_level": ("noise_level", "noise_level"),
+    "diameter": ("diameter", "diameter"),
+    "airflow": ("airflow_min", "airflow_max"),
+    "pressure": ("pressure_min", "pressure_max"),
+}
+_POS = {name: i for i, name in enumerate(FACET_COLUMNS)}
+
+
+def _price_bucket(price: float, lo: float, hi: float, buckets: int) -> int:
+    # То же выражение, что в _facets_sql: совпадает с PostgreSQL до бита.
+    if hi <= lo:
+        return 0
+    return min(int(math.floor((price - lo) * buckets / (hi - lo))), buckets - 1)
+
+
+def _result(
+    total: int,
+    types: Dict[str, int],
+    diameters: Dict[float, int],
+    bounds: Dict[str, List[Optional[float]]],
+    histogram: Dict[int, int],
+    priced: int,
+    buckets: int,
+) -> Dict[str, Any]:
+    lo, hi = bounds["price"]
+    histogram_buckets = []
+    if priced:
+        n = buckets if hi > lo else 1
+        histogram_buckets = [
+            {
+                "from": lo + (hi - lo) * k / n,
+                "to": hi if k == n - 1 else lo + (hi - lo) * (k + 1) / n,
+                "count": histogram.get(k, 0),
+            }
+            for k in range(n)
+        ]
+    return {
+        "total": total,
+        "types": [{"value": t, "count": types[t]} for t in sorted(types)],
+        "diameters": [{"value": d, "count": diameters[d]} for d in sorted(diameters)],
+        "ranges": {name: {"min": lo_, "max": hi_} for name, (lo_, hi_) in bounds.items()},
+        "price_histogram": {"buckets": histogram_buckets, "unpriced": total - priced},
+    }
+
+
+def facets_from_rows(rows: Iterable[tuple], buckets: int = 10) -> Dict[str, Any]:
+    """Фасеты по строкам (колонки FACET_COLUMNS, NULL — None) за один проход."""
+    total = 0
+    types: Dict[str, int] = {}
+    diameters: Dict[float, int] = {}
+    bounds: Dict[str, List[Optional[float]]] = {name: [None, None] for name in RANGES}
+    range_pos = [(bounds[name], _POS[lo], _POS[hi]) for name, (lo, hi) in RANGES.items()]
+    prices: List[float] = []
+    type_pos, diameter_pos, price_pos = _POS["type"], _POS["diameter"], _POS["price"]
+    for row in rows:
+        total += 1
+        t = row[type_pos]
+        types[t] = types.get(t, 0) + 1
+        d = row[diameter_pos]
+        if d is not None:
+            diameters[d] = diameters.get(d, 0) + 1
+        if row[price_pos] is not None:
+            prices.append(row[price_pos])
+        for bound, lo_pos, hi_pos in range_pos:
+            lo, hi = row[lo_pos], row[hi_pos]
+            if lo is not None and (bound[0] is None or lo < bound[0]):
+                bound[0] = lo
+            if hi is not None and (bound[1] is None or hi > bound[1]):
+                bound[1] = hi
+    histogram: Dict[int, int] = {}
+    lo, hi = bounds["price"]
+    for price in prices:
+        k = _price_bucket(price, lo, hi, buckets)
+        histogram[k] = histogram.get(k, 0) + 1
+    return _result(total, types, diameters, bounds, histogram, len(prices), buckets)
+
+
+def _facets_sql(conditions: List[str]) -> str:
+    bounds = ", ".join(
+        f"MIN({lo}) AS {name}_min, MAX({hi}) AS {name}_max" for name, (lo, hi) in RANGES.items()
+    )
+    columns = ", ".join(c if c == "type" else f"{c}::float8 AS {c}" for c in FACET_COLUMNS)
+    return f"""
+        WITH f AS (
+            SELECT {columns} FROM products WHERE {" AND ".join(conditions)}
+        ), b AS (
+            SELECT COUNT(*) AS total, COUNT(price) AS priced, {bounds} FROM f
+        ), g AS (
+            SELECT 'type' AS facet, type AS label, NULL::float8 AS value, COUNT(*) AS n
+            FROM f GROUP BY type
+            UNION ALL
+            SELECT 'diameter', NULL, diameter, COUNT(*)
+            FROM f WHERE diameter IS NOT NULL GROUP BY diameter
+            UNION ALL
+            SELECT 'price', NULL,
+                LEAST(COALESCE(FLOOR(
+                    (f.price - b.price_min) * %s / NULLIF(b.price_max - b.price_min, 0)
+                ), 0), %s - 1),
+                COUNT(*)
+            FROM f CROSS JOIN b WHERE f.price IS NOT NULL GROUP BY 3
+        )
+        SELECT b.*, g.facet, g.label, g.value, g.n FROM b LEFT JOIN g ON TRUE
+    """
+
+
+def compute_facets(conn, buckets: int, **filters) -> Dict[str, Any]:
+    """Фасеты под фильтры list_products (см. _filter_conditions); sort игнорируется."""
+    filters.pop("sort", None)
+    conditions, params = _filter_conditions(**filters)
+    if is_sqlite(conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT {', '.join(FACET_COLUMNS)} FROM products WHERE {' AND '.join(conditions)}",
+                params,
+            )
+            return facets_from_rows(cur.fetchall(), buckets)
+
+    with conn.cursor() as cur:
+        cur.execute(_facets_sql(conditions), params + [buckets, buckets])
+        rows = cur.fetchall()
+    total, priced = rows[0][0], rows[0][1]
+    bounds = {name: [rows[0][2 + 2 * n], rows[0][3 + 2 * n]] for n, name in enumerate(RANGES)}
+    types: Dict[str, int] = {}
+    diameters: Dict[float, int] = {}
+    histogram: Dict[int, int] = {}
+    for *_, facet, label, value, n in rows:
+        if facet == "type":
+            types[label] = n
+        elif facet == "diameter":
+            diameters[value] = n
+        elif facet == "price":
+            histogram[int(value)] = n
+    return _result(total, types, diameters, bounds, histogram, priced, buckets)
+
+
+# Корзин в гистограмме цен по умолчанию (задаётся из конфигурации, см. set_price_buckets).
+_price_buckets = 10
+_unfiltered = VersionedResource(lambda conn: compute_facets(conn, _price_buckets))
+
+
+def set_price_buckets(buckets: int) -> None:
+    """Задать число корзин гистограммы цен для get_facets."""
+    global _price_buckets
+    _price_buckets = max(1, int(buckets))
+    _unfiltered.invalidate()
+
+
+def get_facets(conn, source=None, **filters) -> Dict[str, Any]:
+    """
+    Фасеты под фильтры list_products. Без фильтров — заранее посчитанный результат,
+    который пересчитывается только при смене версии каталога. source — снимок каталога
+    (db/snapshot.py): с ним фильтрованные фасеты считаются без запроса к БД.
+    """
+    if all(v is None for k, v in filters.items() if k != "sort"):
+        return _unfiltered.get(conn)
+    if source is not None:
+        filters.pop("sort", None)
+        return source.facets(_price_buckets, **filters)
+    return compute_facets(conn, _price_buckets, **filters)
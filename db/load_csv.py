@@ -3,9 +3,19 @@
 Использует те же парсеры, что и приложение (нормализация, диапазоны).
 """
 import csv
+import hashlib
 import re
 import sys
+import time
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from psycopg2.extras import execute_values
+
+from db.catalog_version import bump_catalog_version, invalidate_catalog_version
+from db.connection import is_sqlite
+from db.csv_parallel import _copy_text, _fields_hash, iter_parsed_chunks, sniff_dialect
+from db.repository import PRODUCT_COLUMNS
 
 # родительская директория проекта
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,83 +58,374 @@ def slugify(value: str) -> str:
     return s
 
 
-def load_csv_into_db(conn, csv_path: Path) -> int:
-    """Читает CSV и вставляет строки в products. Возвращает количество вставленных строк."""
+_UPSERT_SET = """
+    number = EXCLUDED.number, type = EXCLUDED.type, model = EXCLUDED.model,
+    size = EXCLUDED.size, diameter = EXCLUDED.diameter,
+    airflow_min = EXCLUDED.airflow_min, airflow_max = EXCLUDED.airflow_max, airflow_raw = EXCLUDED.airflow_raw,
+    pressure_min = EXCLUDED.pressure_min, pressure_max = EXCLUDED.pressure_max, pressure_raw = EXCLUDED.pressure_raw,
+    power = EXCLUDED.power, noise_level = EXCLUDED.noise_level, price = EXCLUDED.price,
+    raw_diameter = EXCLUDED.raw_diameter, raw_efficiency = EXCLUDED.raw_efficiency,
+    raw_pressure = EXCLUDED.raw_pressure, raw_power = EXCLUDED.raw_power,
+    raw_noise_level = EXCLUDED.raw_noise_level, raw_price = EXCLUDED.raw_price,
+    model_slug = EXCLUDED.model_slug
+"""
+
+# Все загрузки пишут content_hash (см. content_hash), по нему sync_csv_into_db
+# находит изменённые строки.
+UPSERT_SQL = f"""
+    INSERT INTO products ({", ".join(PRODUCT_COLUMNS)}, content_hash)
+    VALUES ({", ".join(["%s"] * (len(PRODUCT_COLUMNS) + 1))})
+    ON CONFLICT (id) DO UPDATE SET {_UPSERT_SET}, content_hash = EXCLUDED.content_hash
+"""
+
+SYNC_UPSERT_SQL = f"""
+    INSERT INTO products ({", ".join(PRODUCT_COLUMNS)}, content_hash)
+    VALUES %s
+    ON CONFLICT (id) DO UPDATE SET {_UPSERT_SET}, content_hash = EXCLUDED.content_hash
+"""
+# Размер пачки строк в одном INSERT синхронизации.
+_SYNC_BATCH = 1000
+
+# Слияние staging -> products. DISTINCT ON + seq DESC: при повторе id побеждает
+# последняя строка CSV, как и при построчном upsert.
+MERGE_SQL = f"""
+    INSERT INTO products ({", ".join(PRODUCT_COLUMNS)}, content_hash)
+    SELECT DISTINCT ON (id) {", ".join(PRODUCT_COLUMNS)}, content_hash
+    FROM products_staging
+    ORDER BY id, seq DESC
+    ON CONFLICT (id) DO UPDATE SET {_UPSERT_SET}, content_hash = EXCLUDED.content_hash
+"""
+
+# Ключ advisory lock: одновременно идёт только одна bulk-загрузка через staging.
+_BULK_LOCK_KEY = 0x76656E74
+
+
+def open_csv_reader(f) -> csv.DictReader:
+    """DictReader с определением разделителя (; или ,) по первым 1024 символам."""
+    sample = f.read(1024)
+    f.seek(0)
+    return csv.DictReader(f, dialect=sniff_dialect(sample))
+
+
+def iter_product_rows(reader: csv.DictReader) -> Iterator[tuple]:
+    """Строки CSV -> кортежи значений в порядке PRODUCT_COLUMNS. Пустые строки пропускаются."""
+    for i, row in enumerate(reader, start=1):
+        number = normalize_whitespace(row.get("number")) or str(i)
+        type_ = normalize_whitespace(row.get("type"))
+        model = normalize_whitespace(row.get("model"))
+        size = normalize_whitespace(row.get("size"))
+        if not (type_ or model or size):
+            continue
+
+        diameter = parse_number_loose(row.get("diameter"))
+        af_min, af_max, af_raw = parse_range_loose(row.get("efficiency"))
+        pr_min, pr_max, pr_raw = parse_range_loose(row.get("pressure"))
+        power = parse_number_loose(row.get("power"))
+        noise_level = parse_number_loose(row.get("noise_level"))
+        price = parse_number_loose(row.get("price"))
+
+        raw_diameter = normalize_whitespace(row.get("diameter"))
+        raw_efficiency = normalize_whitespace(row.get("efficiency"))
+        raw_pressure = normalize_whitespace(row.get("pressure"))
+        raw_power = normalize_whitespace(row.get("power"))
+        raw_noise_level = normalize_whitespace(row.get("noise_level"))
+        raw_price = normalize_whitespace(row.get("price"))
+        model_slug = slugify(model)
+
+        yield (
+            number, number, type_, model, size, diameter,
+            af_min, af_max, af_raw, pr_min, pr_max, pr_raw,
+            power, noise_level, price,
+            raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price,
+            model_slug,
+        )
+
+
+def load_csv_into_db(
+    conn, csv_path: Path, workers: int = 0, report: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Читает CSV и вставляет строки в products. Возвращает количество вставленных строк.
+    workers — процессы разбора (см. db/csv_parallel.py); в report, если передан,
+    пишется отчёт разбора, в том числе строки с ошибками.
+    """
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV не найден: {csv_path}")
 
-    with csv_path.open("r", encoding="utf-8") as f:
-        sample = f.read(1024)
-        f.seek(0)
-        try:
-            dialect = csv.Sniffer().sniff(sample, delimiters=";,")
-        except csv.Error:
-            dialect = csv.excel
-            dialect.delimiter = ";"
-        reader = csv.DictReader(f, dialect=dialect)
-
-        inserted = 0
+    report = {} if report is None else report
+    inserted = 0
+    with conn.cursor() as cur:
+        for rows in iter_parsed_chunks(csv_path, report, workers):
+            for row in rows:
+                cur.execute(UPSERT_SQL, row)
+                inserted += 1
+        _forget_sources(cur)
+        bump_catalog_version(cur)
+    conn.commit()
+    invalidate_catalog_version()
+    return inserted
+
+
+def _forget_sources(cur) -> None:
+    """После полной загрузки сведения о синхронизированных файлах больше не актуальны."""
+    cur.execute("DELETE FROM catalog_sources")
+
+
+class _CopyStream:
+    """
+    Файлоподобный объект для copy_expert: отдаёт текст COPY кусками по мере разбора CSV
+    (iter_parsed_chunks), не держа весь файл в памяти.
+    """
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._buf = ""
+
+    def read(self, size: int = -1) -> str:
+        parts = [self._buf]
+        length = len(self._buf)
+        while size < 0 or length < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        data = "".join(parts)
+        if size < 0:
+            self._buf = ""
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+
+def bulk_load_csv_into_db(conn, csv_path: Path, workers: int = 0) -> Dict[str, Any]:
+    """
+    Быстрая загрузка: строки CSV потоком идут через COPY FROM STDIN в UNLOGGED-таблицу
+    products_staging, затем сливаются в products одним коротким INSERT ... SELECT.
+    Блокировки на products держатся только на время слияния. CSV разбирается в workers
+    процессах параллельно с записью (см. db/csv_parallel.py).
+    Возвращает статистику: rows, parse_seconds (ожидание разбора), write_seconds,
+    merge_seconds, rows_per_sec, workers, error_count и errors — строки с ошибками.
+    """
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV не найден: {csv_path}")
+    if is_sqlite(conn):
+        return _bulk_load_sqlite(conn, csv_path, workers)
+
+    started = time.perf_counter()
+    parsed: Dict[str, Any] = {}
+    _lock(conn)
+    try:
+        stream = _CopyStream(iter_parsed_chunks(csv_path, parsed, workers, output="copy"))
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE products_staging")
+            cur.copy_expert(
+                f"COPY products_staging ({', '.join(PRODUCT_COLUMNS)}, content_hash) FROM STDIN",
+                stream,
+            )
+        conn.commit()
+        copy_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
         with conn.cursor() as cur:
-            for i, row in enumerate(reader, start=1):
-                number = normalize_whitespace(row.get("number")) or str(i)
-                type_ = normalize_whitespace(row.get("type"))
-                model = normalize_whitespace(row.get("model"))
-                size = normalize_whitespace(row.get("size"))
-                if not (type_ or model or size):
-                    continue
-
-                diameter = parse_number_loose(row.get("diameter"))
-                af_min, af_max, af_raw = parse_range_loose(row.get("efficiency"))
-                pr_min, pr_max, pr_raw = parse_range_loose(row.get("pressure"))
-                power = parse_number_loose(row.get("power"))
-                noise_level = parse_number_loose(row.get("noise_level"))
-                price = parse_number_loose(row.get("price"))
-
-                raw_diameter = normalize_whitespace(row.get("diameter"))
-                raw_efficiency = normalize_whitespace(row.get("efficiency"))
-                raw_pressure = normalize_whitespace(row.get("pressure"))
-                raw_power = normalize_whitespace(row.get("power"))
-                raw_noise_level = normalize_whitespace(row.get("noise_level"))
-                raw_price = normalize_whitespace(row.get("price"))
-                model_slug = slugify(model)
+            cur.execute(MERGE_SQL)
+            _forget_sources(cur)
+            bump_catalog_version(cur)
+        conn.commit()
+        merge_seconds = time.perf_counter() - t0
+        invalidate_catalog_version()
+
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE products_staging")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _unlock(conn)
+
+    return _load_stats(parsed, copy_seconds, merge_seconds, started)
+
+
+def _bulk_load_sqlite(conn, csv_path: Path, workers: int) -> Dict[str, Any]:
+    # В SQLite нет COPY: все строки одним executemany в одной транзакции.
+    started = time.perf_counter()
+    parsed: Dict[str, Any] = {}
+    try:
+        with conn.cursor() as cur:
+            chunks = iter_parsed_chunks(csv_path, parsed, workers)
+            cur.executemany(UPSERT_SQL, (row for rows in chunks for row in rows))
+            _forget_sources(cur)
+            bump_catalog_version(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    invalidate_catalog_version()
+    return _load_stats(parsed, time.perf_counter() - started, 0.0, started)
+
+
+def _load_stats(
+    parsed: Dict[str, Any], write_seconds: float, merge_seconds: float, started: float
+) -> Dict[str, Any]:
+    total = time.perf_counter() - started
+    rows = parsed["rows"]
+    return {
+        "rows": rows,
+        "parse_seconds": round(parsed["parse_seconds"], 3),
+        "write_seconds": round(write_seconds - parsed["parse_seconds"], 3),
+        "merge_seconds": round(merge_seconds, 3),
+        "total_seconds": round(total, 3),
+        "rows_per_sec": round(rows / total) if total > 0 else 0,
+        "workers": parsed["workers"],
+        "error_count": parsed["error_count"],
+        "errors": parsed["errors"],
+    }
+
+
+def _lock(conn) -> None:
+    """Одна загрузка за раз. SQLite сам допускает только одного писателя."""
+    if is_sqlite(conn):
+        return
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (_BULK_LOCK_KEY,))
+    conn.commit()
+
+
+def _unlock(conn) -> None:
+    if is_sqlite(conn):
+        conn.rollback()
+        return
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (_BULK_LOCK_KEY,))
+    conn.commit()
 
+
+def content_hash(values: tuple) -> str:
+    """Хэш значений строки products (в порядке PRODUCT_COLUMNS)."""
+    return _fields_hash(list(map(_copy_text, values)))
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sync_csv_into_db(
+    conn, csv_path: Path, delete_missing: bool = True, workers: int = 0
+) -> Dict[str, Any]:
+    """
+    Инкрементальная синхронизация products с CSV (id = number).
+    Если mtime и размер файла (или его sha256) совпадают с прошлой синхронизацией, ничего
+    не делается. Иначе пишутся только новые и изменённые строки (по content_hash) пачками,
+    а товары, пропавшие из файла, удаляются (delete_missing=False — оставить).
+    Возвращает отчёт: status ("synced" | "unchanged"), added/changed/removed/unchanged —
+    списки id, rows, seconds, error_count и errors — строки CSV с ошибками.
+    """
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV не найден: {csv_path}")
+
+    started = time.perf_counter()
+    source = str(csv_path.resolve())
+    report: Dict[str, Any] = {
+        "status": "unchanged",
+        "added": [],
+        "changed": [],
+        "removed": [],
+        "unchanged": 0,
+        "rows": 0,
+        "error_count": 0,
+        "errors": [],
+    }
+    _lock(conn)
+    try:
+        st = csv_path.stat()
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT mtime_ns, size, sha256, rows FROM catalog_sources WHERE path = %s",
+                (source,),
+            )
+            known = cur.fetchone()
+        if known is not None and (known[0], known[1]) == (st.st_mtime_ns, st.st_size):
+            report["rows"] = known[3]
+            return _finish_report(report, started)
+        sha = _file_sha256(csv_path)
+        if known is not None and known[2] == sha:
+            # Файл тот же, изменилось только время модификации.
+            with conn.cursor() as cur:
                 cur.execute(
-                    """
-                    INSERT INTO products (
-                        id, number, type, model, size, diameter,
-                        airflow_min, airflow_max, airflow_raw,
-                        pressure_min, pressure_max, pressure_raw,
-                        power, noise_level, price,
-                        raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price,
-                        model_slug
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s,
-                        %s
-                    )
-                    ON CONFLICT (id) DO UPDATE SET
-                        number = EXCLUDED.number, type = EXCLUDED.type, model = EXCLUDED.model,
-                        size = EXCLUDED.size, diameter = EXCLUDED.diameter,
-                        airflow_min = EXCLUDED.airflow_min, airflow_max = EXCLUDED.airflow_max, airflow_raw = EXCLUDED.airflow_raw,
-                        pressure_min = EXCLUDED.pressure_min, pressure_max = EXCLUDED.pressure_max, pressure_raw = EXCLUDED.pressure_raw,
-                        power = EXCLUDED.power, noise_level = EXCLUDED.noise_level, price = EXCLUDED.price,
-                        raw_diameter = EXCLUDED.raw_diameter, raw_efficiency = EXCLUDED.raw_efficiency,
-                        raw_pressure = EXCLUDED.raw_pressure, raw_power = EXCLUDED.raw_power,
-                        raw_noise_level = EXCLUDED.raw_noise_level, raw_price = EXCLUDED.raw_price,
-                        model_slug = EXCLUDED.model_slug
-                    """,
-                    (
-                        number, number, type_, model, size, diameter,
-                        af_min, af_max, af_raw, pr_min, pr_max, pr_raw,
-                        power, noise_level, price,
-                        raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price,
-                        model_slug,
-                    ),
+                    "UPDATE catalog_sources SET mtime_ns = %s, size = %s WHERE path = %s",
+                    (st.st_mtime_ns, st.st_size, source),
                 )
-                inserted += 1
+            conn.commit()
+            report["rows"] = known[3]
+            return _finish_report(report, started)
+
+        # При повторе id побеждает последняя строка CSV, как и при полной загрузке.
+        incoming: Dict[str, tuple] = {}
+        parsed: Dict[str, Any] = {}
+        for rows in iter_parsed_chunks(csv_path, parsed, workers):
+            for row in rows:
+                incoming[row[0]] = row
+        report["rows"] = len(incoming)
+        report["error_count"] = parsed["error_count"]
+        report["errors"] = parsed["errors"]
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, content_hash FROM products")
+            existing = dict(cur.fetchall())
+
+        # Строки разбора — значения PRODUCT_COLUMNS и в конце content_hash.
+        pending: List[tuple] = []
+        for id_value, row in incoming.items():
+            row_hash = row[-1]
+            old = existing.get(id_value, False)
+            if old is False:
+                report["added"].append(id_value)
+            elif old != row_hash:
+                report["changed"].append(id_value)
+            else:
+                report["unchanged"] += 1
+                continue
+            pending.append(row)
+        if delete_missing:
+            report["removed"] = sorted(set(existing) - set(incoming))
+
+        with conn.cursor() as cur:
+            if pending and is_sqlite(conn):
+                cur.executemany(UPSERT_SQL, pending)
+            elif pending:
+                execute_values(cur, SYNC_UPSERT_SQL, pending, page_size=_SYNC_BATCH)
+            if report["removed"]:
+                cur.execute("DELETE FROM products WHERE id = ANY(%s)", (report["removed"],))
+            cur.execute(
+                """
+                INSERT INTO catalog_sources (path, mtime_ns, size, sha256, rows, synced_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+                ON CONFLICT (path) DO UPDATE SET
+                    mtime_ns = EXCLUDED.mtime_ns, size = EXCLUDED.size,
+                    sha256 = EXCLUDED.sha256, rows = EXCLUDED.rows, synced_at = NOW()
+                """,
+                (source, st.st_mtime_ns, st.st_size, sha, len(incoming)),
+            )
+            if pending or report["removed"]:
+                bump_catalog_version(cur)
         conn.commit()
-        return inserted
+        report["status"] = "synced"
+        if pending or report["removed"]:
+            invalidate_catalog_version()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _unlock(conn)
+    return _finish_report(report, started)
 
 
+def _finish_report(report: Dict[str, Any], started: float) -> Dict[str, Any]:
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
@@ -0,0 +1,359 @@
+"""
+Версионированные миграции схемы. Применённые версии записываются в schema_migrations;
+init_db (db/init_db.py) применяет недостающие по порядку, каждую в своей транзакции
+(кроме индексов CONCURRENTLY, см. ниже), так что повторный запуск ничего не делает.
+У каждой миграции текст для PostgreSQL и для встроенной SQLite (db/sqlite_store.py).
+
+Миграция 1 — исходная схема (CREATE ... IF NOT EXISTS): на БД, созданной до появления
+миграций, она ничего не меняет и только записывается как применённая.
+Новое изменение схемы — новая миграция в конце MIGRATIONS; схема, которую дают старые,
+не меняется.
+
+Индексы на работающей БД строятся CONCURRENTLY (concurrent=True): без транзакции, по одной
+команде, запись в products при этом не блокируется. Если такая миграция оборвалась,
+недостроенные (INVALID) индексы удаляются при следующем запуске и строятся заново.
+"""
+import re
+from typing import List, NamedTuple
+
+from db.connection import is_sqlite
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    postgres: str
+    sqlite: str
+    # PostgreSQL-текст — только CREATE/DROP INDEX CONCURRENTLY (см. _apply_concurrently).
+    concurrent: bool = False
+
+
+# Ключ advisory lock: миграции применяет один процесс за раз (мастер gunicorn, load_csv.py).
+_MIGRATE_LOCK_KEY = 0x76656E75
+
+# Исходная схема.
+_BASELINE_SQL = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    number TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT '',
+    model TEXT NOT NULL DEFAULT '',
+    size TEXT NOT NULL DEFAULT '',
+    diameter NUMERIC,
+    airflow_min NUMERIC,
+    airflow_max NUMERIC,
+    airflow_raw TEXT,
+    pressure_min NUMERIC,
+    pressure_max NUMERIC,
+    pressure_raw TEXT,
+    power NUMERIC,
+    noise_level NUMERIC,
+    price NUMERIC,
+    raw_diameter TEXT,
+    raw_efficiency TEXT,
+    raw_pressure TEXT,
+    raw_power TEXT,
+    raw_noise_level TEXT,
+    raw_price TEXT,
+    model_slug TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_products_type ON products(type);
+CREATE INDEX IF NOT EXISTS idx_products_model_slug ON products(model_slug);
+-- Поиск товара по модели без учёта регистра (find_product)
+CREATE INDEX IF NOT EXISTS idx_products_model_lower ON products(LOWER(model));
+CREATE INDEX IF NOT EXISTS idx_products_price ON products(price);
+
+-- Индексы под сортировки list_products (SORTS в db/repository.py) и keyset-курсор
+CREATE INDEX IF NOT EXISTS idx_products_sort_price_asc
+    ON products(price ASC NULLS LAST, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_price_desc
+    ON products(price DESC NULLS LAST, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_airflow_desc
+    ON products(airflow_max DESC NULLS LAST, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_pressure_desc
+    ON products(pressure_max DESC NULLS LAST, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_noise_asc
+    ON products(noise_level ASC NULLS LAST, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_power_asc
+    ON products(power ASC NULLS LAST, model, id);
+
+-- Версия каталога: увеличивается при каждой загрузке данных (см. db/catalog_version.py)
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+INSERT INTO catalog_meta (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+-- Хэш содержимого строки для инкрементальной синхронизации (sync_csv_into_db)
+ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Исходные файлы последней синхронизации: если файл не менялся, синхронизация пропускается
+CREATE TABLE IF NOT EXISTS catalog_sources (
+    path TEXT PRIMARY KEY,
+    mtime_ns BIGINT NOT NULL,
+    size BIGINT NOT NULL,
+    sha256 TEXT NOT NULL,
+    rows INT NOT NULL DEFAULT 0,
+    synced_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Staging для bulk-загрузки через COPY (см. bulk_load_csv_into_db). UNLOGGED: без WAL.
+CREATE UNLOGGED TABLE IF NOT EXISTS products_staging (
+    LIKE products INCLUDING DEFAULTS,
+    seq BIGSERIAL
+);
+ALTER TABLE products_staging ADD COLUMN IF NOT EXISTS content_hash TEXT;
+"""
+
+
+# Та же схема для встроенной SQLite (db/sqlite_store.py). Числа — REAL, таблица без rowid
+# (поиск по id сразу по первичному ключу). Индексы сортировок — по (col IS NULL, col, ...):
+# так translate_sql переписывает "col DIR NULLS LAST".
+_SQLITE_BASELINE_SQL = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    number TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT '',
+    model TEXT NOT NULL DEFAULT '',
+    size TEXT NOT NULL DEFAULT '',
+    diameter REAL,
+    airflow_min REAL,
+    airflow_max REAL,
+    airflow_raw TEXT,
+    pressure_min REAL,
+    pressure_max REAL,
+    pressure_raw TEXT,
+    power REAL,
+    noise_level REAL,
+    price REAL,
+    raw_diameter TEXT,
+    raw_efficiency TEXT,
+    raw_pressure TEXT,
+    raw_power TEXT,
+    raw_noise_level TEXT,
+    raw_price TEXT,
+    model_slug TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    content_hash TEXT
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_products_model_slug ON products(model_slug);
+CREATE INDEX IF NOT EXISTS idx_products_model_lower ON products(LOWER(model));
+-- Покрывающий индекс для фильтров по типу/диаметру/цене и COUNT(*) по ним
+CREATE INDEX IF NOT EXISTS idx_products_type_diameter_price ON products(type, diameter, price);
+
+CREATE INDEX IF NOT EXISTS idx_products_sort_price_asc
+    ON products(price IS NULL, price ASC, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_price_desc
+    ON products(price IS NULL, price DESC, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_airflow_desc
+    ON products(airflow_max IS NULL, airflow_max DESC, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_pressure_desc
+    ON products(pressure_max IS NULL, pressure_max DESC, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_noise_asc
+    ON products(noise_level IS NULL, noise_level ASC, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_sort_power_asc
+    ON products(power IS NULL, power ASC, model, id);
+
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO catalog_meta (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS catalog_sources (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    synced_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Индексы под фильтры list_products (формы запросов — bench/query_plans.py).
+_FILTER_INDEXES_SQL = """
+-- Тип (и диаметр) с сортировкой по умолчанию: страница и COUNT(*) прямо из индекса.
+-- Ведущий type заменяет одиночный idx_products_type.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_type_sort_price_asc
+    ON products(type, price ASC NULLS LAST, model, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_type_diameter_sort_price_asc
+    ON products(type, diameter, price ASC NULLS LAST, model, id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_products_type;
+
+-- Диаметр без типа (равенство и диапазон): строки без диаметра фильтру не подходят
+-- никогда, поэтому индекс частичный.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_diameter_sort_price_asc
+    ON products(diameter, price ASC NULLS LAST, model, id) WHERE diameter IS NOT NULL;
+"""
+
+# Диапазоны: узкий диапазон читается по индексу колонки (Bitmap Index Scan) и сортируется,
+# широкий — обходом индекса сортировки с фильтром, как и без этих индексов; выбирает
+# планировщик по оценке числа строк. Условия расхода и давления — "col IS NULL OR col op x",
+# поэтому эти индексы полные: BitmapOr берёт из них и NULL, и диапазон.
+_RANGE_INDEXES_SQL = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_power
+    ON products(power) WHERE power IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_noise_level
+    ON products(noise_level) WHERE noise_level IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_airflow_min ON products(airflow_min);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_airflow_max ON products(airflow_max);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_pressure_min ON products(pressure_min);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_pressure_max ON products(pressure_max);
+"""
+
+# SQLite: те же индексы тип/диаметр + сортировка (NULLS LAST как price IS NULL).
+# Индексы по power, noise_level и границам диапазонов без ANALYZE планировщик SQLite
+# выбирает вместо обхода в порядке сортировки, и страница становится медленнее.
+_SQLITE_FILTER_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_products_type_sort_price_asc
+    ON products(type, price IS NULL, price ASC, model, id);
+CREATE INDEX IF NOT EXISTS idx_products_diameter_sort_price_asc
+    ON products(diameter, price IS NULL, price ASC, model, id) WHERE diameter IS NOT NULL;
+"""
+
+# Порядок сортировок — model и id в COLLATE "C" (см. SORTS в db/repository.py): индексы
+# сортировок пересоздаются с тем же порядком. Новый индекс строится рядом под именем с _c,
+# старый удаляется, новый получает его имя — запросы всё время идут по индексу.
+_SORT_INDEXES = (
+    ("idx_products_sort_price_asc", "price ASC NULLS LAST", ""),
+    ("idx_products_sort_price_desc", "price DESC NULLS LAST", ""),
+    ("idx_products_sort_airflow_desc", "airflow_max DESC NULLS LAST", ""),
+    ("idx_products_sort_pressure_desc", "pressure_max DESC NULLS LAST", ""),
+    ("idx_products_sort_noise_asc", "noise_level ASC NULLS LAST", ""),
+    ("idx_products_sort_power_asc", "power ASC NULLS LAST", ""),
+    ("idx_products_type_sort_price_asc", "type, price ASC NULLS LAST", ""),
+    ("idx_products_type_diameter_sort_price_asc", "type, diameter, price ASC NULLS LAST", ""),
+    (
+        "idx_products_diameter_sort_price_asc",
+        "diameter, price ASC NULLS LAST",
+        " WHERE diameter IS NOT NULL",
+    ),
+)
+_COLLATE_C_SQL = "".join(
+    f"""
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_c
+    ON products({key}, model COLLATE "C", id COLLATE "C"){where};
+DROP INDEX CONCURRENTLY IF EXISTS {name};
+ALTER INDEX IF EXISTS {name}_c RENAME TO {name};
+"""
+    for name, key, where in _SORT_INDEXES
+)
+
+MIGRATIONS = (
+    Migration(1, "baseline", _BASELINE_SQL, _SQLITE_BASELINE_SQL),
+    Migration(
+        2, "filter_indexes", _FILTER_INDEXES_SQL, _SQLITE_FILTER_INDEXES_SQL, concurrent=True
+    ),
+    # В SQLite индексы диапазонов не нужны (см. _SQLITE_FILTER_INDEXES_SQL).
+    Migration(3, "range_indexes", _RANGE_INDEXES_SQL, "", concurrent=True),
+    # В SQLite индексы уже в нужном порядке: BINARY — это и есть порядок кодовых точек.
+    Migration(4, "sort_collate_c", _COLLATE_C_SQL, "", concurrent=True),
+)
+
+_SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ DEFAULT NOW()
+)
+"""
+_SQLITE_SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def applied_versions(conn) -> List[int]:
+    """Номера применённых миграций по возрастанию."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations ORDER BY version")
+        return [r[0] for r in cur.fetchall()]
+
+
+_CONCURRENT_INDEX = re.compile(r"CREATE INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+
+
+def _statements(sql: str) -> List[str]:
+    """Текст миграции -> отдельные команды (без строк-комментариев)."""
+    text = "\n".join(line for line in sql.splitlines() if not line.lstrip().startswith("--"))
+    return [statement.strip() for statement in text.split(";") if statement.strip()]
+
+
+def _apply_concurrently(conn, sql: str) -> None:
+    """
+    CREATE/DROP INDEX CONCURRENTLY: вне транзакции и по одной команде. Оборванная сборка
+    оставляет индекс INVALID, и IF NOT EXISTS его бы пропустил — такие удаляются заранее.
+    """
+    statements = _statements(sql)
+    names = [m.group(1) for m in map(_CONCURRENT_INDEX.match, statements) if m]
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid"
+                " WHERE NOT i.indisvalid AND c.relname = ANY(%s)",
+                (names,),
+            )
+            for (name,) in cur.fetchall():
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            for statement in statements:
+                cur.execute(statement)
+    finally:
+        conn.autocommit = False
+
+
+def _apply(conn, migration: Migration) -> None:
+    record = "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)"
+    if is_sqlite(conn):
+        # executescript фиксирует открытую транзакцию и не принимает параметры: BEGIN в
+        # начале скрипта, запись о миграции — в той же транзакции, обычным запросом.
+        conn.executescript("BEGIN;\n" + migration.sqlite)
+        with conn.cursor() as cur:
+            cur.execute(record, (migration.version, migration.name))
+    elif migration.concurrent:
+        # Перед autocommit закрыть транзакцию, открытую чтением schema_migrations.
+        conn.commit()
+        _apply_concurrently(conn, migration.postgres)
+        with conn.cursor() as cur:
+            cur.execute(record, (migration.version, migration.name))
+    else:
+        with conn.cursor() as cur:
+            cur.execute(migration.postgres)
+            cur.execute(record, (migration.version, migration.name))
+    conn.commit()
+
+
+def migrate(conn) -> List[int]:
+    """Применить недостающие миграции по порядку. Возвращает номера применённых сейчас."""
+    sqlite = is_sqlite(conn)
+    if sqlite:
+        conn.executescript(_SQLITE_SCHEMA_MIGRATIONS_SQL)
+    else:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (_MIGRATE_LOCK_KEY,))
+            cur.execute(_SCHEMA_MIGRATIONS_SQL)
+        conn.commit()
+    applied: List[int] = []
+    try:
+        done = set(applied_versions(conn))
+        for migration in MIGRATIONS:
+            if migration.version not in done:
+                _apply(conn, migration)
+                applied.append(migration.version)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if not sqlite:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_MIGRATE_LOCK_KEY,))
+            conn.commit()
+    return applied
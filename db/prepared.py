@@ -0,0 +1,148 @@
+"""
+Кэш подготовленных запросов PostgreSQL (PREPARE / EXECUTE) на каждом соединении.
+Текст запроса list_products однозначно задаётся формой фильтров: какие условия есть
+(в порядке _filter_conditions) и сортировка; LIMIT — параметр, так что размер страницы
+новых запросов не порождает. Форма и служит ключом: запрос подготавливается один раз на
+соединение, дальше выполняется EXECUTE с параметрами — сервер не разбирает его заново.
+На соединении не больше max_size запросов (LRU, вытесненный — DEALLOCATE).
+
+План по умолчанию строится под параметры каждого EXECUTE (plan_cache_mode =
+force_custom_plan): общий план, который сервер выбрал бы сам после пяти выполнений, не
+знает, насколько узок диапазон, и, например, для minPower на хвосте распределения обходит
+индекс цены почти целиком (80 мс вместо 0,5 мс на 100 тыс. строк).
+
+init_db увеличивает поколение схемы: соединение, заметившее новое поколение, сбрасывает
+свои запросы. Если схему поменял другой процесс и сервер ответил "cached plan must not
+change result type", запрос подготавливается заново (транзакция соединения при этом
+откатывается — так что только для чтения). SQLite выполняет текст как есть: sqlite3
+сам кэширует разобранные запросы.
+"""
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Sequence
+
+from psycopg2 import errors, extensions
+
+import metrics
+
+_max_size = 64
+# plan_cache_mode новых соединений (см. set_plan_cache_mode).
+_plan_cache_mode = "force_custom_plan"
+# Поколение схемы; init_db увеличивает его через invalidate_prepared.
+_generation = 0
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "evictions": 0, "reprepared": 0}
+_PARAM = re.compile(r"%[s%]")
+
+
+def set_prepared_cache_size(max_size: int) -> None:
+    """Сколько подготовленных запросов держать на соединении; 0 — не подготавливать."""
+    global _max_size
+    _max_size = max(0, int(max_size))
+
+
+def set_plan_cache_mode(mode: str) -> None:
+    """plan_cache_mode для новых соединений: force_custom_plan, auto или force_generic_plan."""
+    global _plan_cache_mode
+    _plan_cache_mode = mode
+
+
+def invalidate_prepared() -> None:
+    """Схема изменилась: соединения сбросят подготовленные запросы при следующем обращении."""
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
+
+
+def prepared_stats() -> Dict[str, Any]:
+    """Попадания и промахи кэша планов по всем соединениям процесса."""
+    with _lock:
+        result: Dict[str, Any] = dict(_counters)
+    total = result["hits"] + result["misses"]
+    result["hit_ratio"] = round(result["hits"] / total, 4) if total else 0.0
+    result["max_size"] = _max_size
+    result["generation"] = _generation
+    return result
+
+
+class PreparedConnection(extensions.connection):
+    """Соединение psycopg2 со своим LRU подготовленных запросов: текст SQL -> имя."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: "OrderedDict[str, str]" = OrderedDict()
+        self.prepared_generation = _generation
+        self._names = itertools.count(1)
+        if _plan_cache_mode != "auto":
+            # Настройка сессии, а не транзакции: закоммитить, иначе её снимет первый rollback.
+            with self.cursor() as cur:
+                cur.execute("SELECT set_config('plan_cache_mode', %s, false)", (_plan_cache_mode,))
+            self.commit()
+
+
+def _numbered(sql: str) -> str:
+    """Плейсхолдеры psycopg2 (%s) -> параметры PREPARE ($1, $2, ...)."""
+    n = itertools.count(1)
+    return _PARAM.sub(lambda m: "%" if m.group() == "%%" else f"${next(n)}", sql)
+
+
+def _prepare(cur, conn: PreparedConnection, sql: str) -> str:
+    name = f"ventmash_{next(conn._names)}"
+    cur.execute(f"PREPARE {name} AS {_numbered(sql)}")
+    conn.prepared[sql] = name
+    while len(conn.prepared) > _max_size:
+        _, evicted = conn.prepared.popitem(last=False)
+        cur.execute(f"DEALLOCATE {evicted}")
+        _count("evictions")
+    return name
+
+
+def _execute_sql(name: str, n_params: int) -> str:
+    return f"EXECUTE {name} ({', '.join(['%s'] * n_params)})" if n_params else f"EXECUTE {name}"
+
+
+def execute_prepared(cur, sql: str, params: Sequence[Any] = ()) -> None:
+    """cur.execute(sql, params) через подготовленный запрос соединения, если это PostgreSQL."""
+    conn = getattr(cur, "connection", None)
+    if _max_size <= 0 or not isinstance(conn, PreparedConnection):
+        cur.execute(sql, params)
+        return
+    if conn.prepared_generation != _generation:
+        if conn.prepared:
+            cur.execute("DEALLOCATE ALL")
+            conn.prepared.clear()
+        conn.prepared_generation = _generation
+
+    name = conn.prepared.get(sql)
+    if name is None:
+        _count("misses")
+        name = _prepare(cur, conn, sql)
+    else:
+        _count("hits")
+        conn.prepared.move_to_end(sql)
+
+    # Время и журнал медленных запросов — с исходным текстом, а не "EXECUTE ventmash_N".
+    t0 = time.perf_counter()
+    try:
+        try:
+            extensions.cursor.execute(cur, _execute_sql(name, len(params)), params)
+        except errors.FeatureNotSupported as e:
+            # "cached plan must not change result type": схема поменялась в другом процессе.
+            if "cached plan" not in str(e):
+                raise
+            conn.rollback()
+            cur.execute(f"DEALLOCATE {name}")
+            del conn.prepared[sql]
+            _count("reprepared")
+            name = _prepare(cur, conn, sql)
+            extensions.cursor.execute(cur, _execute_sql(name, len(params)), params)
+    finally:
+        metrics.observe_query(sql, params, time.perf_counter() - t0)
@@ -0,0 +1,206 @@
+"""
+Быстрое обновление цен и характеристик из файла-патча "number;price" (по желанию ещё
+power, noise_level, diameter, efficiency, pressure). Патч загружается во временную
+таблицу (COPY; в SQLite — executemany) и применяется одним UPDATE ... FROM: меняются
+только колонки из файла и только у товаров, где значение действительно другое.
+Пустая ячейка — «не менять»; значения разбираются так же, как при полной загрузке.
+Строка с ошибкой разбора не применяется вовсе: опечатка не должна стирать живую цену.
+"""
+import io
+import time
+from typing import Any, Dict, List, TextIO, Tuple
+
+from db.catalog_version import bump_catalog_version, invalidate_catalog_version
+from db.connection import is_sqlite
+from db.csv_parallel import _copy_text
+from db.load_csv import (
+    _lock,
+    _unlock,
+    normalize_whitespace,
+    open_csv_reader,
+    parse_number_loose,
+    parse_range_loose,
+)
+
+# Колонка патча -> (вид значения, колонки products). "number" — parse_number_loose
+# (значение, исходный текст), "range" — parse_range_loose (min, max, текст, текст).
+# Последняя колонка группы — исходный текст: NULL в ней значит «ячейка пустая, не менять».
+PATCH_FIELDS = {
+    "price": ("number", ("price", "raw_price")),
+    "power": ("number", ("power", "raw_power")),
+    "noise_level": ("number", ("noise_level", "raw_noise_level")),
+    "diameter": ("number", ("diameter", "raw_diameter")),
+    "efficiency": ("range", ("airflow_min", "airflow_max", "airflow_raw", "raw_efficiency")),
+    "pressure": ("range", ("pressure_min", "pressure_max", "pressure_raw", "raw_pressure")),
+}
+# Колонки с id товара (id = number при загрузке CSV), по порядку предпочтения.
+KEY_FIELDS = ("number", "id")
+_TEXT_COLUMNS = {"airflow_raw", "pressure_raw"}
+
+
+class PatchError(ValueError):
+    """Файл патча нельзя применить (нет колонки с id или колонок для обновления)."""
+
+
+def read_patch(f: TextIO) -> Tuple[List[str], Dict[str, tuple], List[Dict[str, Any]], int]:
+    """
+    Разобрать CSV патча (разделитель определяется как в load_csv).
+    Возвращает (колонки патча, {id: значения колонок products}, ошибки, повторы id).
+    При повторе id побеждает последняя строка, как при полной загрузке. Строки с ошибками
+    попадают только в ошибки: для их id ничего не меняется.
+    """
+    reader = open_csv_reader(f)
+    header = {normalize_whitespace(name).lower(): name for name in reader.fieldnames or []}
+    key = next((header[k] for k in KEY_FIELDS if k in header), None)
+    if key is None:
+        raise PatchError("в патче нет колонки number")
+    fields = [name for name in PATCH_FIELDS if name in header]
+    if not fields:
+        raise PatchError(f"в патче нет колонок для обновления ({', '.join(PATCH_FIELDS)})")
+
+    rows: Dict[str, tuple] = {}
+    errors: List[Dict[str, Any]] = []
+    duplicates = 0
+    for row in reader:
+        id_value = normalize_whitespace(row.get(key))
+        if not id_value:
+            errors.append({"line": reader.line_num, "error": "пустой number"})
+            continue
+        values: List[Any] = []
+        problems = []
+        for name in fields:
+            kind, columns = PATCH_FIELDS[name]
+            raw = normalize_whitespace(row.get(header[name]))
+            if not raw:
+                values.extend([None] * len(columns))
+            elif kind == "number":
+                value = parse_number_loose(raw)
+                if value is None:
+                    problems.append(f"{name}: не число {raw!r}")
+                values.extend([value, raw])
+            else:
+                low, high, raw = parse_range_loose(raw)
+                if low is None or high is None:
+                    problems.append(f"{name}: не число или диапазон {raw!r}")
+                values.extend([low, high, raw, raw])
+        if problems:
+            errors.append({"line": reader.line_num, "error": "; ".join(problems)})
+            continue
+        if id_value in rows:
+            duplicates += 1
+        rows[id_value] = tuple(values)
+    return fields, rows, errors, duplicates
+
+
+def _columns(fields: List[str]) -> List[str]:
+    return [column for name in fields for column in PATCH_FIELDS[name][1]]
+
+
+def _update_sql(fields: List[str]) -> str:
+    assignments = []
+    changed = []
+    for name in fields:
+        columns = PATCH_FIELDS[name][1]
+        marker = columns[-1]
+        for column in columns:
+            assignments.append(
+                f"{column} = CASE WHEN d.{marker} IS NULL THEN p.{column} ELSE d.{column} END"
+            )
+        differs = " OR ".join(f"p.{c} IS DISTINCT FROM d.{c}" for c in columns)
+        changed.append(f"(d.{marker} IS NOT NULL AND ({differs}))")
+    # Ключ временной таблицы — patch_id, чтобы RETURNING id однозначно указывал на products
+    # (SQLite не разрешает в RETURNING имена с псевдонимом таблицы).
+    # content_hash сбрасывается: следующая синхронизация (sync_csv_into_db) сочтёт
+    # строку изменённой и перепишет её из файла.
+    return f"""
+        UPDATE products AS p
+        SET {", ".join(assignments)}, content_hash = NULL
+        FROM price_patch AS d
+        WHERE p.id = d.patch_id AND ({" OR ".join(changed)})
+        RETURNING id
+    """
+
+
+def apply_price_patch(conn, f: TextIO, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Применить патч из CSV f. Возвращает отчёт: columns, rows, updated (id изменённых),
+    unchanged, unmatched (id, которых нет в каталоге), duplicates, error_count, errors
+    ([{"line", "error"}]), dry_run, seconds. dry_run=True — всё посчитать и откатить.
+    Версия каталога увеличивается, если что-то изменилось: снимки, индексы и кэш ответов
+    перестраиваются.
+    """
+    started = time.perf_counter()
+    fields, rows, errors, duplicates = read_patch(f)
+    columns = _columns(fields)
+    report: Dict[str, Any] = {
+        "columns": fields,
+        "rows": len(rows),
+        "updated": [],
+        "unchanged": 0,
+        "unmatched": [],
+        "duplicates": duplicates,
+        "error_count": len(errors),
+        "errors": errors,
+        "dry_run": dry_run,
+    }
+    if not rows:
+        return _finish(report, started)
+
+    sqlite = is_sqlite(conn)
+    numeric = "REAL" if sqlite else "NUMERIC"
+    column_defs = ", ".join(
+        f"{c} {'TEXT' if c.startswith('raw_') or c in _TEXT_COLUMNS else numeric}"
+        for c in columns
+    )
+    _lock(conn)
+    try:
+        with conn.cursor() as cur:
+            if sqlite:
+                cur.execute("DROP TABLE IF EXISTS temp.price_patch")
+                cur.execute(f"CREATE TEMP TABLE price_patch (patch_id TEXT PRIMARY KEY, {column_defs})")
+                cur.executemany(
+                    f"INSERT INTO price_patch (patch_id, {', '.join(columns)}) "
+                    f"VALUES ({', '.join(['%s'] * (len(columns) + 1))})",
+                    [(id_value,) + values for id_value, values in rows.items()],
+                )
+            else:
+                cur.execute(
+                    f"CREATE TEMP TABLE price_patch (patch_id TEXT PRIMARY KEY, {column_defs}) "
+                    "ON COMMIT DROP"
+                )
+                data = "".join(
+                    "\t".join(map(_copy_text, (id_value,) + values)) + "\n"
+                    for id_value, values in rows.items()
+                )
+                cur.copy_expert(
+                    f"COPY price_patch (patch_id, {', '.join(columns)}) FROM STDIN", io.StringIO(data)
+                )
+            cur.execute(_update_sql(fields))
+            report["updated"] = sorted(r[0] for r in cur.fetchall())
+            cur.execute(
+                "SELECT d.patch_id FROM price_patch AS d LEFT JOIN products AS p ON p.id = d.patch_id "
+                "WHERE p.id IS NULL ORDER BY d.patch_id"
+            )
+            report["unmatched"] = [r[0] for r in cur.fetchall()]
+            if sqlite:
+                cur.execute("DROP TABLE temp.price_patch")
+            if report["updated"] and not dry_run:
+                bump_catalog_version(cur)
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _unlock(conn)
+    if report["updated"] and not dry_run:
+        invalidate_catalog_version()
+    report["unchanged"] = len(rows) - len(report["updated"]) - len(report["unmatched"])
+    return _finish(report, started)
+
+
+def _finish(report: Dict[str, Any], started: float) -> Dict[str, Any]:
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
@@ -1,50 +1,148 @@
 """
 Репозиторий продуктов: выборка списка с фильтрами и по id/модели/slug.
 """
-from typing import Any, Dict, List, Optional
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
 
+import metrics
+from db.prepared import execute_prepared
 
-def _row_to_product_dict(row: Dict[str, Any]) -> Dict[str, Any]:
-    """Преобразует строку БД в структуру, совместимую с product_to_json (Product)."""
+# Колонки товара в порядке SELECT.
+PRODUCT_COLUMNS = (
+    "id", "number", "type", "model", "size", "diameter",
+    "airflow_min", "airflow_max", "airflow_raw",
+    "pressure_min", "pressure_max", "pressure_raw",
+    "power", "noise_level", "price",
+    "raw_diameter", "raw_efficiency", "raw_pressure", "raw_power", "raw_noise_level", "raw_price",
+    "model_slug",
+)
+# Числовые колонки приводятся в SELECT к float8: драйвер сразу отдаёт float, а не Decimal.
+NUMERIC_COLUMNS = (
+    "diameter", "airflow_min", "airflow_max",
+    "pressure_min", "pressure_max", "power", "noise_level", "price",
+)
+_SELECT_COLUMNS = ", ".join(
+    f"{name}::float8 AS {name}" if name in NUMERIC_COLUMNS else name for name in PRODUCT_COLUMNS
+)
+# Позиция колонки в строке выборки.
+COLUMN_POS = {name: i for i, name in enumerate(PRODUCT_COLUMNS)}
+_ID = COLUMN_POS["id"]
+_MODEL = COLUMN_POS["model"]
+
+# Сортировки: имя -> (колонка, направление). Товары без значения — в конце,
+# при равенстве — по model, затем по id (id делает порядок однозначным для курсора).
+# model и id сравниваются в COLLATE "C" (по кодовым точкам, как str в Python): порядок
+# и курсоры не зависят от локали БД и совпадают со снимком каталога (db/snapshot.py).
+# Под каждую сортировку есть индекс (см. db/migrations.py).
+SORTS = {
+    "price_asc": ("price", "ASC"),
+    "price_desc": ("price", "DESC"),
+    "airflow_desc": ("airflow_max", "DESC"),
+    "pressure_desc": ("pressure_max", "DESC"),
+    "noise_asc": ("noise_level", "ASC"),
+    "power_asc": ("power", "ASC"),
+}
+
+
+def _row_to_product_dict(row: Sequence[Any]) -> Dict[str, Any]:
+    """Строка выборки (колонки PRODUCT_COLUMNS) -> структура, совместимая с product_to_json (Product)."""
+    (
+        id_value, number, type_, model, size, diameter,
+        airflow_min, airflow_max, airflow_raw,
+        pressure_min, pressure_max, pressure_raw,
+        power, noise_level, price,
+        raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price,
+        model_slug,
+    ) = row
     return {
-        "id": row["id"],
-        "number": row["number"],
-        "type": row["type"] or "",
-        "model": row["model"] or "",
-        "size": row["size"] or "",
-        "diameter": float(row["diameter"]) if row["diameter"] is not None else None,
+        "id": id_value,
+        "number": number,
+        "type": type_ or "",
+        "model": model or "",
+        "size": size or "",
+        "diameter": diameter,
         "airflow": {
-            "min": float(row["airflow_min"]) if row["airflow_min"] is not None else None,
-            "max": float(row["airflow_max"]) if row["airflow_max"] is not None else None,
-            "raw": row["airflow_raw"] or "",
+            "min": airflow_min,
+            "max": airflow_max,
+            "raw": airflow_raw or "",
         },
         "pressure": {
-            "min": float(row["pressure_min"]) if row["pressure_min"] is not None else None,
-            "max": float(row["pressure_max"]) if row["pressure_max"] is not None else None,
-            "raw": row["pressure_raw"] or "",
+            "min": pressure_min,
+            "max": pressure_max,
+            "raw": pressure_raw or "",
         },
-        "power": float(row["power"]) if row["power"] is not None else None,
-        "noise_level": float(row["noise_level"]) if row["noise_level"] is not None else None,
-        "price": float(row["price"]) if row["price"] is not None else None,
+        "power": power,
+        "noise_level": noise_level,
+        "price": price,
         "_raw": {
-            "diameter": row["raw_diameter"] or "",
-            "efficiency": row["raw_efficiency"] or "",
-            "pressure": row["raw_pressure"] or "",
-            "power": str(row["raw_power"]) if row["raw_power"] is not None else "",
-            "noise_level": str(row["raw_noise_level"]) if row["raw_noise_level"] is not None else "",
-            "price": str(row["raw_price"]) if row["raw_price"] is not None else "",
+            "diameter": raw_diameter or "",
+            "efficiency": raw_efficiency or "",
+            "pressure": raw_pressure or "",
+            "power": raw_power or "",
+            "noise_level": raw_noise_level or "",
+            "price": raw_price or "",
         },
         "_meta": {
-            "model_slug": row["model_slug"] or "",
+            "model_slug": model_slug or "",
         },
     }
 
 
-def list_products(
-    conn,
+_json_str = json.encoder.encode_basestring_ascii
+
+
+def _json_num(value: Optional[float]) -> str:
+    return "null" if value is None else float.__repr__(value)
+
+
+def _row_to_product_json(row: Sequence[Any]) -> str:
+    """
+    Строка выборки -> JSON товара, байт в байт как jsonify(_row_to_product_dict(row))
+    в компактном режиме Flask: ключи по алфавиту, ensure_ascii, без пробелов.
+    """
+    (
+        id_value, number, type_, model, size, diameter,
+        airflow_min, airflow_max, airflow_raw,
+        pressure_min, pressure_max, pressure_raw,
+        power, noise_level, price,
+        raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price,
+        model_slug,
+    ) = row
+    return (
+        f'{{"_meta":{{"model_slug":{_json_str(model_slug or "")}}},'
+        f'"_raw":{{"diameter":{_json_str(raw_diameter or "")},'
+        f'"efficiency":{_json_str(raw_efficiency or "")},'
+        f'"noise_level":{_json_str(raw_noise_level or "")},'
+        f'"power":{_json_str(raw_power or "")},'
+        f'"pressure":{_json_str(raw_pressure or "")},'
+        f'"price":{_json_str(raw_price or "")}}},'
+        f'"airflow":{{"max":{_json_num(airflow_max)},"min":{_json_num(airflow_min)},'
+        f'"raw":{_json_str(airflow_raw or "")}}},'
+        f'"diameter":{_json_num(diameter)},'
+        f'"id":{_json_str(id_value)},'
+        f'"model":{_json_str(model or "")},'
+        f'"noise_level":{_json_num(noise_level)},'
+        f'"number":{"null" if number is None else _json_str(number)},'
+        f'"power":{_json_num(power)},'
+        f'"pressure":{{"max":{_json_num(pressure_max)},"min":{_json_num(pressure_min)},'
+        f'"raw":{_json_str(pressure_raw or "")}}},'
+        f'"price":{_json_num(price)},'
+        f'"size":{_json_str(size or "")},'
+        f'"type":{_json_str(type_ or "")}}}'
+    )
+
+
+def _format_rows(rows: List[tuple], as_json: bool) -> list:
+    formatter = _row_to_product_json if as_json else _row_to_product_dict
+    with metrics.stage("convert"):
+        return [formatter(r) for r in rows]
+
+
+def _filter_conditions(
     *,
     q: Optional[str] = None,
     type_: Optional[str] = None,
@@ -61,12 +159,9 @@ def list_products(
     max_airflow: Optional[float] = None,
     min_pressure: Optional[float] = None,
     max_pressure: Optional[float] = None,
-    sort: str = "price_asc",
-) -> List[Dict[str, Any]]:
-    """
-    Выборка товаров с фильтрами. Сортировка по цене (price_asc / price_desc),
-    товары без цены в конце.
-    """
+    ids: Optional[Sequence[str]] = None,
+) -> Tuple[List[str], List[Any]]:
+    """Фильтры list_products -> (условия WHERE, параметры)."""
     conditions = ["1=1"]
     params: List[Any] = []
     n = 0
@@ -83,6 +178,9 @@ def list_products(
         )
         t = f"%{q.strip().lower()}%"
         params.extend([t, t, t])
+    if ids is not None:
+        # Результат поискового индекса (db/search.py) вместо LIKE по q.
+        conditions.append("id = ANY(" + next_param(list(ids)) + ")")
     if type_:
         conditions.append("type = " + next_param(type_))
     if diameter is not None:
@@ -128,61 +226,289 @@ def list_products(
             "(pressure_min IS NULL OR pressure_min <= " + next_param(max_pressure) + ")"
         )
 
-    order = "price ASC NULLS LAST, model ASC"
-    if sort == "price_desc":
-        order = "price DESC NULLS LAST, model ASC"
+    return conditions, params
+
+
+def _sort_spec(sort: str) -> Tuple[str, str, str]:
+    """Имя сортировки -> (имя, колонка, направление). Неизвестная -> price_asc."""
+    if sort not in SORTS:
+        sort = "price_asc"
+    column, direction = SORTS[sort]
+    return sort, column, direction
+
+
+def _order_by(column: str, direction: str) -> str:
+    # Колонка с именем таблицы: SELECT отдаёт её как "<column>::float8 AS <column>", и
+    # голое имя в ORDER BY сортировало бы по этому выражению — мимо индексов сортировки.
+    return f'products.{column} {direction} NULLS LAST, model COLLATE "C" ASC, id COLLATE "C" ASC'
 
+
+def _products_sql(conditions: List[str], order: str, limited: bool = False) -> str:
+    """limited — с LIMIT %s последним параметром: размер страницы не меняет текст запроса."""
     sql_query = f"""
-        SELECT id, number, type, model, size, diameter,
-               airflow_min, airflow_max, airflow_raw,
-               pressure_min, pressure_max, pressure_raw,
-               power, noise_level, price,
-               raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price,
-               model_slug
+        SELECT {_SELECT_COLUMNS}
         FROM products
         WHERE {" AND ".join(conditions)}
         ORDER BY {order}
     """
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(sql_query, params)
-        rows = cur.fetchall()
-    return [_row_to_product_dict(dict(r)) for r in rows]
+    if limited:
+        sql_query += " LIMIT %s"
+    return sql_query
+
+
+def _count_sql(conditions: List[str]) -> str:
+    return f"SELECT COUNT(*) FROM products WHERE {' AND '.join(conditions)}"
+
+
+# (model, id) в порядке сортировок, для условий "после курсора".
+_MODEL_ID = '(model COLLATE "C", id COLLATE "C")'
+
+
+def _after_cursor(column: str, direction: str) -> str:
+    """Условие "после курсора" для строк с непустым ключом; параметры: value, value, model, id."""
+    op = ">" if direction == "ASC" else "<"
+    column = f"products.{column}"
+    return f"{column} {op}= %s::numeric AND ({column} {op} %s::numeric OR {_MODEL_ID} > (%s, %s))"
+
+
+def _nulls_after_cursor(
+    column: str, value: Optional[str], model: str, id_value: str
+) -> Tuple[List[str], List[Any]]:
+    """Условия и параметры для строк с NULL в ключе сортировки после курсора."""
+    if value is None:
+        return [f"products.{column} IS NULL", f"{_MODEL_ID} > (%s, %s)"], [model, id_value]
+    return [f"products.{column} IS NULL"], []
+
+
+def _page_cut(rows: list, limit: int, sort: str, column: str) -> Tuple[list, Optional[str]]:
+    """Обрезать выборку limit + 1 строк до страницы и вернуть (строки, следующий курсор)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, last[COLUMN_POS[column]], last[_MODEL], last[_ID])
+
+
+def _select_products(
+    conn, conditions: List[str], params: List[Any], order: str, limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    # Текст зависит только от формы фильтров и сортировки: запрос берётся из кэша соединения.
+    if limit is not None:
+        params = params + [int(limit)]
+    with conn.cursor() as cur:
+        execute_prepared(cur, _products_sql(conditions, order, limit is not None), params)
+        return cur.fetchall()
+
+
+def _relevance_key(relevance: Dict[str, float], row: tuple) -> tuple:
+    # Порядок sort=relevance: по убыванию релевантности, затем model, id.
+    return (-relevance.get(row[_ID], 0.0), row[_MODEL], row[_ID])
+
+
+def list_products(
+    conn,
+    *,
+    sort: str = "price_asc",
+    relevance: Optional[Dict[str, float]] = None,
+    as_json: bool = False,
+    **filters,
+) -> list:
+    """
+    Выборка товаров с фильтрами (см. _filter_conditions). Сортировка — один из ключей SORTS
+    (по умолчанию по цене), товары без значения ключа в конце. sort="relevance" вместе с
+    relevance ({id: score} из db/search.py) упорядочивает по релевантности.
+    as_json=True — товары готовыми JSON-строками (см. _row_to_product_json) вместо dict.
+    """
+    conditions, params = _filter_conditions(**filters)
+    if sort == "relevance" and relevance is not None:
+        rows = _select_products(conn, conditions, params, "id")
+        rows.sort(key=lambda r: _relevance_key(relevance, r))
+    else:
+        _, column, direction = _sort_spec(sort)
+        rows = _select_products(conn, conditions, params, _order_by(column, direction))
+    return _format_rows(rows, as_json)
+
+
+def encode_cursor(sort: str, value: Any, model: str, id_value: str) -> str:
+    """Непрозрачный курсор keyset-пагинации: позиция последнего отданного товара."""
+    raw = json.dumps(
+        [sort, None if value is None else str(value), model, id_value],
+        ensure_ascii=False,
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Optional[str], str, str]:
+    """Курсор -> (значение ключа сортировки, model, id). ValueError, если курсор битый."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        cursor_sort, value, model, id_value = data
+    except (ValueError, TypeError, UnicodeError, binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+    if cursor_sort != sort or not isinstance(model, str) or not isinstance(id_value, str):
+        raise ValueError("Invalid cursor")
+    if value is not None:
+        try:
+            float(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+    return value, model, id_value
+
+
+def list_products_page(
+    conn,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    sort: str = "price_asc",
+    relevance: Optional[Dict[str, float]] = None,
+    as_json: bool = False,
+    **filters,
+) -> Dict[str, Any]:
+    """
+    Страница list_products: не больше limit товаров после курсора.
+    Возвращает {"items", "next_cursor", "total"}; total считается только при with_total.
+
+    Курсор — значения (ключ сортировки, model, id) последнего товара. Сначала идут строки
+    с непустым ключом (условие по ключу обслуживается индексом сортировки), затем, если
+    страница не заполнена, — строки с NULL, тоже по индексу.
+    """
+    conditions, params = _filter_conditions(**filters)
+    if sort == "relevance" and relevance is not None:
+        return _relevance_page(
+            conn, conditions, params, relevance, limit, cursor, with_total, as_json
+        )
+    sort, column, direction = _sort_spec(sort)
+    order = _order_by(column, direction)
+    fetch = limit + 1
+
+    if cursor is None:
+        rows = _select_products(conn, conditions, params, order, fetch)
+    else:
+        value, model, id_value = decode_cursor(cursor, sort)
+        rows = []
+        if value is not None:
+            after = _after_cursor(column, direction)
+            rows = _select_products(
+                conn, conditions + [after], params + [value, value, model, id_value], order, fetch
+            )
+        if len(rows) < fetch:
+            nulls, nulls_params = _nulls_after_cursor(column, value, model, id_value)
+            rows += _select_products(
+                conn, conditions + nulls, params + nulls_params, order, fetch - len(rows)
+            )
+    rows, next_cursor = _page_cut(rows, limit, sort, column)
+
+    total = None
+    if with_total:
+        with conn.cursor() as cur:
+            execute_prepared(cur, _count_sql(conditions), params)
+            total = cur.fetchone()[0]
+
+    return {
+        "items": _format_rows(rows, as_json),
+        "next_cursor": next_cursor,
+        "total": total,
+    }
+
+
+def _relevance_page(
+    conn,
+    conditions: List[str],
+    params: List[Any],
+    relevance: Dict[str, float],
+    limit: int,
+    cursor: Optional[str],
+    with_total: bool,
+    as_json: bool,
+) -> Dict[str, Any]:
+    # Кандидаты уже ограничены поисковым индексом, поэтому сортируем их в Python.
+    rows = _select_products(conn, conditions, params, "id")
+    total = len(rows) if with_total else None
+    rows.sort(key=lambda r: _relevance_key(relevance, r))
+    if cursor is not None:
+        value, model, id_value = decode_cursor(cursor, "relevance")
+        after = (-float(value or 0.0), model, id_value)
+        rows = [r for r in rows if _relevance_key(relevance, r) > after]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            "relevance", relevance.get(last[_ID], 0.0), last[_MODEL], last[_ID]
+        )
+    return {
+        "items": _format_rows(rows, as_json),
+        "next_cursor": next_cursor,
+        "total": total,
+    }
 
 
 def get_by_id(conn, id_value: str) -> Optional[Dict[str, Any]]:
     """Найти товар по id (number)."""
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor() as cur:
         cur.execute(
-            "SELECT id, number, type, model, size, diameter, "
-            "airflow_min, airflow_max, airflow_raw, pressure_min, pressure_max, pressure_raw, "
-            "power, noise_level, price, "
-            "raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price, "
-            "model_slug FROM products WHERE id = %s",
+            f"SELECT {_SELECT_COLUMNS} FROM products WHERE id = %s",
             (id_value.strip(),),
         )
         row = cur.fetchone()
     if not row:
         return None
-    return _row_to_product_dict(dict(row))
+    return _row_to_product_dict(row)
 
 
 def get_by_model_or_slug(
     conn, model_value: str, slug_value: str
 ) -> Optional[Dict[str, Any]]:
     """Найти товар по точному совпадению model (case-insensitive) или model_slug."""
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor() as cur:
         cur.execute(
-            "SELECT id, number, type, model, size, diameter, "
-            "airflow_min, airflow_max, airflow_raw, pressure_min, pressure_max, pressure_raw, "
-            "power, noise_level, price, "
-            "raw_diameter, raw_efficiency, raw_pressure, raw_power, raw_noise_level, raw_price, "
-            "model_slug FROM products WHERE LOWER(model) = %s OR model_slug = %s LIMIT 1",
+            f"SELECT {_SELECT_COLUMNS} FROM products "
+            "WHERE LOWER(model) = %s OR model_slug = %s LIMIT 1",
             (model_value.lower(), slug_value),
         )
         row = cur.fetchone()
     if not row:
         return None
-    return _row_to_product_dict(dict(row))
+    return _row_to_product_dict(row)
+
+
+# Параметры: id, model (в нижнем регистре), slug, id, model.
+_FIND_PRODUCT_SQL = (
+    f"SELECT {_SELECT_COLUMNS} FROM products "
+    "WHERE id = %s OR LOWER(model) = %s OR model_slug = %s "
+    "ORDER BY CASE WHEN id = %s THEN 0 WHEN LOWER(model) = %s THEN 1 ELSE 2 END, id "
+    "LIMIT 1"
+)
+
+
+def find_product(conn, id_value: str, model_value: str, slug_value: str) -> Optional[Dict[str, Any]]:
+    """
+    Товар для страницы /api/products/<id_or_model> одним запросом: по id, иначе по model
+    (без учёта регистра), иначе по model_slug. Каждое условие обслуживается своим индексом
+    (первичный ключ, idx_products_model_lower, idx_products_model_slug).
+    """
+    with conn.cursor() as cur:
+        cur.execute(_FIND_PRODUCT_SQL, (id_value, model_value, slug_value, id_value, model_value))
+        row = cur.fetchone()
+    if not row:
+        return None
+    return _row_to_product_dict(row)
+
+
+def get_by_ids(conn, ids: Sequence[str]) -> List[Dict[str, Any]]:
+    """Товары по списку id в том же порядке; отсутствующие id пропускаются."""
+    if not ids:
+        return []
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT {_SELECT_COLUMNS} FROM products WHERE id = ANY(%s)", (list(ids),)
+        )
+        by_id = {r[_ID]: _row_to_product_dict(r) for r in cur.fetchall()}
+    return [by_id[i] for i in ids if i in by_id]
 
 
 def count_products(conn) -> int:
@@ -0,0 +1,178 @@
+"""
+Поиск по каталогу: in-process триграммный инвертированный индекс по model / size / type.
+Строится из products при загрузке каталога и перестраивается при смене его версии.
+
+Строки приводятся к "сложенному" виду: нижний регистр, кириллица, похожая на латиницу
+(В, О, С, Р, ...), заменяется латиницей, любая группа разделителей — одним пробелом. Так
+"ВО 30-160-040", "BO 30/160/040" и "во 30 160 040" совпадают, но границы частей остаются:
+"1250" не находит "12-50". Результаты ранжируются по релевантности, опечатки допускаются
+через долю совпавших триграмм.
+
+Индекс отдаёт все совпадения. Если их больше SEARCH_MAX_RESULTS, список id был бы слишком
+длинным для фильтра — тогда apply_search оставляет обычный LIKE, и X-Total-Count честный.
+"""
+import re
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from db.catalog_version import VersionedResource
+
+# Кириллица, которую на глаз не отличить от латиницы.
+_LOOKALIKES = str.maketrans("авекмнорстухё", "abekmhopctyxe")
+
+# Поля и их вес в релевантности.
+_FIELDS = (("model", 1.0), ("size", 0.9), ("type", 0.8))
+
+# Триграммы, встречающиеся в большем числе терминов, не используются для нечёткого поиска
+# (как стоп-слова): они почти ничего не говорят о совпадении, но дорого считаются.
+_MAX_FUZZY_POSTINGS = 20_000
+# Нечёткий поиск включается, только если точных совпадений меньше этого числа товаров.
+_FUZZY_BELOW = 20
+
+
+# Всё, кроме букв и цифр (подчёркивание тоже разделитель).
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def fold(value: str) -> str:
+    """Строка -> сложенный вид для поиска: разделители сведены к одному пробелу."""
+    s = (value or "").lower().translate(_LOOKALIKES)
+    return _SEPARATORS.sub(" ", s).strip()
+
+
+def trigrams(folded: str) -> set:
+    return {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+
+class SearchIndex:
+    """
+    Индекс строится по уникальным значениям полей (терминам): типоразмер и тип повторяются
+    у многих товаров, поэтому терминов намного меньше, чем строк.
+    """
+
+    def __init__(self, rows: List[Tuple[str, str, str, str]]):
+        # rows: (id, model, size, type)
+        self.ids: List[str] = []
+        self._terms: List[str] = []
+        self._term_weight: List[float] = []
+        self._term_docs: List[array] = []
+        term_ids: Dict[Tuple[int, str], int] = {}
+        postings: Dict[str, List[int]] = {}
+
+        for doc, (id_value, *fields) in enumerate(rows):
+            self.ids.append(id_value)
+            for (field_no, (_, weight)), value in zip(enumerate(_FIELDS), fields):
+                folded = fold(value)
+                if not folded:
+                    continue
+                key = (field_no, folded)
+                t = term_ids.get(key)
+                if t is None:
+                    t = term_ids[key] = len(self._terms)
+                    self._terms.append(folded)
+                    self._term_weight.append(weight)
+                    self._term_docs.append(array("l"))
+                    for gram in trigrams(folded):
+                        postings.setdefault(gram, []).append(t)
+                self._term_docs[t].append(doc)
+
+        self._postings: Dict[str, array] = {g: array("l", ts) for g, ts in postings.items()}
+
+    def _exact_scores(self, qf: str, lists: List[array]) -> Dict[int, float]:
+        # Термин, содержащий qf, есть в списке каждой триграммы запроса — достаточно
+        # перебрать самый короткий список и проверить вхождение подстрокой.
+        scores: Dict[int, float] = {}
+        if not lists or not lists[0]:
+            return scores
+        for t in lists[0]:
+            term = self._terms[t]
+            if qf not in term:
+                continue
+            if term == qf:
+                bonus = 2.0
+            elif term.startswith(qf):
+                bonus = 1.0
+            else:
+                bonus = 0.0
+            scores[t] = (1.0 + bonus + len(qf) / len(term)) * self._term_weight[t]
+        return scores
+
+    def _fuzzy_scores(self, lists: List[array], fuzzy_threshold: float) -> Dict[int, float]:
+        # Доля триграмм запроса, найденных в термине. Частые триграммы в подсчёт
+        # не входят — доля считается по остальным.
+        counted = [lst for lst in lists if len(lst) <= _MAX_FUZZY_POSTINGS]
+        if not counted:
+            return {}
+        hits: Counter = Counter()
+        for lst in counted:
+            hits.update(lst)
+        need = len(counted) * fuzzy_threshold
+        return {
+            # Всегда ниже любого точного совпадения.
+            t: 0.5 * (n / len(counted)) * self._term_weight[t]
+            for t, n in hits.items()
+            if n >= need
+        }
+
+    def search(
+        self, q: str, fuzzy_threshold: float = 0.5
+    ) -> Optional[List[Tuple[str, float]]]:
+        """
+        Найти товары по строке запроса. Возвращает все [(id, score)] по убыванию релевантности
+        или None, если запрос слишком короткий для триграмм (тогда нужен обычный LIKE).
+        """
+        qf = fold(q)
+        if len(qf) < 3:
+            return None
+        lists = sorted((self._postings.get(g, array("l")) for g in trigrams(qf)), key=len)
+        doc_scores: Dict[int, float] = {}
+
+        def collect(term_scores: Dict[int, float]) -> None:
+            for t, score in term_scores.items():
+                for doc in self._term_docs[t]:
+                    if score > doc_scores.get(doc, 0.0):
+                        doc_scores[doc] = score
+
+        collect(self._exact_scores(qf, lists))
+        if fuzzy_threshold < 1.0 and len(doc_scores) < _FUZZY_BELOW:
+            collect(self._fuzzy_scores(lists, fuzzy_threshold))
+        best = sorted(doc_scores.items(), key=lambda item: (-item[1], self.ids[item[0]]))
+        return [(self.ids[doc], round(score, 6)) for doc, score in best]
+
+
+def load_search_index(conn) -> SearchIndex:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, model, size, type FROM products")
+        rows = cur.fetchall()
+    return SearchIndex(rows)
+
+
+_index = VersionedResource(load_search_index)
+
+
+def get_search_index(conn) -> SearchIndex:
+    """Актуальный поисковый индекс; перестраивается, если версия каталога изменилась."""
+    return _index.get(conn)
+
+
+def apply_search(
+    conn, filters: Dict[str, Any], max_results: int = 5000, fuzzy_threshold: float = 0.5
+) -> Tuple[Dict[str, Any], Optional[Dict[str, float]]]:
+    """
+    Заменить фильтр q на ids найденных индексом товаров.
+    Возвращает (новые фильтры, {id: релевантность}) или (filters, None), если q пуст,
+    слишком короткий или совпадений больше max_results (0 — без предела) — тогда остаётся
+    обычный фильтр LIKE: выдача не обрезается, а total считается по всем совпадениям.
+    """
+    q = filters.get("q")
+    if not q:
+        return filters, None
+    index = get_search_index(conn)
+    with metrics.stage("search"):
+        hits = index.search(q, fuzzy_threshold)
+    if hits is None or (max_results and len(hits) > max_results):
+        return filters, None
+    filters = dict(filters, q=None, ids=[id_value for id_value, _ in hits])
+    return filters, dict(hits)
@@ -0,0 +1,184 @@
+"""
+Подбор вентилятора по рабочей точке (расход воздуха + давление).
+In-process индекс: центрированные деревья интервалов по airflow_min/airflow_max и
+pressure_min/pressure_max. Кандидаты берутся из того дерева, где их меньше, второе
+измерение проверяется по ним напрямую. Строится из products и перестраивается при смене
+версии каталога.
+"""
+import heapq
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from db.catalog_version import VersionedResource
+
+# Вклад вторичных критериев в итоговую оценку (остальное — покрытие рабочей точки).
+_COST_SHARE = 0.4
+# Веса вторичных критериев: мощность, шум, цена.
+_COST_WEIGHTS = (("power", 1.0), ("noise_level", 1.0), ("price", 1.0))
+
+
+class IntervalTree:
+    """Статическое центрированное дерево интервалов: все интервалы, содержащие точку."""
+
+    def __init__(self, intervals: List[Tuple[float, float, int]]):
+        # intervals: (lo, hi, номер строки), lo <= hi
+        self._root = self._build(intervals)
+
+    def _build(self, items: List[Tuple[float, float, int]]):
+        if not items:
+            return None
+        ends = sorted(x for lo, hi, _ in items for x in (lo, hi))
+        center = ends[len(ends) // 2]
+        left = [iv for iv in items if iv[1] < center]
+        right = [iv for iv in items if iv[0] > center]
+        mid = [iv for iv in items if iv[0] <= center <= iv[1]]
+        by_lo = sorted(mid, key=lambda iv: iv[0])
+        by_hi = sorted(mid, key=lambda iv: -iv[1])
+        return (
+            center,
+            [iv[0] for iv in by_lo],
+            [iv[2] for iv in by_lo],
+            [-iv[1] for iv in by_hi],
+            [iv[2] for iv in by_hi],
+            self._build(left),
+            self._build(right),
+        )
+
+    def _walk(self, x: float):
+        # (строки узла, сколько из них содержат x) по пути от корня.
+        node = self._root
+        while node is not None:
+            center, los, lo_rows, neg_his, hi_rows, left, right = node
+            if x < center:
+                # У всех интервалов узла hi >= center > x — достаточно lo <= x.
+                yield lo_rows, bisect_right(los, x)
+                node = left
+            elif x > center:
+                yield hi_rows, bisect_right(neg_his, -x)
+                node = right
+            else:
+                yield lo_rows, len(lo_rows)
+                break
+
+    def count(self, x: float) -> int:
+        """Сколько интервалов содержат x (без материализации списка)."""
+        return sum(n for _, n in self._walk(x))
+
+    def stab(self, x: float) -> List[int]:
+        """Номера строк, чьи интервалы содержат x."""
+        out: List[int] = []
+        for rows, n in self._walk(x):
+            out.extend(rows[:n])
+        return out
+
+
+def _position(value: float, lo: float, hi: float) -> float:
+    """Положение value в [lo, hi]: 0 — нижняя граница, 1 — верхняя."""
+    if hi <= lo:
+        return 0.5
+    return (value - lo) / (hi - lo)
+
+
+class DutyPointIndex:
+    def __init__(self, rows: List[tuple]):
+        # rows: (id, type, airflow_min, airflow_max, pressure_min, pressure_max, power, noise_level, price)
+        self.ids: List[str] = []
+        self.types: List[str] = []
+        self._pressure: List[Tuple[float, float]] = []
+        self._airflow: List[Tuple[float, float]] = []
+        costs: Dict[str, List[Optional[float]]] = {name: [] for name, _ in _COST_WEIGHTS}
+        airflow_intervals = []
+        pressure_intervals = []
+        for id_value, type_, af_min, af_max, pr_min, pr_max, power, noise, price in rows:
+            if None in (af_min, af_max, pr_min, pr_max):
+                continue
+            # В прайсе диапазон часто записан от большего к меньшему ("97 - 56") —
+            # это тот же диапазон.
+            airflow_range = (float(min(af_min, af_max)), float(max(af_min, af_max)))
+            pressure_range = (float(min(pr_min, pr_max)), float(max(pr_min, pr_max)))
+            i = len(self.ids)
+            self.ids.append(id_value)
+            self.types.append(type_ or "")
+            self._airflow.append(airflow_range)
+            self._pressure.append(pressure_range)
+            for name, value in (("power", power), ("noise_level", noise), ("price", price)):
+                costs[name].append(None if value is None else float(value))
+            airflow_intervals.append((*airflow_range, i))
+            pressure_intervals.append((*pressure_range, i))
+        self._airflow_tree = IntervalTree(airflow_intervals)
+        self._pressure_tree = IntervalTree(pressure_intervals)
+
+        # Вторичная стоимость не зависит от рабочей точки: мощность, шум и цена,
+        # нормированные по всему каталогу (0 — лучший, 1 — худший или неизвестно).
+        self._cost = [0.0] * len(self.ids)
+        weight_sum = sum(w for _, w in _COST_WEIGHTS)
+        for name, weight in _COST_WEIGHTS:
+            known = [v for v in costs[name] if v is not None]
+            lo, hi = (min(known), max(known)) if known else (0.0, 0.0)
+            for i, value in enumerate(costs[name]):
+                if value is None:
+                    part = 1.0
+                elif hi > lo:
+                    part = (value - lo) / (hi - lo)
+                else:
+                    part = 0.0
+                self._cost[i] += weight * part / weight_sum
+
+    def _score(self, i: int, airflow: float, pressure: float) -> Tuple[float, float, float, float]:
+        af_pos = _position(airflow, *self._airflow[i])
+        pr_pos = _position(pressure, *self._pressure[i])
+        coverage = ((1 - abs(2 * af_pos - 1)) + (1 - abs(2 * pr_pos - 1))) / 2
+        score = (1 - _COST_SHARE) * coverage + _COST_SHARE * (1 - self._cost[i])
+        return score, coverage, af_pos, pr_pos
+
+    def select(
+        self, airflow: float, pressure: float, limit: int = 10, type_: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Вентиляторы, чьи диапазоны расхода и давления покрывают рабочую точку, лучшие первыми.
+        Покрытие: насколько точка близка к середине обоих диапазонов (1 — в центре, 0 — на краю).
+        Вторичная стоимость: мощность, шум и цена.
+        """
+        if self._airflow_tree.count(airflow) <= self._pressure_tree.count(pressure):
+            stabbed, other, point = self._airflow_tree.stab(airflow), self._pressure, pressure
+        else:
+            stabbed, other, point = self._pressure_tree.stab(pressure), self._airflow, airflow
+        types = self.types
+        candidates = [
+            i for i in stabbed
+            if other[i][0] <= point <= other[i][1] and (not type_ or types[i] == type_)
+        ]
+        best = heapq.nlargest(
+            limit, candidates, key=lambda i: (self._score(i, airflow, pressure)[0], -i)
+        )
+        result = []
+        for i in best:
+            score, coverage, af_pos, pr_pos = self._score(i, airflow, pressure)
+            result.append(
+                {
+                    "id": self.ids[i],
+                    "score": round(score, 4),
+                    "coverage": round(coverage, 4),
+                    "airflow_position": round(af_pos, 4),
+                    "pressure_position": round(pr_pos, 4),
+                }
+            )
+        return result
+
+
+def load_duty_point_index(conn) -> DutyPointIndex:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, type, airflow_min, airflow_max, pressure_min, pressure_max, "
+            "power, noise_level, price FROM products"
+        )
+        rows = cur.fetchall()
+    return DutyPointIndex(rows)
+
+
+_index = VersionedResource(load_duty_point_index)
+
+
+def get_duty_point_index(conn) -> DutyPointIndex:
+    """Актуальный индекс подбора; перестраивается, если версия каталога изменилась."""
+    return _index.get(conn)
@@ -0,0 +1,191 @@
+"""
+Похожие вентиляторы (замены): k ближайших соседей по характеристикам. In-process
+KD-дерево по нормированным диаметру, диапазонам расхода и давления, мощности и шуму;
+отдельное дерево на каждый тип — для ограничения "того же типа". Строится из products
+и перестраивается при смене версии каталога.
+"""
+import heapq
+import math
+from bisect import bisect_right
+from math import dist
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db.catalog_version import VersionedResource
+
+# Признаки: (колонка, вес, логарифмическая шкала). Расход и давление важнее остального;
+# величины, растущие на порядки (расход, давление, мощность), сравниваются в логарифме.
+_FEATURES = (
+    ("diameter", 0.5, True),
+    ("airflow_min", 1.0, True),
+    ("airflow_max", 1.0, True),
+    ("pressure_min", 1.0, True),
+    ("pressure_max", 1.0, True),
+    ("power", 0.5, True),
+    ("noise_level", 0.5, False),
+)
+# Точек в листе дерева: ниже этого делить дальше дороже, чем перебрать лист.
+_LEAF_SIZE = 16
+# По скольким строкам узла оценивать разброс осей при построении.
+_SPREAD_SAMPLE = 256
+# Если ограничению по цене удовлетворяет не больше стольких товаров, они перебираются
+# напрямую: обход дерева с редким фильтром посетил бы почти все листья.
+_SCAN_BELOW = 20_000
+
+
+class KDTree:
+    """Статическое KD-дерево над points[rows]: узел — (ось, граница, левый, правый), лист — list строк."""
+
+    def __init__(self, points: List[Tuple[float, ...]], columns: List[List[float]], rows: List[int]):
+        # columns[a][row] == points[row][a]: по колонкам быстрее сортировать при построении.
+        self._points = points
+        self._columns = columns
+        self._root = self._build(rows)
+
+    def _build(self, rows: List[int]):
+        if len(rows) <= _LEAF_SIZE:
+            return rows
+        # Делим по оси с наибольшим разбросом (оценка по выборке строк), по медиане.
+        sample = rows[:: max(1, len(rows) // _SPREAD_SAMPLE)]
+        axis, spread = 0, 0.0
+        for a, column in enumerate(self._columns):
+            values = [column[r] for r in sample]
+            s = max(values) - min(values)
+            if s > spread:
+                axis, spread = a, s
+        if spread <= 0.0:
+            return rows
+        column = self._columns[axis]
+        rows = sorted(rows, key=column.__getitem__)
+        mid = len(rows) // 2
+        return (axis, column[rows[mid]], self._build(rows[:mid]), self._build(rows[mid:]))
+
+    def nearest(
+        self, query: Tuple[float, ...], k: int, accept: Callable[[int], bool]
+    ) -> List[Tuple[float, int]]:
+        """k ближайших к query строк, для которых accept(row): [(расстояние, строка)]."""
+        points = self._points
+        # Куча худших из найденных: (-d, -row) — на вершине самый дальний.
+        best: List[Tuple[float, int]] = []
+
+        def visit(node) -> None:
+            if isinstance(node, list):
+                for r in node:
+                    if not accept(r):
+                        continue
+                    d = dist(query, points[r])
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, -r))
+                    elif (d, r) < (-best[0][0], -best[0][1]):
+                        heapq.heapreplace(best, (-d, -r))
+                return
+            axis, split, left, right = node
+            diff = query[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(best) < k or abs(diff) <= -best[0][0]:
+                visit(far)
+
+        if k > 0:
+            visit(self._root)
+        return sorted((-d, -r) for d, r in best)
+
+
+class SimilarityIndex:
+    def __init__(self, rows: List[tuple]):
+        # rows: (id, type, price, diameter, airflow_min, airflow_max, pressure_min,
+        #        pressure_max, power, noise_level) — признаки в порядке _FEATURES
+        self.ids: List[str] = [r[0] for r in rows]
+        self.types: List[str] = [r[1] or "" for r in rows]
+        self.prices: List[Optional[float]] = [None if r[2] is None else float(r[2]) for r in rows]
+        self._row_by_id = {id_value: i for i, id_value in enumerate(self.ids)}
+
+        columns = []
+        for n, (_, weight, log_scale) in enumerate(_FEATURES):
+            values = [_scaled(r[3 + n], log_scale) for r in rows]
+            known = sorted(v for v in values if v is not None)
+            lo, hi = (known[0], known[-1]) if known else (0.0, 0.0)
+            # Неизвестное значение — медиана каталога: не тянет ни к одному краю.
+            median = (known[len(known) // 2] - lo) / (hi - lo) if known and hi > lo else 0.5
+            # Вес входит в координату: евклидово расстояние сразу взвешенное.
+            factor = math.sqrt(weight)
+            columns.append(
+                [
+                    factor * (median if v is None else (v - lo) / (hi - lo) if hi > lo else 0.5)
+                    for v in values
+                ]
+            )
+        self._points: List[Tuple[float, ...]] = list(zip(*columns)) if rows else []
+
+        all_rows = list(range(len(self.ids)))
+        self._tree = KDTree(self._points, columns, all_rows)
+        by_type: Dict[str, List[int]] = {}
+        for i in all_rows:
+            by_type.setdefault(self.types[i], []).append(i)
+        self._type_trees = {t: KDTree(self._points, columns, rows_) for t, rows_ in by_type.items()}
+        # Строки с известной ценой по её возрастанию — для перебора под строгий max_price.
+        self._by_price = sorted(
+            (r for r in all_rows if self.prices[r] is not None), key=self.prices.__getitem__
+        )
+        self._sorted_prices = [self.prices[r] for r in self._by_price]
+
+    def has(self, id_value: str) -> bool:
+        return id_value in self._row_by_id
+
+    def similar(
+        self,
+        id_value: str,
+        limit: int = 10,
+        same_type: bool = False,
+        max_price: Optional[float] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Ближайшие по характеристикам товары, кроме самого id_value; None, если его нет в индексе.
+        same_type — только того же типа; max_price — только с известной ценой не выше неё.
+        """
+        i = self._row_by_id.get(id_value)
+        if i is None:
+            return None
+        query = self._points[i]
+        type_ = self.types[i]
+        prices = self.prices
+        affordable = None if max_price is None else bisect_right(self._sorted_prices, max_price)
+        if affordable is not None and affordable <= _SCAN_BELOW:
+            points, types = self._points, self.types
+            candidates = (
+                (dist(query, points[r]), r)
+                for r in self._by_price[:affordable]
+                if r != i and (not same_type or types[r] == type_)
+            )
+            found = heapq.nsmallest(limit, candidates)
+        else:
+            tree = self._type_trees[type_] if same_type else self._tree
+            if max_price is None:
+                accept = i.__ne__
+            else:
+                def accept(r: int) -> bool:
+                    return r != i and prices[r] is not None and prices[r] <= max_price
+            found = tree.nearest(query, limit, accept)
+        return [{"id": self.ids[r], "distance": round(d, 4)} for d, r in found]
+
+
+def _scaled(value: Any, log_scale: bool) -> Optional[float]:
+    if value is None:
+        return None
+    value = float(value)
+    return math.log1p(max(value, 0.0)) if log_scale else value
+
+
+def load_similarity_index(conn) -> SimilarityIndex:
+    columns = ", ".join(name for name, _, _ in _FEATURES)
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT id, type, price, {columns} FROM products ORDER BY id")
+        rows = cur.fetchall()
+    return SimilarityIndex(rows)
+
+
+_index = VersionedResource(load_similarity_index)
+
+
+def get_similarity_index(conn) -> SimilarityIndex:
+    """Актуальный индекс похожих товаров; перестраивается, если версия каталога изменилась."""
+    return _index.get(conn)
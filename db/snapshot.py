@@ -0,0 +1,328 @@
+"""
+Снимок каталога в памяти: таблица products, разложенная по колонкам.
+Числовые колонки — array('d') с NaN вместо NULL плюс маски NULL; каждый фильтр
+list_products — один проход по колонке (map сравнения по строкам) в байтовую маску (по
+байту на строку), маски объединяются AND через int, без похода в БД. Снимок
+перестраивается целиком при смене версии каталога.
+"""
+import heapq
+import math
+from array import array
+from bisect import bisect_right
+from itertools import compress, repeat
+from operator import contains, eq, ge, le
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+from db.catalog_version import VersionedResource
+from db.facets import FACET_COLUMNS, facets_from_rows
+from db.repository import (
+    _SELECT_COLUMNS,
+    NUMERIC_COLUMNS,
+    PRODUCT_COLUMNS,
+    SORTS,
+    _row_to_product_dict,
+    _row_to_product_json,
+    _sort_spec,
+    decode_cursor,
+    encode_cursor,
+)
+
+_NAN = float("nan")
+
+
+def _mask(values) -> int:
+    """Итерируемое из bool -> маска: int, в котором каждой строке соответствует один байт 0/1."""
+    return int.from_bytes(bytearray(values), "little")
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок products."""
+
+    def __init__(self, rows: List[tuple]):
+        n = len(rows)
+        self.size = n
+        columns = list(zip(*rows)) if rows else [()] * len(PRODUCT_COLUMNS)
+        self._text: Dict[str, list] = {}
+        self._num: Dict[str, array] = {}
+        self._nulls: Dict[str, int] = {}
+        for name, values in zip(PRODUCT_COLUMNS, columns):
+            if name in NUMERIC_COLUMNS:
+                self._num[name] = array(
+                    "d", (_NAN if v is None else float(v) for v in values)
+                )
+                self._nulls[name] = _mask(v is None for v in values)
+            else:
+                self._text[name] = list(values)
+
+        self._all = _mask(repeat(True, n))
+        self._row_by_id = {id_value: i for i, id_value in enumerate(self._text["id"])}
+        # Строка для q: то же, что LOWER(model) / LOWER(size) / LOWER(type) LIKE '%q%'.
+        self._haystack = [
+            f"{m or ''}\x00{s or ''}\x00{t or ''}".lower()
+            for m, s, t in zip(self._text["model"], self._text["size"], self._text["type"])
+        ]
+        self._type_masks: Dict[str, int] = {}
+        for t in set(self._text["type"]):
+            self._type_masks[t] = _mask(map(eq, self._text["type"], repeat(t)))
+
+        # Колонки в порядке PRODUCT_COLUMNS: (числовая ли, значения).
+        self._columns = [
+            (True, self._num[name]) if name in self._num else (False, self._text[name])
+            for name in PRODUCT_COLUMNS
+        ]
+        # JSON товаров (см. _row_to_product_json) — считается при первой выдаче строки.
+        self._json: List[Optional[str]] = [None] * n
+
+        # Порядки сортировок строятся лениво, при первом запросе с этой сортировкой.
+        self._orders: Dict[str, Tuple[array, list]] = {}
+        self._order("price_asc")
+
+    # --- маски ---
+
+    def _cmp(self, column: str, op, value: float) -> int:
+        # NaN (NULL) в сравнениях даёт False — как "col IS NOT NULL AND col op value".
+        return _mask(map(op, self._num[column], repeat(value)))
+
+    def _cmp_or_null(self, column: str, op, value: float) -> int:
+        # "(col IS NULL OR col op value)" — правила пересечения диапазонов.
+        return self._cmp(column, op, value) | self._nulls[column]
+
+    def _row(self, i: int) -> tuple:
+        """Строка i в порядке PRODUCT_COLUMNS, как из выборки БД."""
+        row = []
+        for numeric, values in self._columns:
+            v = values[i]
+            row.append(None if numeric and math.isnan(v) else v)
+        return tuple(row)
+
+    def _product(self, i: int) -> Dict[str, Any]:
+        return _row_to_product_dict(self._row(i))
+
+    def _product_json(self, i: int) -> str:
+        text = self._json[i]
+        if text is None:
+            text = self._json[i] = _row_to_product_json(self._row(i))
+        return text
+
+    def _format(self, selected: List[int], as_json: bool) -> list:
+        formatter = self._product_json if as_json else self._product
+        with metrics.stage("convert"):
+            return [formatter(i) for i in selected]
+
+    def _sort_key(self, column: str, direction: str, value: float, model: str, id_value: str):
+        # Тот же порядок, что _order_by в SQL: "<column> <direction> NULLS LAST", затем model
+        # и id в COLLATE "C" — str в Python тоже сравниваются по кодовым точкам.
+        if math.isnan(value):
+            return (1, 0.0, model, id_value)
+        return (0, value if direction == "ASC" else -value, model, id_value)
+
+    def _order(self, sort: str) -> Tuple[array, list]:
+        """(позиция каждой строки в порядке сортировки, отсортированные ключи)."""
+        order = self._orders.get(sort)
+        if order is None:
+            column, direction = SORTS[sort]
+            values = self._num[column]
+            model = self._text["model"]
+            ids = self._text["id"]
+            keyed = sorted(
+                (self._sort_key(column, direction, values[i], model[i] or "", ids[i]), i)
+                for i in range(self.size)
+            )
+            rank = array("l", [0]) * self.size
+            for pos, (_, i) in enumerate(keyed):
+                rank[i] = pos
+            order = (rank, [key for key, _ in keyed])
+            self._orders[sort] = order
+        return order
+
+    def _filter(
+        self,
+        *,
+        q: Optional[str] = None,
+        type_: Optional[str] = None,
+        diameter: Optional[float] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_power: Optional[float] = None,
+        max_power: Optional[float] = None,
+        min_noise: Optional[float] = None,
+        max_noise: Optional[float] = None,
+        min_diameter: Optional[float] = None,
+        max_diameter: Optional[float] = None,
+        min_airflow: Optional[float] = None,
+        max_airflow: Optional[float] = None,
+        min_pressure: Optional[float] = None,
+        max_pressure: Optional[float] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[int]:
+        """Номера строк, прошедших фильтры (те же, что у db.repository.list_products)."""
+        mask = self._all
+        if q and q.strip():
+            t = q.strip().lower()
+            mask &= _mask(map(contains, self._haystack, repeat(t)))
+        if ids is not None:
+            found = bytearray(self.size)
+            for id_value in ids:
+                i = self._row_by_id.get(id_value)
+                if i is not None:
+                    found[i] = 1
+            mask &= int.from_bytes(found, "little")
+        if type_:
+            mask &= self._type_masks.get(type_, 0)
+        if diameter is not None:
+            mask &= self._cmp("diameter", eq, diameter)
+        if min_price is not None:
+            mask &= self._cmp("price", ge, min_price)
+        if max_price is not None:
+            mask &= self._cmp("price", le, max_price)
+        if min_power is not None:
+            mask &= self._cmp("power", ge, min_power)
+        if max_power is not None:
+            mask &= self._cmp("power", le, max_power)
+        if min_noise is not None:
+            mask &= self._cmp("noise_level", ge, min_noise)
+        if max_noise is not None:
+            mask &= self._cmp("noise_level", le, max_noise)
+        if min_diameter is not None:
+            mask &= self._cmp("diameter", ge, min_diameter)
+        if max_diameter is not None:
+            mask &= self._cmp("diameter", le, max_diameter)
+        if min_airflow is not None:
+            mask &= self._cmp_or_null("airflow_max", ge, min_airflow)
+        if max_airflow is not None:
+            mask &= self._cmp_or_null("airflow_min", le, max_airflow)
+        if min_pressure is not None:
+            mask &= self._cmp_or_null("pressure_max", ge, min_pressure)
+        if max_pressure is not None:
+            mask &= self._cmp_or_null("pressure_min", le, max_pressure)
+
+        return list(compress(range(self.size), mask.to_bytes(self.size, "little")))
+
+    def _select(self, filters: Dict[str, Any]) -> List[int]:
+        with metrics.stage("snapshot"):
+            return self._filter(**filters)
+
+    def facets(self, buckets: int, **filters) -> Dict[str, Any]:
+        """Аналог db.facets.compute_facets: один проход по отобранным строкам."""
+        selected = self._select(filters)
+        types = self._text[FACET_COLUMNS[0]]
+        numeric = [self._num[name] for name in FACET_COLUMNS[1:]]
+        rows = (
+            (types[i], *[None if math.isnan(v) else v for v in (column[i] for column in numeric)])
+            for i in selected
+        )
+        with metrics.stage("facets"):
+            return facets_from_rows(rows, buckets)
+
+    def _relevance_key(self, relevance: Dict[str, float], i: int) -> tuple:
+        id_value = self._text["id"][i]
+        return (-relevance.get(id_value, 0.0), self._text["model"][i], id_value)
+
+    def list_products(
+        self,
+        *,
+        sort: str = "price_asc",
+        relevance: Optional[Dict[str, float]] = None,
+        as_json: bool = False,
+        **filters,
+    ) -> list:
+        """Аналог db.repository.list_products."""
+        selected = self._select(filters)
+        if sort == "relevance" and relevance is not None:
+            selected.sort(key=lambda i: self._relevance_key(relevance, i))
+        else:
+            sort, _, _ = _sort_spec(sort)
+            rank, _ = self._order(sort)
+            selected.sort(key=rank.__getitem__)
+        return self._format(selected, as_json)
+
+    def list_products_page(
+        self,
+        *,
+        limit: int,
+        cursor: Optional[str] = None,
+        with_total: bool = False,
+        sort: str = "price_asc",
+        relevance: Optional[Dict[str, float]] = None,
+        as_json: bool = False,
+        **filters,
+    ) -> Dict[str, Any]:
+        """Аналог db.repository.list_products_page; курсоры взаимозаменяемы с SQL-путём."""
+        if sort == "relevance" and relevance is not None:
+            return self._relevance_page(relevance, limit, cursor, with_total, as_json, filters)
+        sort, column, direction = _sort_spec(sort)
+        rank, keys = self._order(sort)
+        selected = self._select(filters)
+        total = len(selected) if with_total else None
+        if cursor is not None:
+            value, model, id_value = decode_cursor(cursor, sort)
+            after = self._sort_key(
+                column, direction, _NAN if value is None else float(value), model, id_value
+            )
+            start = bisect_right(keys, after)
+            selected = [i for i in selected if rank[i] >= start]
+        page = heapq.nsmallest(limit + 1, selected, key=rank.__getitem__)
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            value = self._num[column][last]
+            next_cursor = encode_cursor(
+                sort,
+                None if math.isnan(value) else value,
+                self._text["model"][last],
+                self._text["id"][last],
+            )
+        return {
+            "items": self._format(page, as_json),
+            "next_cursor": next_cursor,
+            "total": total,
+        }
+
+    def _relevance_page(
+        self,
+        relevance: Dict[str, float],
+        limit: int,
+        cursor: Optional[str],
+        with_total: bool,
+        as_json: bool,
+        filters: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        selected = self._select(filters)
+        total = len(selected) if with_total else None
+        if cursor is not None:
+            value, model, id_value = decode_cursor(cursor, "relevance")
+            after = (-float(value or 0.0), model, id_value)
+            selected = [i for i in selected if self._relevance_key(relevance, i) > after]
+        page = heapq.nsmallest(limit + 1, selected, key=lambda i: self._relevance_key(relevance, i))
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            score, model, id_value = self._relevance_key(relevance, page[-1])
+            next_cursor = encode_cursor("relevance", -score, model, id_value)
+        return {
+            "items": self._format(page, as_json),
+            "next_cursor": next_cursor,
+            "total": total,
+        }
+
+
+def load_snapshot(conn) -> CatalogSnapshot:
+    """Прочитать products целиком и построить снимок."""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT {_SELECT_COLUMNS} FROM products ORDER BY id"
+        )
+        rows = cur.fetchall()
+    return CatalogSnapshot(rows)
+
+
+_snapshot = VersionedResource(load_snapshot)
+
+
+def get_snapshot(conn) -> CatalogSnapshot:
+    """Актуальный снимок каталога; перестраивается, если версия каталога изменилась."""
+    return _snapshot.get(conn)
@@ -0,0 +1,208 @@
+"""
+Встроенное хранилище каталога в SQLite (DATABASE_URL=sqlite:///path/to/catalog.db).
+
+SqliteConnection повторяет ту часть интерфейса psycopg2, которой пользуются модули db/:
+cursor() как контекстный менеджер, execute с параметрами %s, commit/rollback. SQL
+репозитория переводится на диалект SQLite при выполнении (см. translate_sql), поэтому
+list_products, get_by_id, find_product, count_products и загрузчики работают
+с обеими БД без изменений.
+
+Запросы приложения идут через соединения только для чтения, по одному на поток; файл
+в режиме WAL, так что чтение не блокируется загрузкой каталога из другого процесса.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import unquote, urlsplit
+
+import metrics
+
+_PLACEHOLDER = re.compile(r"%(s|%)")
+# Приведения типов Postgres (::float8, ::numeric): в SQLite колонки уже REAL.
+_CAST = re.compile(r"::\w+")
+_ANY = re.compile(r"=\s*ANY\(%s\)")
+# "col DIR NULLS LAST" -> "col IS NULL, col DIR": так сортировка совпадает с индексами
+# вида (col IS NULL, col DIR, model, id) из db/migrations.py.
+_NULLS_LAST = re.compile(r"([\w.]+) (ASC|DESC) NULLS LAST")
+# IS DISTINCT FROM появился только в SQLite 3.39; IS NOT — то же сравнение с учётом NULL.
+_DISTINCT = re.compile(r"\bIS DISTINCT FROM\b")
+# COLLATE "C" в SQLite нет; BINARY по умолчанию — тот же порядок по кодовым точкам.
+_COLLATE_C = re.compile(r' COLLATE "C"')
+
+
+def is_sqlite_url(database_url: str) -> bool:
+    return database_url.startswith("sqlite:")
+
+
+def sqlite_path(database_url: str) -> str:
+    """sqlite:///abs/path.db (и sqlite:////abs/path.db), sqlite:relative.db -> путь к файлу."""
+    rest = database_url[len("sqlite:"):]
+    if rest.startswith("//"):
+        path = unquote(urlsplit(database_url).path)
+        # sqlite:////abs/path.db (как в SQLAlchemy) даёт "//abs/path.db".
+        return "/" + path.lstrip("/") if path.startswith("/") else path
+    return unquote(rest)
+
+
+def translate_sql(sql: str) -> str:
+    """SQL в стиле psycopg2/Postgres -> SQLite."""
+    sql = _ANY.sub("IN (SELECT value FROM json_each(%s))", sql)
+    sql = _NULLS_LAST.sub(r"\1 IS NULL, \1 \2", sql)
+    sql = _DISTINCT.sub("IS NOT", sql)
+    sql = _COLLATE_C.sub("", sql)
+    sql = _CAST.sub("", sql)
+    return _PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", sql)
+
+
+def _param(value: Any) -> Any:
+    # Списки — только в "= ANY(%s)", который стал json_each(?).
+    if isinstance(value, (list, tuple)):
+        return json.dumps(list(value), ensure_ascii=False)
+    return value
+
+
+def _lower(value: Optional[str]) -> Optional[str]:
+    # Встроенный lower() SQLite понимает только ASCII, а модели — кириллица.
+    return value.lower() if isinstance(value, str) else value
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class SqliteCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cur = cursor
+
+    def __enter__(self) -> "SqliteCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._cur.close()
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        t0 = time.perf_counter()
+        try:
+            self._cur.execute(translate_sql(sql), [_param(p) for p in params or ()])
+        finally:
+            metrics.observe_query(sql, params, time.perf_counter() - t0)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> None:
+        self._cur.executemany(
+            translate_sql(sql), ([_param(p) for p in params] for params in seq_of_params)
+        )
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self) -> List[tuple]:
+        return self._cur.fetchall()
+
+    def fetchmany(self, size: int) -> List[tuple]:
+        return self._cur.fetchmany(size)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cur.rowcount
+
+    def close(self) -> None:
+        self._cur.close()
+
+
+class SqliteConnection:
+    """Соединение SQLite с интерфейсом, который ожидают модули db/ от psycopg2."""
+
+    def __init__(self, path: str, readonly: bool = True):
+        self.path = path
+        self.readonly = readonly
+        # Отдельное соединение на одно долгое чтение (не соединение потока), см. SqlitePool.
+        self.dedicated = False
+        # Соединение используется одним потоком, но закрыть его при остановке
+        # (SqlitePool.closeall) можно из любого.
+        if readonly:
+            # as_uri() экранирует ?, # и % в пути, которые иначе разобрал бы URI.
+            self._conn = sqlite3.connect(
+                Path(path).resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("lower", 1, _lower, deterministic=True)
+        self._conn.create_function("now", 0, _now)
+
+    @property
+    def closed(self) -> bool:
+        return self._conn is None
+
+    def cursor(self, cursor_factory=None) -> SqliteCursor:
+        return SqliteCursor(self._conn.cursor())
+
+    def executescript(self, script: str) -> None:
+        self._conn.executescript(script)
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SqlitePool:
+    """
+    "Пул" для SQLite: у каждого потока своё соединение только для чтения, открытое
+    на всё время жизни потока. Соединения для записи (init_db, загрузка) и для долгих
+    чтений (потоковая выгрузка) открываются отдельно и закрываются при возврате.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._readers: List[SqliteConnection] = []
+        self._closed = False
+        # Файл и режим WAL создаёт соединение на запись.
+        SqliteConnection(path, readonly=False).close()
+
+    def getconn(self, write: bool = False, dedicated: bool = False) -> SqliteConnection:
+        if write:
+            return SqliteConnection(self.path, readonly=False)
+        if dedicated:
+            conn = SqliteConnection(self.path, readonly=True)
+            conn.dedicated = True
+            return conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = SqliteConnection(self.path, readonly=True)
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def putconn(self, conn: SqliteConnection, close: bool = False) -> None:
+        if not conn.readonly or conn.dedicated or close or self._closed:
+            conn.close()
+            return
+        # Соединение потока остаётся открытым; незавершённое чтение закрывается.
+        conn.rollback()
+
+    def closeall(self) -> None:
+        self._closed = True
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "sqlite", "path": self.path, "readers": len(self._readers)}
@@ -0,0 +1,84 @@
+"""
+Автодополнение модели (/api/suggest): in-process индекс префиксов по model, size и
+model_slug — отсортированный массив ключей и bisect. Ключи сложены так же, как в поиске
+(db/search.py: нижний регистр, кириллица-двойник -> латиница), но без разделителей вовсе:
+для префикса границы частей не важны, поэтому "во 30-1", "BO30-1" и "во301" дают одно и
+то же. Строится из products и перестраивается при смене версии каталога.
+"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from db.catalog_version import VersionedResource
+from db.search import fold
+
+# Поля в порядке приоритета: при одинаковом ключе раньше идёт модель.
+_FIELDS = ("model", "size", "model_slug")
+
+
+def _key(value: str) -> str:
+    """Сложенный вид из поиска без пробелов между частями."""
+    return fold(value).replace(" ", "")
+
+
+class SuggestIndex:
+    """Уникальные значения полей, отсортированные по сложенному ключу."""
+
+    def __init__(self, rows: List[Tuple[str, str, str, str]]):
+        # rows: (id, model, size, model_slug)
+        terms: Dict[Tuple[str, int], List[Any]] = {}
+        for id_value, *values in rows:
+            for field_no, value in enumerate(values):
+                key = _key(value)
+                if not key:
+                    continue
+                term = terms.get((key, field_no))
+                if term is None:
+                    terms[(key, field_no)] = [value, 1, id_value]
+                else:
+                    term[1] += 1
+        ordered = sorted(terms.items(), key=lambda item: item[0])
+        self._keys: List[str] = [key for (key, _), _ in ordered]
+        # (значение, поле, число товаров, id — если товар один)
+        self._entries: List[Tuple[str, str, int, Optional[str]]] = [
+            (value, _FIELDS[field_no], count, id_value if count == 1 else None)
+            for (_, field_no), (value, count, id_value) in ordered
+        ]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Не больше limit подсказок, начинающихся с prefix, по алфавиту сложенного ключа.
+        Одно и то же значение (модель, совпадающий с ней типоразмер, её slug) возвращается
+        один раз — как модель.
+        """
+        pf = _key(prefix)
+        if not pf or limit <= 0:
+            return []
+        result: List[Dict[str, Any]] = []
+        seen = set()
+        i = bisect_left(self._keys, pf)
+        while i < len(self._keys) and len(result) < limit and self._keys[i].startswith(pf):
+            key = self._keys[i]
+            value, field, count, id_value = self._entries[i]
+            i += 1
+            # Поля с одинаковым ключом идут подряд, модель первой: типоразмер или slug,
+            # сложенные в тот же ключ, — та же подсказка.
+            if key in seen:
+                continue
+            seen.add(key)
+            result.append({"value": value, "field": field, "count": count, "id": id_value})
+        return result
+
+
+def load_suggest_index(conn) -> SuggestIndex:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, model, size, model_slug FROM products")
+        rows = cur.fetchall()
+    return SuggestIndex(rows)
+
+
+_index = VersionedResource(load_suggest_index)
+
+
+def get_suggest_index(conn) -> SuggestIndex:
+    """Актуальный индекс подсказок; перестраивается, если версия каталога изменилась."""
+    return _index.get(conn)
@@ -0,0 +1,77 @@
+"""
+Продакшен-сервер: gunicorn -c gunicorn.conf.py wsgi:app (так запускает run.sh).
+
+Мастер-процесс один раз создаёт схему и при пустой БД загружает CSV (bootstrap_catalog),
+строит снимок каталога и индексы (warm_up) и закрывает свои соединения; воркеры
+получают построенное при fork. Каждый воркер после fork открывает собственный пул
+DB_POOL_* и обслуживает WEB_THREADS потоков. При остановке (SIGTERM) воркеры дорабатывают
+текущие запросы в пределах WEB_GRACEFUL_TIMEOUT и закрывают пул.
+"""
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent / ".env")
+
+from config import (
+    DB_POOL_MAX,
+    PORT,
+    WARMUP,
+    WEB_GRACEFUL_TIMEOUT,
+    WEB_THREADS,
+    WEB_TIMEOUT,
+    WEB_WORKERS,
+)
+
+bind = f"0.0.0.0:{PORT}"
+workers = WEB_WORKERS
+threads = WEB_THREADS
+worker_class = "gthread" if WEB_THREADS > 1 else "sync"
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+# Приложение импортируется в мастере: код, статика и прогретые индексы общие для воркеров
+# (copy-on-write), а не загружаются в каждом заново.
+preload_app = True
+accesslog = "-"
+
+
+def on_starting(server):
+    from app import bootstrap_catalog, init_app_pool, warm_up
+    from db.connection import close_pool
+
+    init_app_pool()
+    try:
+        bootstrap_catalog()
+        if WARMUP:
+            server.log.info("Прогрев: снимок каталога и индексы")
+            warm_up()
+    finally:
+        # До fork: открытые соединения иначе достались бы всем воркерам сразу.
+        close_pool()
+    if DB_POOL_MAX < WEB_THREADS:
+        server.log.warning(
+            "DB_POOL_MAX=%s меньше WEB_THREADS=%s: потоки будут ждать соединений",
+            DB_POOL_MAX,
+            WEB_THREADS,
+        )
+
+
+def post_fork(server, worker):
+    from app import init_app_pool
+
+    init_app_pool()
+
+
+def post_worker_init(worker):
+    # Индексы уже построены в мастере; здесь открываются соединения пула и проверяется
+    # версия каталога — первые запросы не платят за холодный старт.
+    if WARMUP:
+        from app import warm_up
+
+        warm_up()
+
+
+def worker_exit(server, worker):
+    from db.connection import close_pool
+
+    close_pool()
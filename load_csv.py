@@ -2,29 +2,119 @@
 """
 Загрузка данных из fans_data.csv в БД. Запуск из корня проекта:
   python load_csv.py
-  или: python -m db.load_csv
+  python load_csv.py --bulk            # COPY через staging-таблицу, для больших файлов
+  python load_csv.py --sync            # только изменённые строки, удаление пропавших
+  python load_csv.py --bulk --workers 8 big.csv   # разбор CSV в 8 процессах
+  python load_csv.py path/to/file.csv
 """
+import argparse
+import json
 from pathlib import Path
 
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
-from config import DATABASE_URL
+from config import CSV_PARSE_WORKERS, DATABASE_URL
 from db.connection import close_pool, get_connection, init_pool, put_connection
 from db.init_db import init_db
-from db.load_csv import load_csv_into_db
+from db.load_csv import bulk_load_csv_into_db, load_csv_into_db, sync_csv_into_db
 
 BASE_DIR = Path(__file__).resolve().parent
 CSV_PATH = BASE_DIR / "fans_data.csv"
 
+# Сколько id каждого вида показывать в отчёте синхронизации.
+REPORT_IDS = 20
+# Сколько строк с ошибками разбора показывать.
+REPORT_ERRORS = 20
+
+
+def print_sync_report(report: dict) -> None:
+    if report["status"] == "unchanged":
+        print(f"Файл не изменился, синхронизация не нужна ({report['rows']} записей)")
+        return
+    print(
+        f"Записей в файле: {report['rows']}; добавлено: {len(report['added'])}, "
+        f"изменено: {len(report['changed'])}, удалено: {len(report['removed'])}, "
+        f"без изменений: {report['unchanged']} ({report['seconds']} с)"
+    )
+    for title, key in (("Добавлены", "added"), ("Изменены", "changed"), ("Удалены", "removed")):
+        ids = report[key]
+        if ids:
+            more = f" и ещё {len(ids) - REPORT_IDS}" if len(ids) > REPORT_IDS else ""
+            print(f"  {title}: {', '.join(ids[:REPORT_IDS])}{more}")
+
+
+def print_parse_errors(report: dict) -> None:
+    if not report.get("error_count"):
+        return
+    print(f"Строк с ошибками: {report['error_count']}")
+    for error in report["errors"][:REPORT_ERRORS]:
+        print(f"  строка {error['line']}: {error['error']}")
+    if report["error_count"] > REPORT_ERRORS:
+        print(f"  ... и ещё {report['error_count'] - REPORT_ERRORS}")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Загрузка CSV с вентиляторами в БД")
+    parser.add_argument("csv_path", nargs="?", type=Path, default=CSV_PATH)
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="загрузка через COPY в staging-таблицу и одно слияние",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="инкрементальная синхронизация: только новые и изменённые строки",
+    )
+    parser.add_argument(
+        "--keep-missing",
+        action="store_true",
+        help="при --sync не удалять товары, которых нет в файле",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=CSV_PARSE_WORKERS,
+        help="процессов разбора CSV (0 — по числу ядер, 1 — без пула)",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="при --sync записать полный отчёт (JSON) в файл",
+    )
+    args = parser.parse_args()
+
     init_pool(DATABASE_URL)
-    conn = get_connection()
+    conn = get_connection(write=True)
     try:
         init_db(conn)
-        n = load_csv_into_db(conn, CSV_PATH)
-        print(f"Загружено записей: {n}")
+        if args.sync:
+            report = sync_csv_into_db(
+                conn, args.csv_path, delete_missing=not args.keep_missing, workers=args.workers
+            )
+            print_sync_report(report)
+            print_parse_errors(report)
+            if args.report:
+                args.report.write_text(
+                    json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8"
+                )
+        elif args.bulk:
+            stats = bulk_load_csv_into_db(conn, args.csv_path, workers=args.workers)
+            print(f"Загружено записей: {stats['rows']}")
+            print(
+                f"Ожидание разбора ({stats['workers']} проц.): {stats['parse_seconds']} с, "
+                f"запись: {stats['write_seconds']} с, "
+                f"слияние: {stats['merge_seconds']} с, всего: {stats['total_seconds']} с "
+                f"({stats['rows_per_sec']} строк/с)"
+            )
+            print_parse_errors(stats)
+        else:
+            parsed = {}
+            n = load_csv_into_db(conn, args.csv_path, workers=args.workers, report=parsed)
+            print(f"Загружено записей: {n}")
+            print_parse_errors(parsed)
     finally:
         put_connection(conn)
         close_pool()
@@ -0,0 +1,233 @@
+"""
+Метрики приложения: время по этапам запроса (ожидание пула, SQL, преобразование строк,
+сериализация), гистограммы задержек по эндпоинтам и формам фильтров, медленные запросы
+к БД. Отдаются в текстовом формате Prometheus (/api/metrics) и в заголовке Server-Timing.
+
+Этапы копятся в contextvar текущего запроса: stage("sql") можно вызывать из любого
+модуля, вне запроса он ничего не записывает в Server-Timing.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("ventmash.slow_query")
+
+# Границы корзин гистограмм, секунды.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Не больше стольких разных форм фильтров; остальные считаются как "other".
+MAX_FILTER_SHAPES = 256
+# Длина параметров запроса в журнале медленных запросов (списки id бывают огромными).
+MAX_LOGGED_PARAMS = 500
+
+_enabled = True
+_slow_query_seconds = 0.2
+# {этап: секунды} текущего запроса или None вне запроса.
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+
+
+def configure(enabled: bool = True, slow_query_ms: float = 200.0) -> None:
+    global _enabled, _slow_query_seconds
+    _enabled = enabled
+    _slow_query_seconds = slow_query_ms / 1000
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+
+class _Family:
+    """Метрика с метками: {значения меток: Histogram | число}."""
+
+    def __init__(self, name: str, kind: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, *values: str) -> Histogram:
+        h = self.series.get(values)
+        if h is None:
+            with self._lock:
+                h = self.series.setdefault(values, Histogram())
+        return h
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        with self._lock:
+            self.series[values] = self.series.get(values, 0) + amount
+
+
+_families: Dict[str, _Family] = {}
+
+
+def _family(name: str, kind: str, help_text: str, labels: Sequence[str] = ()) -> _Family:
+    family = _Family(name, kind, help_text, labels)
+    _families[name] = family
+    return family
+
+
+REQUEST_SECONDS = _family(
+    "http_request_duration_seconds", "histogram",
+    "Время обработки запроса", ("endpoint", "method", "status"),
+)
+FILTER_SECONDS = _family(
+    "products_request_duration_seconds", "histogram",
+    "Время /api/products по форме фильтров", ("shape",),
+)
+STAGE_SECONDS = _family(
+    "request_stage_duration_seconds", "histogram",
+    "Время этапов обработки запроса", ("stage",),
+)
+QUERY_SECONDS = _family(
+    "db_query_duration_seconds", "histogram", "Время выполнения SQL-запросов", (),
+)
+SLOW_QUERIES = _family(
+    "db_slow_queries_total", "counter", "SQL-запросы дольше SLOW_QUERY_MS", (),
+)
+
+# Внешние источники значений для /api/metrics: имя -> функция, возвращающая {ключ: число}.
+_collectors: Dict[str, Callable[[], Optional[Dict[str, object]]]] = {}
+
+
+def register_collector(prefix: str, collect: Callable[[], Optional[Dict[str, object]]]) -> None:
+    """Добавить в /api/metrics числовые значения из collect() как gauge <prefix>_<ключ>."""
+    _collectors[prefix] = collect
+
+
+# --- этапы запроса ---
+
+def start_request() -> None:
+    if _enabled:
+        _timings.set({})
+
+
+def finish_request() -> Optional[Dict[str, float]]:
+    """Завершить учёт этапов; возвращает {этап: секунды} или None."""
+    timings = _timings.get()
+    _timings.set(None)
+    if timings:
+        for name, seconds in timings.items():
+            STAGE_SECONDS.histogram(name).observe(seconds)
+    return timings
+
+
+def add_stage(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Засечь время блока как этап name текущего запроса (повторы суммируются)."""
+    if not _enabled or _timings.get() is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, time.perf_counter() - t0)
+
+
+def observe_query(sql: str, params, seconds: float) -> None:
+    """Учёт выполненного SQL: этап sql, гистограмма, журнал медленных запросов."""
+    if not _enabled:
+        return
+    add_stage("sql", seconds)
+    QUERY_SECONDS.histogram().observe(seconds)
+    if seconds >= _slow_query_seconds:
+        SLOW_QUERIES.inc()
+        shown = repr(params)
+        if len(shown) > MAX_LOGGED_PARAMS:
+            shown = shown[:MAX_LOGGED_PARAMS] + "..."
+        log.warning(
+            "slow query %.1f ms: %s; params=%s", seconds * 1000, " ".join(sql.split()), shown
+        )
+
+
+def observe_request(
+    endpoint: str, method: str, status: int, seconds: float, shape: Optional[str] = None
+) -> None:
+    if not _enabled:
+        return
+    REQUEST_SECONDS.histogram(endpoint, method, str(status)).observe(seconds)
+    if shape is not None:
+        if (shape,) not in FILTER_SECONDS.series and len(FILTER_SECONDS.series) >= MAX_FILTER_SHAPES:
+            shape = "other"
+        FILTER_SECONDS.histogram(shape).observe(seconds)
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """Значение заголовка Server-Timing (миллисекунды)."""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+# --- экспорт ---
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    lines: List[str] = []
+    for family in _families.values():
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        with family._lock:
+            items = sorted(family.series.items())
+        for values, series in items:
+            if isinstance(series, Histogram):
+                with series._lock:
+                    counts, total, count = list(series.counts), series.sum, series.count
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _labels(family.labels, values, f'le="{le}"')
+                    lines.append(f"{family.name}_bucket{labels} {cumulative}")
+                labels = _labels(family.labels, values)
+                lines.append(f"{family.name}_sum{labels} {total!r}")
+                lines.append(f"{family.name}_count{labels} {count}")
+            else:
+                lines.append(f"{family.name}{_labels(family.labels, values)} {_format_value(series)}")
+    for prefix, collect in _collectors.items():
+        values = collect() or {}
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Обновление цен и характеристик из файла-патча без полной перезагрузки каталога:
+  python patch_prices.py prices.csv               # колонки number;price[;power;...]
+  python patch_prices.py prices.csv --dry-run     # только отчёт
+"""
+import argparse
+import json
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent / ".env")
+
+from config import DATABASE_URL
+from db.connection import close_pool, get_connection, init_pool, put_connection
+from db.init_db import init_db
+from db.price_patch import apply_price_patch
+
+# Сколько id и ошибок показывать в отчёте.
+REPORT_IDS = 20
+
+
+def print_patch_report(report: dict) -> None:
+    prefix = "Проверка (без изменений): " if report["dry_run"] else ""
+    print(
+        f"{prefix}строк в патче: {report['rows']} ({', '.join(report['columns'])}); "
+        f"изменено: {len(report['updated'])}, без изменений: {report['unchanged']}, "
+        f"не найдено: {len(report['unmatched'])}, повторов: {report['duplicates']} "
+        f"({report['seconds']} с)"
+    )
+    ids = report["unmatched"]
+    if ids:
+        more = f" и ещё {len(ids) - REPORT_IDS}" if len(ids) > REPORT_IDS else ""
+        print(f"  Нет в каталоге: {', '.join(ids[:REPORT_IDS])}{more}")
+    for error in report["errors"][:REPORT_IDS]:
+        print(f"  строка {error['line']}: {error['error']}")
+    if report["error_count"] > REPORT_IDS:
+        print(f"  ... и ещё ошибок: {report['error_count'] - REPORT_IDS}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Патч цен и характеристик из CSV")
+    parser.add_argument("csv_path", type=Path)
+    parser.add_argument("--dry-run", action="store_true", help="посчитать изменения и откатить")
+    parser.add_argument("--report", type=Path, help="записать полный отчёт (JSON) в файл")
+    args = parser.parse_args()
+
+    init_pool(DATABASE_URL)
+    conn = get_connection(write=True)
+    try:
+        init_db(conn)
+        with args.csv_path.open("r", encoding="utf-8-sig") as f:
+            report = apply_price_patch(conn, f, dry_run=args.dry_run)
+        print_patch_report(report)
+        if args.report:
+            args.report.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    finally:
+        put_connection(conn)
+        close_pool()
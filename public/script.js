@@ -24,6 +24,23 @@ async function fetchJson(url) {
   return res.json();
 }
 
+// Страница /api/products: товары + курсор следующей страницы и общее количество из заголовков
+async function fetchPage(url) {
+  const res = await fetch(url);
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(`Ошибка запроса ${url}: ${res.status} ${text}`);
+  }
+  const total = res.headers.get("X-Total-Count");
+  return {
+    items: await res.json(),
+    nextCursor: res.headers.get("X-Next-Cursor"),
+    total: total !== null ? Number(total) : null,
+  };
+}
+
+const PAGE_SIZE = 24;
+
 // ---- Каталог ----
 
 async function initCatalogPage() {
@@ -34,6 +51,10 @@ async function initCatalogPage() {
   const resultsCount = $("#resultsCount");
   const filtersForm = $("#filtersForm");
   const resetBtn = $("#resetBtn");
+  const loadMoreBtn = $("#loadMoreBtn");
+
+  let currentQuery = "";
+  let nextCursor = null;
 
   function showError(message) {
     if (!alertBox) return;
@@ -51,18 +72,19 @@ async function initCatalogPage() {
     loading.style.display = isLoading ? "block" : "none";
   }
 
-  function renderProducts(products) {
+  function renderProducts(products, append = false) {
     if (!grid) return;
-    grid.innerHTML = "";
+    if (!append) {
+      grid.innerHTML = "";
+    }
 
-    if (!Array.isArray(products) || products.length === 0) {
+    if (!append && (!Array.isArray(products) || products.length === 0)) {
       emptyState?.classList.remove("d-none");
       if (resultsCount) resultsCount.textContent = "0";
       return;
     }
 
     emptyState?.classList.add("d-none");
-    if (resultsCount) resultsCount.textContent = String(products.length);
 
     for (const p of products) {
       const col = document.createElement("div");
@@ -148,15 +170,34 @@ async function initCatalogPage() {
     return params.toString();
   }
 
+  function pageUrl(query, cursor) {
+    const params = new URLSearchParams(query);
+    params.set("limit", String(PAGE_SIZE));
+    if (cursor) {
+      params.set("cursor", cursor);
+    } else {
+      params.set("total", "1");
+    }
+    return `/api/products?${params.toString()}`;
+  }
+
+  function updatePager(total) {
+    if (resultsCount && total !== null && total !== undefined) {
+      resultsCount.textContent = String(total);
+    }
+    loadMoreBtn?.classList.toggle("d-none", !nextCursor);
+  }
+
   async function loadAndRender(initialParams) {
     hideError();
     setLoading(true);
     try {
-      const query = initialParams ?? buildQueryFromForm();
-      const url = query ? `/api/products?${query}` : "/api/products";
-      const data = await fetchJson(url);
-      renderProducts(data);
-      return data;
+      currentQuery = initialParams ?? buildQueryFromForm();
+      const page = await fetchPage(pageUrl(currentQuery, null));
+      nextCursor = page.nextCursor;
+      renderProducts(page.items);
+      updatePager(page.total);
+      return page.items;
     } catch (err) {
       console.error(err);
       showError("Не удалось загрузить каталог. Проверьте, что бэкенд запущен.");
@@ -165,36 +206,151 @@ async function initCatalogPage() {
     }
   }
 
-  // Инициализация фильтров тип/диаметр по первым данным
-  async function initFiltersFromData() {
-    const data = await loadAndRender();
-    if (!Array.isArray(data)) return;
+  async function loadMore() {
+    if (!nextCursor) return;
+    hideError();
+    loadMoreBtn?.setAttribute("disabled", "");
+    try {
+      const page = await fetchPage(pageUrl(currentQuery, nextCursor));
+      nextCursor = page.nextCursor;
+      renderProducts(page.items, true);
+      updatePager(null);
+    } catch (err) {
+      console.error(err);
+      showError("Не удалось загрузить следующую страницу каталога.");
+    } finally {
+      loadMoreBtn?.removeAttribute("disabled");
+    }
+  }
 
-    const typeSelect = $("#type");
-    const diameterSelect = $("#diameter");
+  // Опции фильтров тип/диаметр и границы диапазонов — из фасетов всего каталога (/api/facets)
+  function setSelectOptions(select, items, label) {
+    if (!select) return;
+    const selected = select.value;
+    for (const opt of Array.from(select.options)) {
+      if (opt.value) opt.remove();
+    }
+    for (const item of items) {
+      const opt = document.createElement("option");
+      opt.value = String(item.value);
+      opt.textContent = label(item);
+      select.appendChild(opt);
+    }
+    select.value = selected;
+  }
 
-    if (typeSelect) {
-      const types = Array.from(new Set(data.map((p) => p.type).filter(Boolean))).sort();
-      for (const t of types) {
-        const opt = document.createElement("option");
-        opt.value = t;
-        opt.textContent = t;
-        typeSelect.appendChild(opt);
-      }
+  function setRangePlaceholders(ranges) {
+    const inputs = {
+      diameter: ["#minDiameter", "#maxDiameter"],
+      power: ["#minPower", "#maxPower"],
+      airflow: ["#minAirflow", "#maxAirflow"],
+      pressure: ["#minPressure", "#maxPressure"],
+      price: ["#minPrice", "#maxPrice"],
+    };
+    for (const [name, [minSel, maxSel]] of Object.entries(inputs)) {
+      const range = ranges?.[name];
+      if (!range || range.min === null || range.max === null) continue;
+      const minInput = $(minSel);
+      const maxInput = $(maxSel);
+      if (minInput) minInput.placeholder = `от ${formatNumber(range.min)}`;
+      if (maxInput) maxInput.placeholder = `до ${formatNumber(range.max)}`;
+    }
+  }
+
+  async function loadFacets() {
+    try {
+      const facets = await fetchJson("/api/facets");
+      setSelectOptions(
+        $("#type"),
+        facets.types.filter((t) => t.value),
+        (t) => `${t.value} (${t.count})`,
+      );
+      setSelectOptions($("#diameter"), facets.diameters, (d) => `${d.value} мм (${d.count})`);
+      setRangePlaceholders(facets.ranges);
+    } catch (err) {
+      console.error(err);
+      await loadOptionsFromCatalog();
     }
+  }
 
-    if (diameterSelect) {
-      const diameters = Array.from(
-        new Set(data.map((p) => p.diameter).filter((d) => d !== null && d !== undefined)),
-      ).sort((a, b) => a - b);
+  // Запасной источник опций, как до постраничной выдачи: весь каталог одним запросом
+  async function loadOptionsFromCatalog() {
+    function counted(values, compare) {
+      const counts = new Map();
+      for (const v of values) counts.set(v, (counts.get(v) ?? 0) + 1);
+      return Array.from(counts, ([value, count]) => ({ value, count })).sort((a, b) =>
+        compare(a.value, b.value),
+      );
+    }
+    try {
+      const data = await fetchJson("/api/products");
+      if (!Array.isArray(data)) return;
+      setSelectOptions(
+        $("#type"),
+        counted(data.map((p) => p.type).filter(Boolean), (a, b) => a.localeCompare(b)),
+        (t) => `${t.value} (${t.count})`,
+      );
+      setSelectOptions(
+        $("#diameter"),
+        counted(
+          data.map((p) => p.diameter).filter((d) => d !== null && d !== undefined),
+          (a, b) => a - b,
+        ),
+        (d) => `${d.value} мм (${d.count})`,
+      );
+    } catch (err) {
+      console.error(err);
+    }
+  }
 
-      for (const d of diameters) {
+  // Подсказки модели/типоразмера под полем поиска (/api/suggest)
+  function initSuggest() {
+    const input = $("#q");
+    const list = $("#qSuggestions");
+    if (!input || !list) return;
+    const cache = new Map();
+    let timer = null;
+    let controller = null;
+
+    function render(items) {
+      list.innerHTML = "";
+      for (const item of items) {
         const opt = document.createElement("option");
-        opt.value = d;
-        opt.textContent = `${d} мм`;
-        diameterSelect.appendChild(opt);
+        opt.value = item.value;
+        if (item.count > 1) opt.label = `${item.value} (${item.count})`;
+        list.appendChild(opt);
+      }
+    }
+
+    async function update() {
+      const prefix = input.value.trim();
+      if (!prefix) {
+        render([]);
+        return;
+      }
+      if (cache.has(prefix)) {
+        render(cache.get(prefix));
+        return;
+      }
+      controller?.abort();
+      controller = new AbortController();
+      try {
+        const res = await fetch(`/api/suggest?prefix=${encodeURIComponent(prefix)}`, {
+          signal: controller.signal,
+        });
+        if (!res.ok) return;
+        const items = await res.json();
+        cache.set(prefix, items);
+        if (input.value.trim() === prefix) render(items);
+      } catch (err) {
+        if (err.name !== "AbortError") console.error(err);
       }
     }
+
+    input.addEventListener("input", () => {
+      clearTimeout(timer);
+      timer = setTimeout(update, 120);
+    });
   }
 
   filtersForm?.addEventListener("submit", (e) => {
@@ -208,8 +364,15 @@ async function initCatalogPage() {
     loadAndRender("");
   });
 
-  // Стартовая загрузка + заполнение фильтров
-  initFiltersFromData();
+  loadMoreBtn?.addEventListener("click", () => {
+    loadMore();
+  });
+
+  initSuggest();
+  loadFacets();
+
+  // Стартовая загрузка
+  loadAndRender();
 }
 
 // ---- Страница товара ----
@@ -286,6 +449,7 @@ async function initProductPage() {
 
     container.classList.remove("d-none");
     if (alertBox) alertBox.classList.add("d-none");
+    initSimilar(data.id);
   } catch (err) {
     console.error(err);
     showError("Не удалось загрузить данные вентилятора. Возможно, он не найден.");
@@ -294,6 +458,57 @@ async function initProductPage() {
   }
 }
 
+// Похожие вентиляторы (замены) на странице товара
+function initSimilar(id) {
+  const body = $("#similarTableBody");
+  const empty = $("#similarEmpty");
+  const sameType = $("#similarSameType");
+  const maxPrice = $("#similarMaxPrice");
+  if (!body) return;
+  let timer = null;
+
+  async function load() {
+    const params = new URLSearchParams();
+    if (sameType?.checked) params.set("same_type", "1");
+    const price = maxPrice?.value.trim();
+    if (price) params.set("max_price", price);
+    try {
+      const items = await fetchJson(`/api/products/${encodeURIComponent(id)}/similar?${params}`);
+      body.innerHTML = "";
+      for (const p of items) {
+        const tr = document.createElement("tr");
+        const name = document.createElement("td");
+        const link = document.createElement("a");
+        link.href = `/product.html?id=${encodeURIComponent(p.id)}`;
+        link.textContent = p.model || p.id;
+        name.appendChild(link);
+        tr.appendChild(name);
+        for (const value of [
+          p.airflow?.raw || "—",
+          p.pressure?.raw || "—",
+          p.power != null ? `${p.power} Вт` : "—",
+          formatPrice(p.price),
+        ]) {
+          const td = document.createElement("td");
+          td.textContent = value;
+          tr.appendChild(td);
+        }
+        body.appendChild(tr);
+      }
+      empty?.classList.toggle("d-none", items.length > 0);
+    } catch (err) {
+      console.error(err);
+    }
+  }
+
+  sameType?.addEventListener("change", load);
+  maxPrice?.addEventListener("input", () => {
+    clearTimeout(timer);
+    timer = setTimeout(load, 300);
+  });
+  load();
+}
+
 document.addEventListener("DOMContentLoaded", () => {
   const page = document.body.dataset.page;
   if (page === "catalog") {
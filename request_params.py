@@ -0,0 +1,62 @@
+"""
+Разбор параметров запросов API — общий для Flask-приложения (app.py) и ASGI-режима
+(asgi.py). args — любое отображение "имя -> первое значение" (request.args во Flask,
+словарь из query string в ASGI).
+"""
+import re
+from typing import Any, Mapping, Optional, Tuple
+
+
+def normalize_whitespace(value: Any) -> str:
+    if value is None:
+        return ""
+    return " ".join(str(value).replace("\u00A0", " ").split())
+
+
+def parse_number_loose(value: Any) -> Optional[float]:
+    s = normalize_whitespace(value).replace(" ", "").replace(",", ".")
+    if not s:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def slugify(value: str) -> str:
+    s = normalize_whitespace(value).lower()
+    s = re.sub(r"[^\w]+", "-", s, flags=re.UNICODE)
+    s = re.sub(r"-{2,}", "-", s).strip("-")
+    return s
+
+
+def product_filters(args: Mapping[str, Any]) -> dict:
+    """Фильтры /api/products из query string в виде kwargs для list_products."""
+    q = normalize_whitespace(args.get("q")).lower() or None
+    return {
+        "q": q,
+        "type_": normalize_whitespace(args.get("type")) or None,
+        "diameter": parse_number_loose(args.get("diameter")),
+        "min_price": parse_number_loose(args.get("minPrice")),
+        "max_price": parse_number_loose(args.get("maxPrice")),
+        "min_power": parse_number_loose(args.get("minPower")),
+        "max_power": parse_number_loose(args.get("maxPower")),
+        "min_noise": parse_number_loose(args.get("minNoise")),
+        "max_noise": parse_number_loose(args.get("maxNoise")),
+        "min_diameter": parse_number_loose(args.get("minDiameter")),
+        "max_diameter": parse_number_loose(args.get("maxDiameter")),
+        "min_airflow": parse_number_loose(args.get("minAirflow")),
+        "max_airflow": parse_number_loose(args.get("maxAirflow")),
+        "min_pressure": parse_number_loose(args.get("minPressure")),
+        "max_pressure": parse_number_loose(args.get("maxPressure")),
+        # sort=relevance — только явно: порядок по умолчанию не зависит от q.
+        "sort": normalize_whitespace(args.get("sort")) or "price_asc",
+    }
+
+
+def page_params(args: Mapping[str, Any]) -> Tuple[Optional[float], Optional[str], bool]:
+    """Постраничная выдача /api/products: (limit, cursor, with_total)."""
+    limit = parse_number_loose(args.get("limit"))
+    cursor = normalize_whitespace(args.get("cursor")) or None
+    with_total = normalize_whitespace(args.get("total")) in ("1", "true")
+    return limit, cursor, with_total
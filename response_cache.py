@@ -0,0 +1,129 @@
+"""
+Кэш ответов API: ключ — нормализованные параметры запроса плюс версия каталога.
+LRU с ограничением по числу записей и по суммарному размеру тел, сильные ETag,
+single-flight: одновременные одинаковые промахи выполняют запрос к БД один раз.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class CachedResponse:
+    __slots__ = ("status", "headers", "body", "etag", "encoded")
+
+    def __init__(self, status: int, headers: List[Tuple[str, str]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        # Сжатые варианты тела, готовятся при первом запросе: кодировка -> байты.
+        # В max_bytes не учитываются: они в разы меньше самого тела.
+        self.encoded: Dict[str, bytes] = {}
+
+
+class _Flight:
+    """Выполняющийся запрос, результата которого ждут остальные."""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[CachedResponse] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._bytes = 0
+        self._version: Any = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _clear_locked(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _store_locked(self, key: Hashable, entry: CachedResponse) -> None:
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.body)
+        self._entries[key] = entry
+        self._bytes += size
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.body)
+            self.evictions += 1
+
+    def get_or_compute(
+        self,
+        version: Any,
+        key: Hashable,
+        compute: Callable[[], CachedResponse],
+        cacheable: Callable[[CachedResponse], bool] = lambda r: r.status == 200,
+    ) -> Tuple[CachedResponse, str]:
+        """
+        Вернуть (ответ, "hit" | "miss" | "coalesced"). При смене версии каталога кэш
+        очищается целиком. compute вызывается не более одного раза на ключ одновременно.
+        """
+        with self._lock:
+            if version != self._version:
+                self._clear_locked()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, "hit"
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, "coalesced"
+
+        try:
+            entry = compute()
+            flight.result = entry
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and version == self._version and cacheable(entry):
+                    self._store_locked(key, entry)
+            flight.event.set()
+        return entry, "miss"
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
@@ -14,6 +14,14 @@ source "$VENV_DIR/bin/activate"
 echo "▶ Установка зависимостей (pip install -r requirements.txt)..."
 pip install -r requirements.txt
 
-echo "▶ Запуск Python-бэкенда..."
-python app.py
+if [ "${1:-}" = "--dev" ]; then
+  echo "▶ Запуск сервера разработки (один процесс, debug)..."
+  python app.py
+elif [ "${1:-}" = "--async" ]; then
+  echo "▶ Запуск ASGI-сервера (uvicorn, asyncio)..."
+  exec python asgi.py
+else
+  echo "▶ Запуск Python-бэкенда (gunicorn)..."
+  exec gunicorn -c gunicorn.conf.py wsgi:app
+fi
 
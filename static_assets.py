@@ -0,0 +1,166 @@
+"""
+Статика из public/: файлы читаются один раз при старте, CSS/JS получают имена с хэшем
+содержимого (style.3fa2c1d0.css) и отдаются с Cache-Control: immutable на год. Для
+каждого файла заранее готовы gzip и br (пакет brotli из requirements.txt); вариант выбирается
+по Accept-Encoding. HTML-страницы ссылаются на версии с хэшем и всегда перепроверяются
+(no-cache + ETag). Тут же — сжатие больших JSON-ответов на лету.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # без brotli работаем, но только с gzip (предупреждение в AssetManifest)
+    brotli = None
+
+log = logging.getLogger("ventmash.static")
+
+# Файлы с хэшем в имени: ссылки на них в HTML переписываются.
+FINGERPRINTED = (".css", ".js")
+PAGES = (".html",)
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Меньше этого сжимать нет смысла: выигрыш съедают заголовки.
+MIN_COMPRESS_BYTES = 512
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def negotiate_encoding(header: str, available: Optional[Tuple[str, ...]] = None) -> Optional[str]:
+    """
+    Лучшая кодировка из available (по умолчанию — все доступные, br раньше gzip),
+    которую принимает клиент; None — без сжатия.
+    """
+    if available is None:
+        available = available_encodings()
+    accepted = _parse_accept_encoding(header)
+    star = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, star)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if level is None else level)
+    # mtime=0: одинаковое содержимое даёт одинаковые байты (и ETag).
+    return gzip.compress(body, compresslevel=9 if level is None else level, mtime=0)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+class Asset:
+    __slots__ = ("name", "url", "mimetype", "variants", "mtime")
+
+    def __init__(self, name: str, url: str, body: bytes, mtime: float):
+        self.name = name
+        self.url = url
+        self.mtime = mtime
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.mimetype.startswith("text/") or self.mimetype.endswith("javascript"):
+            self.mimetype += "; charset=utf-8"
+        # кодировка ("" — без сжатия) -> (тело, etag)
+        self.variants: Dict[str, Tuple[bytes, str]] = {"": (body, _etag(body))}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            for encoding in available_encodings():
+                packed = compress(body, encoding)
+                if len(packed) < len(body):
+                    self.variants[encoding] = (packed, _etag(packed))
+
+    def variant(self, accept_encoding: str) -> Tuple[str, bytes, str]:
+        """(кодировка, тело, etag) под Accept-Encoding клиента."""
+        encoding = negotiate_encoding(accept_encoding, tuple(e for e in self.variants if e))
+        body, etag = self.variants[encoding or ""]
+        return encoding or "", body, etag
+
+
+def _etag(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class AssetManifest:
+    """Все файлы public/: имя исходного файла -> Asset, URL с хэшем -> Asset."""
+
+    def __init__(self, root: Path, url_prefix: str = "/assets/"):
+        self.root = Path(root)
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self._by_name: Dict[str, Asset] = {}
+        self._by_url: Dict[str, Asset] = {}
+        self._signature: Tuple = ()
+        if brotli is None:
+            log.warning("Пакет brotli не установлен: статика и API сжимаются только gzip")
+        self.build()
+
+    def _files(self) -> List[Path]:
+        return sorted(p for p in self.root.iterdir() if p.is_file() and not p.name.startswith("."))
+
+    def _current_signature(self) -> Tuple:
+        return tuple((p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in self._files())
+
+    def build(self) -> None:
+        by_name: Dict[str, Asset] = {}
+        files = self._files()
+        # Сначала CSS/JS — их URL с хэшем нужны для переписывания HTML.
+        for path in files:
+            if path.suffix in FINGERPRINTED:
+                body = path.read_bytes()
+                digest = hashlib.blake2b(body, digest_size=4).hexdigest()
+                url = f"{self.url_prefix}{path.stem}.{digest}{path.suffix}"
+                by_name[path.name] = Asset(path.name, url, body, path.stat().st_mtime)
+        for path in files:
+            if path.suffix in FINGERPRINTED:
+                continue
+            body = path.read_bytes()
+            if path.suffix in PAGES:
+                text = body.decode("utf-8")
+                for name, asset in by_name.items():
+                    text = text.replace(f'"/{name}"', f'"{asset.url}"')
+                body = text.encode("utf-8")
+            by_name[path.name] = Asset(path.name, f"/{path.name}", body, path.stat().st_mtime)
+        with self._lock:
+            self._by_name = by_name
+            self._by_url = {a.url: a for a in by_name.values()}
+            self._signature = self._current_signature()
+
+    def reload_if_changed(self) -> None:
+        """Пересобрать, если файлы в public/ изменились (для режима разработки)."""
+        if self._current_signature() != self._signature:
+            self.build()
+
+    def get(self, name: str) -> Optional[Asset]:
+        """Файл по исходному имени (style.css, index.html)."""
+        return self._by_name.get(name)
+
+    def by_url(self, url: str) -> Optional[Asset]:
+        """Файл по URL с хэшем (/assets/style.3fa2c1d0.css)."""
+        return self._by_url.get(url)
+
+    def urls(self) -> Dict[str, str]:
+        return {name: asset.url for name, asset in self._by_name.items()}
@@ -0,0 +1,32 @@
+import io
+from pathlib import Path
+
+from db.init_db import init_db
+from db.load_csv import load_csv_into_db
+from db.price_patch import apply_price_patch
+from db.sqlite_store import SqliteConnection
+
+FANS_CSV = Path(__file__).resolve().parent.parent / "fans_data.csv"
+
+
+def _prices(conn, *ids):
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, price, raw_price FROM products WHERE id = ANY(%s)", (list(ids),))
+        return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+
+def test_row_with_parse_error_keeps_live_price(tmp_path):
+    conn = SqliteConnection(str(tmp_path / "catalog.db"), readonly=False)
+    init_db(conn)
+    load_csv_into_db(conn, FANS_CSV, workers=1)
+    before = _prices(conn, "1", "107")
+
+    report = apply_price_patch(conn, io.StringIO("number;price\n107;abc\n1;12345\n"))
+
+    after = _prices(conn, "1", "107")
+    assert report["error_count"] == 1 and report["errors"][0]["line"] == 2
+    assert report["updated"] == ["1"]
+    assert after["1"][0] == 12345
+    assert after["107"] == before["107"]
+    assert before["107"][0] is not None
+    conn.close()
@@ -0,0 +1,24 @@
+from db.selection import DutyPointIndex
+
+
+def _row(id_value, airflow, pressure, price=1000.0):
+    # (id, type, airflow_min, airflow_max, pressure_min, pressure_max, power, noise_level, price)
+    return (id_value, "ВО", *airflow, *pressure, 100.0, 50.0, price)
+
+
+def test_reversed_pressure_range_is_selected():
+    # Как у id 107 в fans_data.csv: давление "97 - 56", от большего к меньшему.
+    index = DutyPointIndex([_row("1", (2000, 3000), (50, 90)), _row("107", (2000, 3000), (97, 56))])
+
+    matches = {m["id"]: m for m in index.select(2500, 70, limit=50)}
+
+    assert set(matches) == {"1", "107"}
+    # Положение считается по нормализованному диапазону 56..97.
+    assert matches["107"]["pressure_position"] == round((70 - 56) / (97 - 56), 4)
+
+
+def test_reversed_range_outside_point_is_not_selected():
+    index = DutyPointIndex([_row("107", (2000, 3000), (97, 56))])
+
+    assert index.select(2500, 40) == []
+    assert index.select(2500, 100) == []
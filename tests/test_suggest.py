@@ -0,0 +1,18 @@
+from db.suggest import SuggestIndex
+
+
+def test_model_equal_to_size_is_suggested_once():
+    # В каталоге модель и типоразмер часто совпадают: "ВО 13-284-4/15°-4".
+    index = SuggestIndex(
+        [
+            ("1", "ВО 13-284-4/15°-4", "ВО 13-284-4/15°-4", "vo-13-284-4-15-4"),
+            ("2", "ВО 13-284-4/20°-4", "ВО 13-284-4/20°-4", "vo-13-284-4-20-4"),
+        ]
+    )
+
+    suggestions = index.suggest("во", limit=2)
+
+    assert [(s["value"], s["field"]) for s in suggestions] == [
+        ("ВО 13-284-4/15°-4", "model"),
+        ("ВО 13-284-4/20°-4", "model"),
+    ]
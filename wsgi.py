@@ -0,0 +1,8 @@
+"""
+WSGI-точка входа для продакшена: gunicorn -c gunicorn.conf.py wsgi:app
+Пул соединений здесь не создаётся: каждый воркер открывает свой после fork
+(post_fork в gunicorn.conf.py) — соединения с БД нельзя делить между процессами.
+"""
+from app import app
+
+__all__ = ["app"]